@@ -3,11 +3,29 @@ Phase 1: Search Strategy & Data Retrieval
 Define and execute Scopus search query.
 """
 
+import hashlib
 import json
-from typing import List, Dict
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
 import config
 import utils
 
+# Scopus only serves the first 5000 results of a query through start/count paging
+SCOPUS_MAX_OFFSET = 5000
+
+# The strict query is used only if it finds at least this many papers
+MIN_STRICT_RESULTS = 20
+
+# Local stand-in for the PhD-scope part of the strict query ("superset" search
+# mode): Scopus matches whole words, so match whole words here too
+STRICT_SCOPE_MATCHER = utils.KeywordMatcher(config.SEARCH_KEYWORDS['nice_to_have'], word_boundary=True)
+
+# Fields the local check searches: raw Scopus entry field -> parsed paper field
+STRICT_SCOPE_FIELDS = {'dc:title': 'title', 'dc:description': 'abstract', 'authkeywords': 'author_keywords'}
+
 def build_search_query(strict: bool = True) -> str:
     """
     Build Scopus search query.
@@ -39,35 +57,165 @@ def build_search_query(strict: bool = True) -> str:
     
     return full_query
 
-def execute_scopus_search(max_results: int = 200) -> List[Dict]:
+def _expected_results(first_page: Optional[Dict], max_results: int) -> int:
+    """Number of results a query will deliver, judging from its first page."""
+    if first_page and first_page['entries']:
+        return min(first_page['total_results'], max_results)
+    return 0
+
+def choose_search_query(max_results: int = 200, mode: str = None) -> Tuple[str, Optional[Dict]]:
     """
-    Execute Scopus search with fallback strategy.
+    Pick the strict or relaxed query (fallback strategy).
+    
+    The strict query's first page reports its total result count, which
+    decides whether to continue with it or fall back to the relaxed query.
+    In "speculative" mode the first pages of both queries are requested at
+    the same time, so falling back costs no extra round trip.
     
     Args:
         max_results: Maximum number of results to retrieve
+        mode: "sequential" or "speculative" (default: config.SEARCH_MODE)
         
     Returns:
-        List of paper dictionaries
+        Tuple of (query, its first page or None if not fetched yet)
     """
+    mode = mode or config.SEARCH_MODE
+    
     print("\n" + "="*60)
     print("EXECUTING SCOPUS SEARCH")
     print("="*60)
     
+    strict_query = build_search_query(strict=True)
+    relaxed_query = build_search_query(strict=False)
+    relaxed_page = None
+    
     # Try strict query first
     print("\n[1/2] Attempting strict search (all criteria)...")
-    strict_query = build_search_query(strict=True)
     print(f"Query: {strict_query[:100]}...")
     
-    results = utils.scopus_search(strict_query, config.SCOPUS_API_KEY, max_results)
+    relaxed_future = None
+    if mode == "speculative":
+        print("(speculative: relaxed query's first page requested in parallel)")
+        pool = ThreadPoolExecutor(max_workers=2)
+        strict_future = pool.submit(utils.scopus_first_page, strict_query, config.SCOPUS_API_KEY, max_results)
+        relaxed_future = pool.submit(utils.scopus_first_page, relaxed_query, config.SCOPUS_API_KEY, max_results)
+        # Don't wait for the relaxed page if the strict query is enough
+        pool.shutdown(wait=False)
+        first_page = strict_future.result()
+    else:
+        first_page = utils.scopus_first_page(strict_query, config.SCOPUS_API_KEY, max_results)
     
-    if len(results) < 20:
-        print(f"\n⚠ Only {len(results)} results found with strict criteria.")
-        print("[2/2] Attempting relaxed search (fundamental criteria only)...")
+    expected = _expected_results(first_page, max_results)
+    if expected >= MIN_STRICT_RESULTS:
+        if relaxed_future:
+            relaxed_future.cancel()
+        return strict_query, first_page
+    
+    if relaxed_future:
+        relaxed_page = relaxed_future.result()
+    print(f"\n⚠ Only {expected} results found with strict criteria.")
+    print("[2/2] Attempting relaxed search (fundamental criteria only)...")
+    print(f"Query: {relaxed_query[:100]}...")
+    return relaxed_query, relaxed_page
+
+def in_strict_scope(text: str) -> bool:
+    """
+    Check locally whether a text meets the PhD-scope criteria of the strict
+    query (a VBHC term and a context term).
+    """
+    counts = STRICT_SCOPE_MATCHER.count(text)
+    return all(counts.values())
+
+def entry_text(entry: Dict) -> str:
+    """Searchable text of a raw Scopus entry (title, abstract, author keywords)."""
+    return ' '.join(entry.get(field) or '' for field in STRICT_SCOPE_FIELDS)
+
+def paper_text(paper: Dict) -> str:
+    """Searchable text of a parsed paper (the same fields as entry_text)."""
+    return ' '.join(paper.get(field) or '' for field in STRICT_SCOPE_FIELDS.values())
+
+def strict_subset(entries: List[Dict], max_results: int, text=entry_text) -> List[Dict]:
+    """
+    Derive the strict result set from relaxed results ("superset" search mode).
+    
+    Every relaxed result already meets the fundamental criteria, so only the
+    PhD-scope criteria are checked. This approximates the strict query:
+    Scopus also searches fields that are not part of the results, and strict
+    matches ranked below the relaxed results given here are missed.
+    
+    Args:
+        entries: Relaxed results in ranked order (raw entries or parsed papers)
+        max_results: Maximum number of results to keep
+        text: Function returning the searchable text of one result
         
-        relaxed_query = build_search_query(strict=False)
-        print(f"Query: {relaxed_query[:100]}...")
+    Returns:
+        Results in scope, or the top relaxed results if fewer than MIN_STRICT_RESULTS are
+    """
+    subset = [entry for entry in entries if in_strict_scope(text(entry))]
+    if len(subset) >= MIN_STRICT_RESULTS:
+        print(f"\n✓ {len(subset)} of {len(entries)} relaxed results meet the strict criteria")
+        return subset[:max_results]
+    
+    print(f"\n⚠ Only {len(subset)} results meet the strict criteria: keeping the top relaxed results.")
+    return entries[:max_results]
+
+def iter_search_results(max_results: int = 200, mode: str = None) -> Iterator[List[Dict]]:
+    """
+    Execute Scopus search with fallback strategy, yielding pages as they arrive.
+    
+    Search modes (default: config.SEARCH_MODE):
+        sequential: strict query's first page, then the relaxed query if needed
+        speculative: first pages of both queries in parallel
+        superset: relaxed query only, strict subset derived locally (one query
+            instead of two, but the results arrive as a single page at the end);
+            the relaxed query is paged until max_results strict matches are
+            found or config.SUPERSET_SEARCH_DEPTH results have been read
+    
+    Args:
+        max_results: Maximum number of results to retrieve
+        mode: Search mode
         
-        results = utils.scopus_search(relaxed_query, config.SCOPUS_API_KEY, max_results)
+    Yields:
+        Pages (lists) of raw Scopus entries, in ranked order
+    """
+    mode = mode or config.SEARCH_MODE
+    
+    if mode == "superset":
+        print("\n" + "="*60)
+        print("EXECUTING SCOPUS SEARCH")
+        print("="*60)
+        
+        query = build_search_query(strict=False)
+        print("\nRelaxed search (fundamental criteria), strict subset derived locally...")
+        print(f"Query: {query[:100]}...")
+        
+        entries, in_scope = [], 0
+        depth = min(max(max_results, config.SUPERSET_SEARCH_DEPTH), SCOPUS_MAX_OFFSET)
+        for page in utils.iter_scopus_pages(query, config.SCOPUS_API_KEY, depth):
+            entries.extend(page)
+            in_scope += sum(1 for entry in page if in_strict_scope(entry_text(entry)))
+            if in_scope >= max_results:
+                break
+        if entries:
+            yield strict_subset(entries, max_results)
+        return
+    
+    query, first_page = choose_search_query(max_results, mode)
+    yield from utils.iter_scopus_pages(query, config.SCOPUS_API_KEY, max_results, first_page=first_page)
+
+def execute_scopus_search(max_results: int = 200) -> List[Dict]:
+    """
+    Execute Scopus search with fallback strategy.
+    
+    Args:
+        max_results: Maximum number of results to retrieve
+        
+    Returns:
+        List of paper dictionaries
+    """
+    results = []
+    for page in iter_search_results(max_results):
+        results.extend(page)
     
     print(f"\n✓ Retrieved {len(results)} papers from Scopus")
     return results
@@ -96,6 +244,7 @@ def parse_scopus_results(results: List[Dict]) -> List[Dict]:
             'eissn': entry.get('prism:eIssn', 'N/A'),
             'cited_by_count': int(entry.get('citedby-count', 0)),
             'abstract': entry.get('dc:description', 'N/A'),
+            'author_keywords': entry.get('authkeywords', ''),
             'link': entry.get('link', [{}])[0].get('@href', 'N/A'),
             'affiliation': entry.get('affiliation', [{}])[0].get('affilname', 'N/A') if entry.get('affiliation') else 'N/A',
         }
@@ -103,19 +252,233 @@ def parse_scopus_results(results: List[Dict]) -> List[Dict]:
     
     return papers
 
+def corpus_paths(query: str) -> Tuple[Path, Path]:
+    """
+    Locate the local corpus of a query.
+    
+    Args:
+        query: Scopus query string
+        
+    Returns:
+        Tuple of (corpus JSON Lines path, sync state JSON path)
+    """
+    key = hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+    corpus_dir = config.CACHE_FILES['scopus_corpus']
+    return corpus_dir / f"{key}.jsonl", corpus_dir / f"{key}.state.json"
+
+def load_corpus(query: str) -> Tuple[Dict[str, Dict], Optional[Dict]]:
+    """
+    Load the local corpus of a query.
+    
+    Returns:
+        Tuple of (papers keyed by scopus_id, sync state or None if never synced)
+    """
+    corpus_path, state_path = corpus_paths(query)
+    if not (corpus_path.exists() and state_path.exists()):
+        return {}, None
+    
+    corpus = {paper['scopus_id']: paper for paper in utils.iter_records(corpus_path)}
+    return corpus, utils.load_json(state_path)
+
+def save_corpus(query: str, corpus: Dict[str, Dict], state: Dict):
+    """Save the local corpus of a query and its sync state."""
+    corpus_path, state_path = corpus_paths(query)
+    corpus_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    # Replace the corpus atomically so an interrupted sync never truncates it;
+    # the state is written last, so at worst the next sync re-fetches a day
+    tmp_path = corpus_path.with_name(corpus_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for paper in corpus.values():
+            f.write(json.dumps(paper, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, corpus_path)
+    utils.save_json(state, state_path)
+
+def diff_paper(old: Dict, new: Dict) -> Dict[str, List]:
+    """
+    Compare two versions of a paper record.
+    
+    Returns:
+        Dictionary of changed fields mapped to [old value, new value]
+    """
+    return {
+        field: [old.get(field), value]
+        for field, value in new.items()
+        if old.get(field) != value
+    }
+
+def list_scopus_ids(query: str, limit: int, first_page: Optional[Dict] = None) -> Dict[str, int]:
+    """
+    List the top records of a query with only their ID and citation count.
+    
+    Much lighter than a full download: the response carries two fields
+    per record instead of the whole standard view, so each request returns
+    config.SCOPUS_LISTING_PAGE_SIZE records instead of SCOPUS_PAGE_SIZE.
+    
+    Args:
+        query: Scopus query string
+        limit: Number of records to list (in ranked order)
+        first_page: The query's first page (any view), if already fetched
+        
+    Returns:
+        Dictionary mapping scopus_id to cited_by_count, in ranked order
+    """
+    ids = {}
+    limit = min(limit, SCOPUS_MAX_OFFSET)
+    for page in utils.iter_scopus_pages(query, config.SCOPUS_API_KEY, limit, first_page=first_page,
+                                        fields='dc:identifier,citedby-count',
+                                        page_size=config.SCOPUS_LISTING_PAGE_SIZE):
+        for entry in page:
+            scopus_id = entry.get('dc:identifier', '').replace('SCOPUS_ID:', '')
+            ids[scopus_id] = int(entry.get('citedby-count', 0))
+    return ids
+
+def sync_search_results(max_results: int = 200,
+                        refresh_citations: bool = True) -> Optional[Tuple[List[Dict], Dict]]:
+    """
+    Bring the local corpus of the search query up to date.
+    
+    The first sync downloads the query in full. Later syncs only fetch
+    records loaded or updated in Scopus since the last sync (LOAD-DATE),
+    which in the usual case costs a couple of requests. Removed records
+    are detected by comparing the total Scopus reports with the local
+    corpus; only when they disagree (or when refresh_citations is set)
+    is the ID list of the query's top records (as many as the corpus
+    holds) fetched, reusing the first page and taking 200 IDs per request;
+    it refreshes the citation counts of the listed records. Records are
+    only removed when that list covers the whole query.
+    
+    The corpus may grow beyond max_results; like a full search, only its
+    top max_results papers are returned, ranked in the order of the ID
+    list (records it does not cover keep their corpus order).
+    
+    Args:
+        max_results: Maximum number of papers returned (and of the first, full
+            sync, except in superset mode: config.SUPERSET_SEARCH_DEPTH)
+        refresh_citations: Re-read the citation counts of all existing records
+        
+    Returns:
+        Tuple of (top papers of the corpus, diff of added/removed/changed records),
+        or None if Scopus could not be reached
+    """
+    if config.SEARCH_MODE == "superset":
+        query, first_page = build_search_query(strict=False), None
+    else:
+        query, first_page = choose_search_query(max_results)
+    if first_page is None:
+        first_page = utils.scopus_first_page(query, config.SCOPUS_API_KEY, max_results)
+    if first_page is None:
+        return None
+    
+    corpus, state = load_corpus(query)
+    today = date.today()
+    diff = {'query': query, 'since': None, 'full_sync': state is None,
+            'added': [], 'removed': [], 'changed': []}
+    changed = {}  # scopus_id -> {field: [old, new]}
+    complete = None  # None: judged from the corpus size after the sync
+    remote = {}  # ID listing of the query, in ranked order
+    
+    if state is None:
+        print("\nNo local corpus for this query yet: downloading it in full...")
+        # Superset mode derives the strict subset from deeper relaxed results
+        limit = max_results
+        if config.SEARCH_MODE == "superset":
+            limit = min(max(max_results, config.SUPERSET_SEARCH_DEPTH), SCOPUS_MAX_OFFSET)
+        for page in utils.iter_scopus_pages(query, config.SCOPUS_API_KEY, limit,
+                                            first_page=first_page):
+            for paper in parse_scopus_results(page):
+                corpus[paper['scopus_id']] = paper
+        diff['added'] = list(corpus)
+    else:
+        # Overlap the previous sync by a day: re-fetched records that did not
+        # change produce no diff entry
+        since = date.fromisoformat(state['last_sync']) - timedelta(days=1)
+        diff['since'] = since.isoformat()
+        print(f"\nSyncing local corpus ({len(corpus)} papers) with records loaded since {since}...")
+        
+        delta_query = f"({query}) AND LOAD-DATE AFT {since:%Y%m%d}"
+        for page in utils.iter_scopus_pages(delta_query, config.SCOPUS_API_KEY, SCOPUS_MAX_OFFSET):
+            for paper in parse_scopus_results(page):
+                old = corpus.get(paper['scopus_id'])
+                if old is None:
+                    diff['added'].append(paper['scopus_id'])
+                else:
+                    changes = diff_paper(old, paper)
+                    if changes:
+                        changed[paper['scopus_id']] = changes
+                corpus[paper['scopus_id']] = paper
+        
+        # Scopus reporting fewer records than a complete corpus holds means
+        # some were removed (or no longer match the query)
+        suspect_removed = state.get('complete') and first_page['total_results'] < len(corpus)
+        if suspect_removed or refresh_citations:
+            if suspect_removed:
+                print("⚠ Scopus reports fewer records than the local corpus: checking for removed records...")
+            # No more records than the corpus holds (when records were removed,
+            # that is every record of the query)
+            remote = list_scopus_ids(query, min(first_page['total_results'], len(corpus)), first_page)
+            # The listing stops at the first failed page: a record missing from
+            # a partial listing may still be in Scopus
+            listed_all = bool(remote) and len(remote) == first_page['total_results']
+            if suspect_removed and not listed_all:
+                print(f"⚠ Listed only {len(remote)} of {first_page['total_results']} records: "
+                      f"skipping the removal check")
+                complete = state['complete']
+            for scopus_id, paper in list(corpus.items()):
+                if scopus_id not in remote:
+                    # An incomplete corpus may hold records beyond the listed ones
+                    if listed_all and state.get('complete'):
+                        diff['removed'].append(scopus_id)
+                        changed.pop(scopus_id, None)
+                        del corpus[scopus_id]
+                elif paper['cited_by_count'] != remote[scopus_id]:
+                    changed.setdefault(scopus_id, {})['cited_by_count'] = [
+                        paper['cited_by_count'], remote[scopus_id]]
+                    paper['cited_by_count'] = remote[scopus_id]
+    
+    diff['changed'] = [{'scopus_id': scopus_id, 'changes': changes}
+                       for scopus_id, changes in changed.items()]
+    
+    # Keep the corpus in ranked order (sorted() is stable for unlisted records)
+    rank = {scopus_id: i for i, scopus_id in enumerate(remote)}
+    corpus = dict(sorted(corpus.items(), key=lambda item: rank.get(item[0], len(rank))))
+    
+    state = {
+        'query': query,
+        'last_sync': today.isoformat(),
+        'total_results': first_page['total_results'],
+        'complete': len(corpus) >= first_page['total_results'] if complete is None else complete,
+        'count': len(corpus),
+    }
+    save_corpus(query, corpus, state)
+    
+    print(f"✓ Sync complete: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+          f"{len(diff['changed'])} changed ({len(corpus)} papers in corpus)")
+    
+    papers = list(corpus.values())
+    if config.SEARCH_MODE == "superset":
+        return strict_subset(papers, max_results, text=paper_text), diff
+    return papers[:max_results], diff
+
 def save_results(papers: List[Dict]):
-    """Save search results to JSON file."""
+    """Save search results to JSON Lines file."""
     output_path = config.OUTPUT_FILES['scopus_results']
-    utils.save_json(papers, output_path)
+    utils.save_jsonl(papers, output_path)
     print(f"\n✓ Results saved to: {output_path}")
 
-def display_summary(papers: List[Dict]):
-    """Display search results summary."""
+def display_summary(papers: List[Dict], total: int = None):
+    """
+    Display search results summary.
+    
+    Args:
+        papers: Papers to show as samples (the first 5 are shown)
+        total: Total number of papers retrieved (defaults to len(papers))
+    """
     print("\n" + "="*60)
     print("SEARCH RESULTS SUMMARY")
     print("="*60)
     
-    print(f"\nTotal papers retrieved: {len(papers)}")
+    print(f"\nTotal papers retrieved: {total if total is not None else len(papers)}")
     
     if papers:
         print(f"\nSample papers:")
@@ -137,27 +500,44 @@ def main():
         print("\n❌ ERROR: SCOPUS_API_KEY not found in .env file!")
         return False
     
-    # Execute search
-    raw_results = execute_scopus_search(max_results=200)
+    output_path = config.OUTPUT_FILES['scopus_results']
+    if config.INCREMENTAL_SYNC:
+        # Update the local corpus and write it out, with the diff of this sync
+        synced = sync_search_results(max_results=200,
+                                     refresh_citations=config.SYNC_REFRESH_CITATIONS)
+        if synced is None:
+            print("\n❌ Scopus search failed. Please check your API key.")
+            return False
+        papers, diff = synced
+        count = utils.save_jsonl(papers, output_path)
+        sample = papers[:5]
+        utils.save_json(diff, config.OUTPUT_FILES['sync_diff'])
+        print(f"✓ Sync diff saved to: {config.OUTPUT_FILES['sync_diff']}")
+    else:
+        # Execute search, parsing and appending each page to the results file as
+        # it arrives (Phase 2 can follow the file while it is being written)
+        sample = []
+        with utils.JsonlWriter(output_path) as writer:
+            for page in iter_search_results(max_results=200):
+                papers = parse_scopus_results(page)
+                writer.write_many(papers)
+                sample.extend(papers[:5 - len(sample)])
+        count = writer.count
     
-    if not raw_results:
+    if not count:
         print("\n❌ No results found. Please check your search criteria or API key.")
         return False
     
-    # Parse results
-    print("\nParsing results...")
-    papers = parse_scopus_results(raw_results)
-    
-    # Save results
-    save_results(papers)
+    print(f"\n✓ Retrieved {count} papers from Scopus")
+    print(f"✓ Results saved to: {output_path}")
     
     # Display summary
-    display_summary(papers)
+    display_summary(sample, count)
     
     print("\n" + "="*60)
     print("✓ PHASE 1 COMPLETE")
     print("="*60)
-    print(f"\nRetrieved and saved {len(papers)} papers")
+    print(f"\nRetrieved and saved {count} papers")
     print("You can now proceed to Phase 2 (Grading Algorithm)")
     
     return True
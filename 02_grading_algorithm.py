@@ -3,11 +3,56 @@ Phase 2: Grading Algorithm
 Score and rank papers based on multiple criteria.
 """
 
+import argparse
 import json
-from typing import List, Dict
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
 import config
 import utils
 
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Batch grading unavailable; papers are graded one at a time
+
+# Keyword lists used for scoring (in addition to config.SEARCH_KEYWORDS)
+MULTILEVEL_STRONG_KEYWORDS = ["hierarchical linear model", "HLM", "multilevel model", "nested data"]
+MULTILEVEL_WEAK_KEYWORDS = ["multilevel", "multi-level", "hierarchical"]
+MIXED_METHODS_EXPLICIT_KEYWORDS = ["mixed method", "mixed-method", "qualitative and quantitative"]
+MIXED_METHODS_IMPLICIT_KEYWORDS = ["multi-method", "triangulation", "convergent design"]
+PORTUGAL_KEYWORDS = ["Portugal", "Portuguese"]
+
+KEYWORD_CATEGORIES = {
+    'multilevel': config.SEARCH_KEYWORDS['fundamental']['multilevel'],
+    'mixed_methods': config.SEARCH_KEYWORDS['fundamental']['mixed_methods'],
+    'multilevel_strong': MULTILEVEL_STRONG_KEYWORDS,
+    'multilevel_weak': MULTILEVEL_WEAK_KEYWORDS,
+    'mixed_methods_explicit': MIXED_METHODS_EXPLICIT_KEYWORDS,
+    'mixed_methods_implicit': MIXED_METHODS_IMPLICIT_KEYWORDS,
+    'vbhc': config.SEARCH_KEYWORDS['nice_to_have']['vbhc'],
+    'nhs_context': config.SEARCH_KEYWORDS['nice_to_have']['context'],
+    'portugal': PORTUGAL_KEYWORDS,
+}
+
+# Categories that contribute to the score (in grading order)
+SCORED_CATEGORIES = [
+    'multilevel_strong', 'multilevel_weak', 'mixed_methods_explicit', 'mixed_methods_implicit',
+    'vbhc', 'nhs_context', 'portugal',
+]
+
+# Citation count that earns the full impact score
+MAX_CITATIONS = 500
+
+# Compiled once; scans each document a single time for all categories
+KEYWORD_MATCHER = utils.KeywordMatcher(KEYWORD_CATEGORIES, word_boundary=config.KEYWORD_WORD_BOUNDARY)
+
+def count_keywords(text: str) -> Dict[str, int]:
+    """Count keyword hits per category in a single pass over the text."""
+    return KEYWORD_MATCHER.count(text)
+
 def customize_weights() -> Dict:
     """
     Allow user to customize grading weights interactively.
@@ -123,22 +168,19 @@ def get_weight_input(name: str, default: float) -> float:
         except ValueError:
             print("Please enter a valid number")
 
-def score_multilevel_keywords(text: str, weights: Dict) -> Dict[str, int]:
+def score_multilevel_keywords(counts: Dict[str, int], weights: Dict) -> Dict[str, int]:
     """
     Score paper based on multilevel analysis keywords.
     
     Args:
-        text: Combined title + abstract text
+        counts: Keyword hit counts per category (see count_keywords)
         weights: Grading weights dictionary
         
     Returns:
         Dictionary with strong and weak scores
     """
-    strong_keywords = ["hierarchical linear model", "HLM", "multilevel model", "nested data"]
-    weak_keywords = ["multilevel", "multi-level", "hierarchical"]
-    
-    strong_count = utils.count_keyword_matches(text, strong_keywords)
-    weak_count = utils.count_keyword_matches(text, weak_keywords)
+    strong_count = counts['multilevel_strong']
+    weak_count = counts['multilevel_weak']
     
     # Strong keywords get full points, weak get partial
     strong_score = min(strong_count * 10, weights['class_relevance']['multilevel_strong'])
@@ -149,22 +191,19 @@ def score_multilevel_keywords(text: str, weights: Dict) -> Dict[str, int]:
         'weak': weak_score if strong_score == 0 else 0  # Don't double-count
     }
 
-def score_mixed_methods(text: str, weights: Dict) -> Dict[str, int]:
+def score_mixed_methods(counts: Dict[str, int], weights: Dict) -> Dict[str, int]:
     """
     Score paper based on mixed methods keywords.
     
     Args:
-        text: Combined title + abstract text
+        counts: Keyword hit counts per category (see count_keywords)
         weights: Grading weights dictionary
         
     Returns:
         Dictionary with explicit and implicit scores
     """
-    explicit_keywords = ["mixed method", "mixed-method", "qualitative and quantitative"]
-    implicit_keywords = ["multi-method", "triangulation", "convergent design"]
-    
-    explicit_count = utils.count_keyword_matches(text, explicit_keywords)
-    implicit_count = utils.count_keyword_matches(text, implicit_keywords)
+    explicit_count = counts['mixed_methods_explicit']
+    implicit_count = counts['mixed_methods_implicit']
     
     explicit_score = min(explicit_count * 10, weights['class_relevance']['mixed_methods_explicit'])
     implicit_score = min(implicit_count * 5, weights['class_relevance']['mixed_methods_implicit'])
@@ -174,36 +213,78 @@ def score_mixed_methods(text: str, weights: Dict) -> Dict[str, int]:
         'implicit': implicit_score if explicit_score == 0 else 0
     }
 
-def score_vbhc_relevance(text: str, weights: Dict) -> int:
+def score_vbhc_relevance(counts: Dict[str, int], weights: Dict) -> int:
     """Score paper based on VBHC keywords."""
-    vbhc_keywords = config.SEARCH_KEYWORDS['nice_to_have']['vbhc']
-    count = utils.count_keyword_matches(text, vbhc_keywords)
-    return min(count * 5, weights['phd_relevance']['vbhc'])
+    return min(counts['vbhc'] * 5, weights['phd_relevance']['vbhc'])
 
-def score_nhs_context(text: str, weights: Dict) -> int:
+def score_nhs_context(counts: Dict[str, int], weights: Dict) -> int:
     """Score paper based on NHS/Beveridgean context keywords."""
-    context_keywords = config.SEARCH_KEYWORDS['nice_to_have']['context']
-    count = utils.count_keyword_matches(text, context_keywords)
-    return min(count * 5, weights['phd_relevance']['nhs_context'])
+    return min(counts['nhs_context'] * 5, weights['phd_relevance']['nhs_context'])
 
-def score_portugal_specific(text: str, weights: Dict) -> int:
+def score_portugal_specific(counts: Dict[str, int], weights: Dict) -> int:
     """Score paper based on Portugal-specific keywords."""
-    portugal_keywords = ["Portugal", "Portuguese"]
-    count = utils.count_keyword_matches(text, portugal_keywords)
-    return min(count * 5, weights['phd_relevance']['portugal'])
+    return min(counts['portugal'] * 5, weights['phd_relevance']['portugal'])
+
+def get_paper_issn(paper: Dict) -> str:
+    """Get the ISSN used to look up a paper's journal (ISSN, else eISSN)."""
+    return paper.get('issn') or paper.get('eissn', 'N/A')
+
+def prefetch_journal_metrics(papers: List[Dict], max_workers: int = None) -> Dict[str, Dict]:
+    """
+    Resolve journal metrics for every distinct journal before grading.
+    
+    Args:
+        papers: Paper dictionaries from Scopus
+        max_workers: Maximum concurrent lookups (default: config.SCOPUS_MAX_CONCURRENCY)
+        
+    Returns:
+        Dictionary mapping normalized ISSN to journal metrics
+    """
+    issns = {}
+    for paper in papers:
+        issn = get_paper_issn(paper)
+        if issn != 'N/A':
+            issns.setdefault(utils.normalize_issn(issn), issn)
+    
+    print(f"\nPrefetching journal metrics for {len(issns)} distinct journals...")
+    start = time.perf_counter()
+    
+    workers = max(1, min(max_workers or config.SCOPUS_MAX_CONCURRENCY, len(issns)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            lambda issn: utils.get_journal_metrics(issn, config.SCOPUS_API_KEY),
+            issns.values()
+        )
+        journal_metrics = dict(zip(issns.keys(), results))
+    
+    utils.journal_metrics_cache.flush()
+    
+    elapsed = time.perf_counter() - start
+    print(f"✓ Prefetched metrics for {len(journal_metrics)} distinct journals in {elapsed:.2f}s")
+    return journal_metrics
 
-def score_journal_quality(issn: str, weights: Dict) -> Dict[str, float]:
+def lookup_journal_metrics(issn: str, journal_metrics: Dict[str, Dict] = None) -> Dict:
+    """Get journal metrics from the prefetched table, fetching on demand if missing."""
+    metrics = None
+    if journal_metrics is not None:
+        metrics = journal_metrics.get(utils.normalize_issn(issn))
+    if metrics is None:
+        metrics = utils.get_journal_metrics(issn, config.SCOPUS_API_KEY)
+    return metrics
+
+def score_journal_quality(issn: str, weights: Dict, journal_metrics: Dict[str, Dict] = None) -> Dict[str, float]:
     """
     Score journal based on CiteScore and SJR.
     
     Args:
         issn: Journal ISSN
         weights: Grading weights dictionary
+        journal_metrics: Prefetched metrics keyed by normalized ISSN (fetched on demand if None)
         
     Returns:
         Dictionary with citescore and sjr scores
     """
-    metrics = utils.get_journal_metrics(issn, config.SCOPUS_API_KEY)
+    metrics = lookup_journal_metrics(issn, journal_metrics)
     
     # Normalize CiteScore (assume max ~20 for top journals)
     citescore = metrics.get('citescore', 'N/A')
@@ -234,7 +315,7 @@ def score_journal_quality(issn: str, weights: Dict) -> Dict[str, float]:
         'raw_sjr': sjr
     }
 
-def score_citations(cited_by_count: int, weights: Dict, max_citations: int = 500) -> float:
+def score_citations(cited_by_count: int, weights: Dict, max_citations: int = MAX_CITATIONS) -> float:
     """
     Score paper based on citation count (normalized).
     
@@ -250,33 +331,34 @@ def score_citations(cited_by_count: int, weights: Dict, max_citations: int = 500
                     weights['impact']['citations_max'])
     return round(normalized, 2)
 
-def grade_paper(paper: Dict, weights: Dict = None) -> Dict:
+def get_paper_text(paper: Dict) -> str:
+    """Combine title and abstract for keyword matching."""
+    return f"{paper.get('title', '')} {paper.get('abstract', '')}"
+
+def build_grading(paper: Dict, counts: Dict[str, int], weights: Dict,
+                  journal_metrics: Dict[str, Dict] = None) -> Dict:
     """
-    Grade a single paper based on all criteria.
+    Build the grading dictionary (total score and breakdown) for a paper.
     
     Args:
         paper: Paper dictionary from Scopus
-        weights: Custom weights dictionary (uses config.GRADING_WEIGHTS if None)
+        counts: Keyword hit counts per category (see count_keywords)
+        weights: Grading weights dictionary
+        journal_metrics: Prefetched journal metrics (see prefetch_journal_metrics)
         
     Returns:
-        Paper dictionary with added grading information
+        Grading dictionary with total_score and breakdown
     """
-    if weights is None:
-        weights = config.GRADING_WEIGHTS
-    
-    # Combine title and abstract for keyword matching
-    text = f"{paper.get('title', '')} {paper.get('abstract', '')}"
-    
     # Score each category
-    multilevel_scores = score_multilevel_keywords(text, weights)
-    mixed_methods_scores = score_mixed_methods(text, weights)
-    vbhc_score = score_vbhc_relevance(text, weights)
-    nhs_score = score_nhs_context(text, weights)
-    portugal_score = score_portugal_specific(text, weights)
+    multilevel_scores = score_multilevel_keywords(counts, weights)
+    mixed_methods_scores = score_mixed_methods(counts, weights)
+    vbhc_score = score_vbhc_relevance(counts, weights)
+    nhs_score = score_nhs_context(counts, weights)
+    portugal_score = score_portugal_specific(counts, weights)
     
     # Journal quality (use ISSN or eISSN)
-    issn = paper.get('issn') or paper.get('eissn', 'N/A')
-    journal_scores = score_journal_quality(issn, weights) if issn != 'N/A' else {'citescore': 0, 'sjr': 0, 'raw_citescore': 'N/A', 'raw_sjr': 'N/A'}
+    issn = get_paper_issn(paper)
+    journal_scores = score_journal_quality(issn, weights, journal_metrics) if issn != 'N/A' else {'citescore': 0, 'sjr': 0, 'raw_citescore': 'N/A', 'raw_sjr': 'N/A'}
     
     # Citation score
     citation_score = score_citations(paper.get('cited_by_count', 0), weights)
@@ -304,8 +386,7 @@ def grade_paper(paper: Dict, weights: Dict = None) -> Dict:
             citation_score
         )
     
-    # Add grading information to paper
-    paper['grading'] = {
+    return {
         'total_score': round(total_score, 2),
         'breakdown': {
             'class_relevance': {
@@ -336,34 +417,349 @@ def grade_paper(paper: Dict, weights: Dict = None) -> Dict:
             }
         }
     }
+
+def grade_paper(paper: Dict, weights: Dict = None, journal_metrics: Dict[str, Dict] = None) -> Dict:
+    """
+    Grade a single paper based on all criteria.
+    
+    Args:
+        paper: Paper dictionary from Scopus
+        weights: Custom weights dictionary (uses config.GRADING_WEIGHTS if None)
+        journal_metrics: Prefetched journal metrics (see prefetch_journal_metrics)
+        
+    Returns:
+        Paper dictionary with added grading information
+    """
+    if weights is None:
+        weights = config.GRADING_WEIGHTS
+    
+    counts = count_keywords(get_paper_text(paper))
+    paper['grading'] = build_grading(paper, counts, weights, journal_metrics)
     
     return paper
 
-def grade_all_papers(papers: List[Dict], weights: Dict = None) -> List[Dict]:
-    """Grade all papers and sort by total score."""
+def _parse_metric(value) -> float:
+    """Parse a raw journal metric; NaN if unavailable or not numeric."""
+    if value == 'N/A':
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _round_array(values: 'np.ndarray', ndigits: int = 2) -> 'np.ndarray':
+    """
+    Round each value exactly like the built-in round().
+    
+    np.round scales by 10**ndigits before rounding, which can pick the other
+    side of a half-way point; those few values are rounded with round() instead.
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, ndigits)
+    scaled = values * 10.0 ** ndigits
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half).tolist():
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+def extract_features(papers: List[Dict], journal_metrics: Dict[str, Dict] = None) -> Dict[str, 'np.ndarray']:
+    """
+    Compute the raw grading features of all papers as columns.
+    
+    Args:
+        papers: Paper dictionaries from Scopus
+        journal_metrics: Prefetched journal metrics (see prefetch_journal_metrics)
+        
+    Returns:
+        Dictionary with one array per scored keyword category, plus
+        'citescore' and 'sjr' (raw values, NaN if unavailable) and 'citations'
+    """
+    counts = [count_keywords(get_paper_text(paper)) for paper in papers]
+    features = {
+        category: np.array([c[category] for c in counts], dtype=np.int64)
+        for category in SCORED_CATEGORIES
+    }
+    
+    citescores, sjrs = [], []
+    for paper in papers:
+        issn = get_paper_issn(paper)
+        metrics = lookup_journal_metrics(issn, journal_metrics) if issn != 'N/A' else {}
+        citescores.append(_parse_metric(metrics.get('citescore', 'N/A')))
+        sjrs.append(_parse_metric(metrics.get('sjr', 'N/A')))
+    
+    features['citescore'] = np.array(citescores, dtype=float)
+    features['sjr'] = np.array(sjrs, dtype=float)
+    features['citations'] = np.array([paper.get('cited_by_count', 0) for paper in papers], dtype=np.int64)
+    return features
+
+def feature_row(paper: Dict, counts: Dict[str, int], journal_metrics: Dict[str, Dict] = None) -> Dict[str, float]:
+    """Raw grading features of one paper (one row of extract_features)."""
+    issn = get_paper_issn(paper)
+    metrics = lookup_journal_metrics(issn, journal_metrics) if issn != 'N/A' else {}
+    row = {category: counts[category] for category in SCORED_CATEGORIES}
+    row['citescore'] = _parse_metric(metrics.get('citescore', 'N/A'))
+    row['sjr'] = _parse_metric(metrics.get('sjr', 'N/A'))
+    row['citations'] = paper.get('cited_by_count', 0)
+    return row
+
+def features_from_rows(rows: List[Dict[str, float]]) -> Dict[str, 'np.ndarray']:
+    """Feature columns (as from extract_features) of rows from feature_row."""
+    return {
+        name: np.array([row[name] for row in rows], dtype=float if name in ('citescore', 'sjr') else np.int64)
+        for name in list(SCORED_CATEGORIES) + ['citescore', 'sjr', 'citations']
+    }
+
+def score_features(features: Dict[str, 'np.ndarray'], weights: Dict) -> 'np.ndarray':
+    """
+    Compute total scores for all papers at once.
+    
+    Uses the same arithmetic (caps, rounding, zero class-relevance threshold)
+    as build_grading, so the totals are identical to grade_paper.
+    
+    Args:
+        features: Feature columns from extract_features
+        weights: Grading weights dictionary
+        
+    Returns:
+        Array of total scores
+    """
+    class_weights = weights['class_relevance']
+    phd_weights = weights['phd_relevance']
+    journal_weights = weights['journal_quality']
+    impact_weights = weights['impact']
+    
+    strong = np.minimum(features['multilevel_strong'] * 10, class_weights['multilevel_strong'])
+    weak = np.where(strong == 0, np.minimum(features['multilevel_weak'] * 5, class_weights['multilevel_weak']), 0)
+    explicit = np.minimum(features['mixed_methods_explicit'] * 10, class_weights['mixed_methods_explicit'])
+    implicit = np.where(explicit == 0, np.minimum(features['mixed_methods_implicit'] * 5, class_weights['mixed_methods_implicit']), 0)
+    
+    vbhc = np.minimum(features['vbhc'] * 5, phd_weights['vbhc'])
+    nhs = np.minimum(features['nhs_context'] * 5, phd_weights['nhs_context'])
+    portugal = np.minimum(features['portugal'] * 5, phd_weights['portugal'])
+    
+    citescore_max = journal_weights['citescore_max']
+    sjr_max = journal_weights['sjr_max']
+    citescore = _round_array(np.nan_to_num(np.minimum(features['citescore'] / 20 * citescore_max, citescore_max), nan=0.0))
+    sjr = _round_array(np.nan_to_num(np.minimum(features['sjr'] / 5 * sjr_max, sjr_max), nan=0.0))
+    
+    citations_max = impact_weights['citations_max']
+    citations = _round_array(np.minimum(features['citations'] / MAX_CITATIONS * citations_max, citations_max))
+    
+    class_relevance_subtotal = strong + weak + explicit + implicit
+    total = class_relevance_subtotal + vbhc + nhs + portugal + citescore + sjr + citations
+    
+    # Class Relevance cannot be zero
+    return np.where(class_relevance_subtotal == 0, 0.0, _round_array(total))
+
+def save_features(features: Dict[str, 'np.ndarray'], papers: List[Dict], filepath):
+    """
+    Save raw feature columns (rows in the same order as papers) for re-ranking.
+    
+    Args:
+        features: Feature columns from extract_features
+        papers: Papers the feature rows belong to
+        filepath: Output JSON path
+    """
+    columns = {}
+    for name, column in features.items():
+        values = column.tolist()
+        if column.dtype.kind == 'f':
+            values = [None if math.isnan(v) else v for v in values]  # JSON has no NaN
+        columns[name] = values
+    
+    data = {
+        'scopus_id': [paper.get('scopus_id', 'N/A') for paper in papers],
+        'title': [paper.get('title', 'N/A') for paper in papers],
+        'features': columns
+    }
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def load_features(filepath) -> Dict:
+    """
+    Load feature columns saved by save_features.
+    
+    Returns:
+        Dictionary with 'scopus_id' and 'title' lists and 'features' as NumPy arrays
+    """
+    data = utils.load_json(filepath)
+    data['features'] = {
+        name: np.array(values, dtype=float if name in ('citescore', 'sjr') else np.int64)
+        for name, values in data['features'].items()
+    }
+    return data
+
+def top_k_indices(scores: 'np.ndarray', k: int) -> 'np.ndarray':
+    """
+    Indices of the k highest scores, best first.
+    
+    Same result as np.argsort(-scores, kind='stable')[:k] (ties keep their
+    original order), but only the candidates found by argpartition are sorted.
+    """
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    
+    # Every score at least as good as the k-th best, including all ties with it
+    kth_best = np.partition(-scores, k - 1)[k - 1]
+    candidates = np.flatnonzero(-scores <= kth_best)
+    return candidates[np.argsort(-scores[candidates], kind='stable')[:k]]
+
+def grade_papers_batch(papers: List[Dict], weights: Dict, journal_metrics: Dict[str, Dict] = None,
+                       detail_limit: int = None, features_path=None,
+                       full_ranking: bool = True) -> List[Dict]:
+    """
+    Grade all papers column-wise with NumPy and return them ranked by score.
+    
+    Args:
+        papers: Paper dictionaries from Scopus
+        weights: Grading weights dictionary
+        journal_metrics: Prefetched journal metrics (see prefetch_journal_metrics)
+        detail_limit: Only the top N papers get the full score breakdown
+            (the rest get total_score only); None for all papers
+        features_path: If given, save the raw features (in ranked order) here
+        full_ranking: If False, only the top detail_limit (default 20) papers
+            are selected and returned, without sorting the whole corpus
+        
+    Returns:
+        Papers sorted by total score (descending), each with grading information
+    """
+    features = extract_features(papers, journal_metrics)
+    totals = score_features(features, weights)
+    
+    if full_ranking:
+        # Stable, like list.sort: ties keep their original order
+        order = np.argsort(-totals, kind='stable')
+    else:
+        order = top_k_indices(totals, detail_limit or 20)
+    
+    graded_papers = []
+    for rank, i in enumerate(order.tolist()):
+        paper = papers[i]
+        if detail_limit is None or rank < detail_limit:
+            counts = {category: int(features[category][i]) for category in SCORED_CATEGORIES}
+            paper['grading'] = build_grading(paper, counts, weights, journal_metrics)
+        else:
+            total = float(totals[i])
+            paper['grading'] = {'total_score': total if total else 0}
+        graded_papers.append(paper)
+    
+    if features_path is not None:
+        if full_ranking:
+            save_features({name: column[order] for name, column in features.items()}, graded_papers, features_path)
+        else:
+            save_features(features, papers, features_path)
+    
+    return graded_papers
+
+def grade_papers_streaming(papers: Iterable[Dict], weights: Dict = None, k: int = 20,
+                           features_path=None) -> Tuple[List[Dict], int]:
+    """
+    Grade papers one at a time, keeping only a running top k in memory.
+    
+    Journal metrics are looked up as new journals appear (through the
+    persistent cache), since the stream cannot be scanned in advance.
+    For re-ranking, only the raw features of each paper (a few numbers,
+    its ID and title) are kept beside the top k.
+    
+    Args:
+        papers: Iterable of paper dictionaries (e.g. a streaming reader)
+        weights: Custom weights dictionary (uses config.GRADING_WEIGHTS if None)
+        k: Number of top papers to keep
+        features_path: If given, save the raw features here (requires NumPy)
+        
+    Returns:
+        Tuple of (top k graded papers, best first; number of papers graded)
+    """
+    if weights is None:
+        weights = config.GRADING_WEIGHTS
+    
+    journal_metrics = {}
+    best = utils.RunningTopK(k)
+    save_rows = features_path is not None and np is not None
+    rows, ids = [], []
+    
+    for paper in papers:
+        issn = get_paper_issn(paper)
+        if issn != 'N/A':
+            key = utils.normalize_issn(issn)
+            if key not in journal_metrics:
+                journal_metrics[key] = utils.get_journal_metrics(issn, config.SCOPUS_API_KEY)
+        
+        counts = count_keywords(get_paper_text(paper))
+        paper['grading'] = build_grading(paper, counts, weights, journal_metrics)
+        best.push(paper['grading']['total_score'], paper)
+        if save_rows:
+            rows.append(feature_row(paper, counts, journal_metrics))
+            ids.append({'scopus_id': paper.get('scopus_id', 'N/A'), 'title': paper.get('title', 'N/A')})
+        
+        if best.count % 100 == 0:
+            print(f"Graded {best.count} papers...")
+    
+    utils.journal_metrics_cache.flush()
+    print(f"\n✓ Graded {best.count} papers ({len(journal_metrics)} distinct journals)")
+    if save_rows:
+        save_features(features_from_rows(rows), ids, features_path)
+    return best.items(), best.count
+
+def grade_all_papers(papers: List[Dict], weights: Dict = None, detail_limit: int = None,
+                     features_path=None, full_ranking: bool = True) -> List[Dict]:
+    """
+    Grade all papers and sort by total score.
+    
+    Args:
+        papers: Paper dictionaries from Scopus
+        weights: Custom weights dictionary (uses config.GRADING_WEIGHTS if None)
+        detail_limit: Only the top N papers get the full score breakdown; None for all
+        features_path: If given, save the raw features for re-ranking (requires NumPy)
+        full_ranking: If False, return only the top detail_limit (default 20)
+            papers instead of the whole corpus sorted
+        
+    Returns:
+        Graded papers sorted by total score (descending)
+    """
     print("\n" + "="*60)
     print("GRADING PAPERS")
     print("="*60)
     
-    graded_papers = []
-    for i, paper in enumerate(papers, 1):
-        if i % 10 == 0:
-            print(f"Graded {i}/{len(papers)} papers...")
-        graded_paper = grade_paper(paper, weights)
-        graded_papers.append(graded_paper)
+    if weights is None:
+        weights = config.GRADING_WEIGHTS
     
-    # Sort by total score (descending)
-    graded_papers.sort(key=lambda x: x['grading']['total_score'], reverse=True)
+    # Resolve all journal metrics up front so grading itself needs no network
+    journal_metrics = prefetch_journal_metrics(papers)
     
-    print(f"\n✓ Graded {len(graded_papers)} papers")
+    if np is not None:
+        graded_papers = grade_papers_batch(papers, weights, journal_metrics, detail_limit,
+                                           features_path, full_ranking)
+    else:
+        graded_papers = []
+        for i, paper in enumerate(papers, 1):
+            if i % 10 == 0:
+                print(f"Graded {i}/{len(papers)} papers...")
+            graded_paper = grade_paper(paper, weights, journal_metrics)
+            graded_papers.append(graded_paper)
+        
+        if full_ranking:
+            # Sort by total score (descending)
+            graded_papers.sort(key=lambda x: x['grading']['total_score'], reverse=True)
+        else:
+            graded_papers = utils.top_k(graded_papers, detail_limit or 20,
+                                        key=lambda x: x['grading']['total_score'])
+    
+    print(f"\n✓ Graded {len(papers)} papers")
     return graded_papers
 
-def generate_top_20_report(graded_papers: List[Dict]):
-    """Generate markdown report for top 20 papers."""
+def generate_top_20_report(graded_papers: List[Dict], total_graded: int = None):
+    """
+    Generate markdown report for top 20 papers.
+    
+    Args:
+        graded_papers: Graded papers sorted by total score (at least the top 20)
+        total_graded: Number of papers graded (defaults to len(graded_papers))
+    """
     top_20 = graded_papers[:20]
     
     report = "# Top 20 Papers - Grading Report\n\n"
-    report += f"**Total papers graded**: {len(graded_papers)}\n\n"
+    report += f"**Total papers graded**: {total_graded or len(graded_papers)}\n\n"
     report += "---\n\n"
     
     for i, paper in enumerate(top_20, 1):
@@ -416,26 +812,39 @@ def main():
     print("PHASE 2: GRADING ALGORITHM")
     print("="*60)
     
-    # Load papers from Phase 1
+    # Load papers from Phase 1 (streaming mode follows the file while Phase 1 writes it)
     try:
-        papers = utils.load_json(config.OUTPUT_FILES['scopus_results'])
+        if config.GRADING_STREAMING:
+            papers = utils.follow_jsonl(config.OUTPUT_FILES['scopus_results'])
+        else:
+            papers = utils.load_records(config.OUTPUT_FILES['scopus_results'])
     except FileNotFoundError:
-        print("\n❌ ERROR: scopus_results.json not found!")
+        print("\n❌ ERROR: scopus_results.jsonl not found!")
         print("Please run Phase 1 (01_search_strategy.py) first.")
         return False
     
     # Customize weights
     custom_weights = customize_weights()
     
-    # Grade all papers
-    graded_papers = grade_all_papers(papers, custom_weights)
+    # Grade all papers (the top-20 report always needs the full breakdown)
+    detail_limit = max(config.GRADING_DETAIL_LIMIT, 20) if config.GRADING_DETAIL_LIMIT else None
+    if config.GRADING_STREAMING:
+        graded_papers, total_graded = grade_papers_streaming(papers, custom_weights, detail_limit or 20,
+                                                             features_path=config.OUTPUT_FILES['graded_features'])
+    else:
+        graded_papers = grade_all_papers(papers, custom_weights, detail_limit,
+                                         features_path=config.OUTPUT_FILES['graded_features'],
+                                         full_ranking=config.GRADING_FULL_RANKING)
+        total_graded = len(papers)
     
-    # Save graded papers
-    utils.save_json(graded_papers, config.OUTPUT_FILES['graded_papers'])
+    # Save graded papers (the whole corpus ranked, or only the top papers)
+    utils.save_jsonl(graded_papers, config.OUTPUT_FILES['graded_papers'])
     print(f"✓ Graded papers saved to: {config.OUTPUT_FILES['graded_papers']}")
+    if np is not None:
+        print(f"✓ Features for re-ranking saved to: {config.OUTPUT_FILES['graded_features']}")
     
     # Generate top 20 report
-    generate_top_20_report(graded_papers)
+    generate_top_20_report(graded_papers, total_graded)
     
     # Display summary
     print("\n" + "="*60)
@@ -450,11 +859,69 @@ def main():
     print("\n" + "="*60)
     print("✓ PHASE 2 COMPLETE")
     print("="*60)
-    print(f"\nGraded {len(graded_papers)} papers")
+    print(f"\nGraded {total_graded} papers")
     print(f"Top 20 report generated: {config.OUTPUT_FILES['top_20_papers']}")
     print("\nYou can now proceed to Phase 3 (Paper Retrieval)")
     
     return True
 
+def rerank(args: List[str] = None) -> bool:
+    """
+    Re-rank graded papers under new weights using the saved features only.
+    
+    No journal metrics or Scopus calls are needed: each weight profile is
+    scored over the feature columns saved by Phase 2 and sorted.
+    
+    Usage:
+        python 02_grading_algorithm.py rerank [profile.json ...] [--top N]
+    
+    Each profile is a JSON file shaped like config.GRADING_WEIGHTS; without
+    profiles the weights are entered interactively.
+    """
+    parser = argparse.ArgumentParser(prog="02_grading_algorithm.py rerank",
+                                     description="Re-rank graded papers with new weights.")
+    parser.add_argument('profiles', nargs='*', help="Weight profile JSON files")
+    parser.add_argument('--top', type=int, default=10, help="Number of papers to show per profile")
+    options = parser.parse_args(args)
+    
+    if np is None:
+        print("\n❌ ERROR: re-ranking requires NumPy (pip install numpy)")
+        return False
+    
+    features_path = config.OUTPUT_FILES['graded_features']
+    try:
+        start = time.perf_counter()
+        data = load_features(features_path)
+        load_time = time.perf_counter() - start
+    except FileNotFoundError:
+        print(f"\n❌ ERROR: {features_path.name} not found!")
+        print("Please run Phase 2 (02_grading_algorithm.py) first.")
+        return False
+    
+    features = data['features']
+    print(f"\n✓ Loaded features for {len(data['title'])} papers in {load_time:.3f}s")
+    
+    if options.profiles:
+        profiles = [(path, utils.load_json(path)) for path in options.profiles]
+    else:
+        profiles = [('custom', customize_weights())]
+    
+    for name, weights in profiles:
+        start = time.perf_counter()
+        totals = score_features(features, weights)
+        order = np.argsort(-totals, kind='stable')[:options.top]
+        elapsed = time.perf_counter() - start
+        
+        print("\n" + "="*60)
+        print(f"RANKING: {name} ({elapsed * 1000:.1f} ms)")
+        print("="*60)
+        for rank, i in enumerate(order.tolist(), 1):
+            print(f"{rank:>3}. [{totals[i]:6.2f}] {data['title'][i]}")
+    
+    return True
+
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == 'rerank':
+        rerank(sys.argv[2:])
+    else:
+        main()
@@ -3,21 +3,48 @@ Phase 3: Paper Selection & Retrieval
 Present top papers, allow user selection, and download/extract paper.
 """
 
+import asyncio
 import json
 import requests
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
 import config
 import utils
 import os
 
-def display_top_papers(graded_papers: list, num_papers: int = 20):
-    """Display top N papers for user selection."""
+UNPAYWALL_EMAIL = "research@example.com"  # Replace with actual email
+
+# Every PDF starts with this signature (within its first 1024 bytes)
+PDF_MAGIC = b'%PDF-'
+
+# Download sources, by name (see config.DOWNLOAD_PRIORITY)
+DOWNLOAD_SOURCES = {
+    'scopus': "Scopus",
+    'doi': "DOI resolution",
+    'unpaywall': "Unpaywall (Open Access)",
+}
+
+def display_top_papers(graded_papers: Iterable[Dict], num_papers: int = 20) -> list:
+    """
+    Display top N papers for user selection.
+    
+    Only the best num_papers are kept while reading graded_papers, so it
+    can be a stream of any size (see utils.iter_records).
+    
+    Returns:
+        The displayed papers, best first (selection numbers index into this list)
+    """
     print("\n" + "="*60)
     print(f"TOP {num_papers} PAPERS")
     print("="*60)
     
-    for i, paper in enumerate(graded_papers[:num_papers], 1):
+    top_papers = utils.top_k(graded_papers, num_papers, key=lambda p: p['grading']['total_score'])
+    
+    for i, paper in enumerate(top_papers, 1):
         grading = paper['grading']
         print(f"\n{i}. {paper['title']}")
         print(f"   Score: {grading['total_score']}/100")
@@ -26,6 +53,8 @@ def display_top_papers(graded_papers: list, num_papers: int = 20):
         print(f"   Year: {paper['cover_date'][:4] if paper['cover_date'] != 'N/A' else 'N/A'}")
         print(f"   Citations: {paper['cited_by_count']}")
         print(f"   DOI: {paper['doi']}")
+    
+    return top_papers
 
 def select_paper(graded_papers: list) -> Dict:
     """Interactive paper selection."""
@@ -38,7 +67,17 @@ def select_paper(graded_papers: list) -> Dict:
         except ValueError:
             print("Please enter a valid number")
 
-def download_from_scopus(paper: Dict) -> Optional[Path]:
+def report(message: str, cancel: Optional[threading.Event] = None):
+    """Print a download message, unless the download was cancelled (it lost a race)."""
+    if cancel is None or not cancel.is_set():
+        print(message)
+
+def is_pdf(data: bytes) -> bool:
+    """Check the PDF signature of downloaded content (content-type headers are often wrong)."""
+    return PDF_MAGIC in data[:1024]
+
+def download_from_scopus(paper: Dict, pdf_path: Optional[Path] = None,
+                         cancel: Optional[threading.Event] = None) -> Optional[Path]:
     """Attempt to download PDF from Scopus."""
     scopus_id = paper.get('scopus_id')
     if not scopus_id:
@@ -51,69 +90,289 @@ def download_from_scopus(paper: Dict) -> Optional[Path]:
     
     try:
         url = f"https://api.elsevier.com/content/article/scopus_id/{scopus_id}"
-        response = requests.get(url, headers=headers, timeout=30)
-        
-        if response.status_code == 200 and response.headers.get('content-type') == 'application/pdf':
-            pdf_path = config.SELECTED_PAPER_DIR / f"{scopus_id}.pdf"
-            with open(pdf_path, 'wb') as f:
-                f.write(response.content)
-            print(f"✓ Downloaded from Scopus")
+        pdf_path = pdf_path or config.SELECTED_PAPER_DIR / f"{scopus_id}.pdf"
+        if fetch_pdf(url, pdf_path, headers=headers, cancel=cancel,
+                     keys=pdf_keys(paper.get('doi'), scopus_id)):
+            report(f"✓ Downloaded from Scopus", cancel)
             return pdf_path
     except Exception as e:
-        print(f"✗ Scopus download failed: {e}")
+        report(f"✗ Scopus download failed: {e}", cancel)
     
     return None
 
-def download_from_doi(doi: str) -> Optional[Path]:
+def download_from_doi(doi: str, pdf_path: Optional[Path] = None,
+                      cancel: Optional[threading.Event] = None) -> Optional[Path]:
     """Attempt to download PDF via DOI resolution."""
     if doi == 'N/A':
         return None
     
     try:
         # Try DOI.org redirect
-        response = requests.get(f"https://doi.org/{doi}", allow_redirects=True, timeout=30)
-        
-        if response.status_code == 200 and 'application/pdf' in response.headers.get('content-type', ''):
-            pdf_path = config.SELECTED_PAPER_DIR / f"{doi.replace('/', '_')}.pdf"
-            with open(pdf_path, 'wb') as f:
-                f.write(response.content)
-            print(f"✓ Downloaded via DOI")
+        pdf_path = pdf_path or config.SELECTED_PAPER_DIR / f"{doi.replace('/', '_')}.pdf"
+        if fetch_pdf(f"https://doi.org/{doi}", pdf_path, cancel=cancel, keys=pdf_keys(doi)):
+            report(f"✓ Downloaded via DOI", cancel)
             return pdf_path
     except Exception as e:
-        print(f"✗ DOI download failed: {e}")
+        report(f"✗ DOI download failed: {e}", cancel)
     
     return None
 
-def download_from_unpaywall(doi: str) -> Optional[Path]:
+def find_unpaywall_pdf_url(doi: str) -> Optional[str]:
+    """
+    Look up the open access PDF location of a DOI on Unpaywall.
+    
+    Returns:
+        URL of the best open access PDF, or None if there is none
+    """
+    url = f"https://api.unpaywall.org/v2/{doi}?email={UNPAYWALL_EMAIL}"
+    response = utils.http_client.get(url)
+    
+    if response.status_code == 200:
+        oa_location = response.json().get('best_oa_location')
+        if oa_location and oa_location.get('url_for_pdf'):
+            return oa_location['url_for_pdf']
+    return None
+
+def pdf_keys(doi: Optional[str], scopus_id: Optional[str] = None) -> List[str]:
+    """Keys identifying a paper in the PDF store (utils.pdf_store)."""
+    keys = []
+    if scopus_id:
+        keys.append(f"scopus:{scopus_id}")
+    if doi and doi != 'N/A':
+        keys.append(f"doi:{doi.lower()}")
+    return keys
+
+def _content_range_total(value: Optional[str]) -> Optional[int]:
+    """Total size from a Content-Range header ("bytes 100-199/200")."""
+    try:
+        return int(value.rsplit('/', 1)[1])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def stream_download(url: str, part_path: Path, headers: Optional[Dict] = None,
+                    cancel: Optional[threading.Event] = None) -> bool:
+    """
+    Stream a download to a partial file, chunk by chunk.
+    
+    If the partial file already holds data (an earlier attempt or run was
+    interrupted), only the rest is requested with an HTTP Range request,
+    guarded by If-Range so a changed file is downloaded from scratch. Dropped
+    connections and truncated responses are resumed the same way, up to
+    config.DOWNLOAD_RESUME_ATTEMPTS times.
+    
+    Args:
+        url: Download URL (redirects are followed)
+        part_path: Partial file to write to
+        headers: Request headers
+        cancel: Event that stops the download when set (the partial file is kept)
+        
+    Returns:
+        True if the download is complete
+    """
+    part_path.parent.mkdir(parents=True, exist_ok=True)
+    validator_path = part_path.with_suffix('.validator')
+    
+    for attempt in range(config.DOWNLOAD_RESUME_ATTEMPTS + 1):
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        request_headers = dict(headers or {})
+        request_headers['Accept-Encoding'] = 'identity'  # Byte ranges refer to the raw file
+        if offset:
+            request_headers['Range'] = f"bytes={offset}-"
+            if validator_path.exists():
+                request_headers['If-Range'] = validator_path.read_text(encoding='utf-8')
+        
+        try:
+            with utils.http_client.get(url, headers=request_headers, stream=True) as response:
+                if response.status_code == 206 and offset:
+                    mode = 'ab'
+                    total = _content_range_total(response.headers.get('Content-Range'))
+                elif response.status_code == 200:
+                    mode = 'wb'  # New download, or the server sent the whole file again
+                    total = int(response.headers['Content-Length']) if response.headers.get('Content-Length') else None
+                elif response.status_code == 416:
+                    part_path.unlink(missing_ok=True)  # Stale partial file
+                    continue
+                else:
+                    return False
+                
+                # Strong validators only (If-Range does not accept weak ETags)
+                validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                if validator and not validator.startswith('W/'):
+                    validator_path.write_text(validator, encoding='utf-8')
+                
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=config.DOWNLOAD_CHUNK_SIZE):
+                        if cancel is not None and cancel.is_set():
+                            return False
+                        f.write(chunk)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            report(f"⚠ Download interrupted ({e}), resuming...", cancel)
+            continue
+        
+        if total is None or part_path.stat().st_size >= total:
+            validator_path.unlink(missing_ok=True)
+            return True
+        report(f"⚠ Download truncated at {part_path.stat().st_size}/{total} bytes, resuming...", cancel)
+    
+    return False
+
+def fetch_pdf(url: str, pdf_path: Path, headers: Optional[Dict] = None,
+              cancel: Optional[threading.Event] = None, keys: Iterable[str] = ()) -> bool:
+    """
+    Download a PDF to the given path, through the shared PDF store.
+    
+    The PDF is streamed to disk (see stream_download), checked for the PDF
+    signature, moved into utils.pdf_store under its SHA-256 and indexed
+    under `keys`, then linked to pdf_path. A PDF already stored under one
+    of the keys is linked without downloading it again.
+    
+    Args:
+        url: PDF URL (redirects are followed)
+        pdf_path: Where to make the PDF available
+        headers: Request headers
+        cancel: If set before the download completes, nothing is linked
+        keys: Document keys of the paper (see pdf_keys)
+        
+    Returns:
+        True if a valid PDF is available at pdf_path
+    """
+    with utils.pdf_store.download_lock(url):
+        stored = utils.pdf_store.find(keys)
+        if stored is None:
+            part_path = utils.pdf_store.partial_path(url)
+            if not stream_download(url, part_path, headers, cancel):
+                return False
+            
+            with open(part_path, 'rb') as f:
+                if not is_pdf(f.read(1024)):
+                    part_path.unlink()
+                    return False
+            stored = utils.pdf_store.add(part_path, keys)
+    
+    if cancel is not None and cancel.is_set():
+        return False
+    utils.pdf_store.link(stored, pdf_path)
+    return True
+
+def download_from_unpaywall(doi: str, pdf_path: Optional[Path] = None,
+                            cancel: Optional[threading.Event] = None) -> Optional[Path]:
     """Attempt to download from Unpaywall (open access)."""
     if doi == 'N/A':
         return None
     
     try:
-        # Unpaywall API
-        email = "research@example.com"  # Replace with actual email
-        url = f"https://api.unpaywall.org/v2/{doi}?email={email}"
-        response = requests.get(url, timeout=30)
+        pdf_url = find_unpaywall_pdf_url(doi)
         
-        if response.status_code == 200:
-            data = response.json()
-            oa_location = data.get('best_oa_location')
-            
-            if oa_location and oa_location.get('url_for_pdf'):
-                pdf_url = oa_location['url_for_pdf']
-                pdf_response = requests.get(pdf_url, timeout=30)
-                
-                if pdf_response.status_code == 200:
-                    pdf_path = config.SELECTED_PAPER_DIR / f"{doi.replace('/', '_')}.pdf"
-                    with open(pdf_path, 'wb') as f:
-                        f.write(pdf_response.content)
-                    print(f"✓ Downloaded from Unpaywall (Open Access)")
-                    return pdf_path
+        if pdf_url and not (cancel is not None and cancel.is_set()):
+            pdf_path = pdf_path or config.SELECTED_PAPER_DIR / f"{doi.replace('/', '_')}.pdf"
+            if fetch_pdf(pdf_url, pdf_path, cancel=cancel, keys=pdf_keys(doi)):
+                report(f"✓ Downloaded from Unpaywall (Open Access)", cancel)
+                return pdf_path
     except Exception as e:
-        print(f"✗ Unpaywall download failed: {e}")
+        report(f"✗ Unpaywall download failed: {e}", cancel)
     
     return None
 
+def download_from_source(source: str, paper: Dict, pdf_path: Optional[Path] = None,
+                         cancel: Optional[threading.Event] = None) -> Optional[Path]:
+    """
+    Attempt to download the paper from one source.
+    
+    Args:
+        source: Source name (a key of DOWNLOAD_SOURCES)
+        paper: Paper dictionary
+        pdf_path: Where to save the PDF (default: named after the Scopus ID or DOI)
+        cancel: Event that abandons the download when set
+    """
+    if source == 'scopus':
+        return download_from_scopus(paper, pdf_path, cancel)
+    if source == 'doi':
+        return download_from_doi(paper['doi'], pdf_path, cancel)
+    if source == 'unpaywall':
+        return download_from_unpaywall(paper['doi'], pdf_path, cancel)
+    raise ValueError(f"Unknown download source: {source}")
+
+def default_pdf_path(source: str, paper: Dict) -> Path:
+    """Path a source saves the paper to when no path is given."""
+    if source == 'scopus':
+        return config.SELECTED_PAPER_DIR / f"{paper['scopus_id']}.pdf"
+    return config.SELECTED_PAPER_DIR / f"{paper['doi'].replace('/', '_')}.pdf"
+
+def race_temp_path(source: str, paper: Dict) -> Path:
+    """Temporary file a source writes to during a race (next to its final path)."""
+    pdf_path = default_pdf_path(source, paper)
+    return pdf_path.with_name(f".{pdf_path.stem}.{source}.pdf.tmp")
+
+def _race_source(source: str, paper: Dict, temp_path: Path, cancel: threading.Event) -> Optional[Path]:
+    """Run one source of a race; a source still running when the race ends removes its own file."""
+    try:
+        return download_from_source(source, paper, temp_path, cancel)
+    finally:
+        if cancel.is_set():
+            temp_path.unlink(missing_ok=True)
+
+def race_download(paper: Dict, priority: Optional[List[str]] = None,
+                  grace: Optional[float] = None) -> Optional[Path]:
+    """
+    Start all download sources at once and keep the first valid PDF.
+    
+    Each source writes to its own temporary file. When a source succeeds
+    while a higher-priority source is still running, the latter gets
+    `grace` more seconds to finish and win the tie; then the remaining
+    sources are cancelled, stop reporting progress and delete their files.
+    
+    Args:
+        paper: Paper dictionary
+        priority: Source names, most preferred first (default: config.DOWNLOAD_PRIORITY)
+        grace: Seconds to wait for a higher-priority source (default: config.DOWNLOAD_RACE_GRACE)
+        
+    Returns:
+        Path to the PDF, or None if every source failed
+    """
+    priority = priority or config.DOWNLOAD_PRIORITY
+    grace = config.DOWNLOAD_RACE_GRACE if grace is None else grace
+    
+    cancel = threading.Event()
+    temp_paths = {source: race_temp_path(source, paper) for source in priority}
+    
+    pool = ThreadPoolExecutor(max_workers=len(priority))
+    futures = {
+        pool.submit(_race_source, source, paper, temp_paths[source], cancel): source
+        for source in priority
+    }
+    pending = set(futures)
+    succeeded = set()
+    deadline = None
+    try:
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break  # Grace period over
+            succeeded.update(futures[future] for future in done if future.result())
+            
+            if succeeded:
+                best = min(succeeded, key=priority.index)
+                if not any(priority.index(futures[future]) < priority.index(best) for future in pending):
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + grace
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    winner = min(succeeded, key=priority.index) if succeeded else None
+    pdf_path = None
+    if winner:
+        pdf_path = default_pdf_path(winner, paper)
+        os.replace(temp_paths[winner], pdf_path)
+        print(f"✓ Using the PDF from {DOWNLOAD_SOURCES[winner]}")
+    for source, temp_path in temp_paths.items():
+        if source != winner:
+            temp_path.unlink(missing_ok=True)
+    
+    return pdf_path
+
 def manual_upload_prompt(paper: Dict) -> Optional[Path]:
     """Prompt user to manually upload PDF."""
     print("\n" + "="*60)
@@ -165,23 +424,24 @@ def download_paper(paper: Dict) -> Optional[Path]:
     print("DOWNLOADING PAPER")
     print("="*60)
     
-    # Method 1: Scopus
-    print("\n[1/3] Attempting Scopus download...")
-    pdf_path = download_from_scopus(paper)
-    if pdf_path:
-        return pdf_path
-    
-    # Method 2: DOI
-    print("\n[2/3] Attempting DOI resolution...")
-    pdf_path = download_from_doi(paper['doi'])
-    if pdf_path:
-        return pdf_path
-    
-    # Method 3: Unpaywall
-    print("\n[3/3] Attempting Unpaywall (Open Access)...")
-    pdf_path = download_from_unpaywall(paper['doi'])
-    if pdf_path:
-        return pdf_path
+    # A PDF downloaded by an earlier run is reused without any network traffic
+    stored = utils.pdf_store.find(pdf_keys(paper['doi'], paper.get('scopus_id')))
+    if stored:
+        print(f"\n✓ Found in the local PDF store")
+        return utils.pdf_store.link(stored, default_pdf_path('scopus' if paper.get('scopus_id') else 'doi', paper))
+    
+    priority = config.DOWNLOAD_PRIORITY
+    if config.DOWNLOAD_MODE == "race":
+        print(f"\nRacing {', '.join(DOWNLOAD_SOURCES[source] for source in priority)}...")
+        pdf_path = race_download(paper, priority)
+        if pdf_path:
+            return pdf_path
+    else:
+        for i, source in enumerate(priority, 1):
+            print(f"\n[{i}/{len(priority)}] Attempting {DOWNLOAD_SOURCES[source]}...")
+            pdf_path = download_from_source(source, paper)
+            if pdf_path:
+                return pdf_path
     
     # Fallback: Manual upload
     print("\n✗ All automatic download methods failed")
@@ -195,23 +455,36 @@ def extract_paper_text(pdf_path: Path) -> str:
     print("EXTRACTING TEXT FROM PDF")
     print("="*60)
     
-    text = utils.extract_pdf_text(pdf_path)
+    text_path = config.SELECTED_PAPER_DIR / utils.PaperTextStore.TEXT_FILE
+    pages_path = config.SELECTED_PAPER_DIR / utils.PaperTextStore.PAGES_FILE
+    sections_path = config.SELECTED_PAPER_DIR / utils.PaperTextStore.SECTIONS_FILE
+    text = utils.extract_pdf_text(pdf_path, output_path=text_path, index_path=pages_path)
     
     if text:
-        text_path = config.SELECTED_PAPER_DIR / "paper_text.txt"
-        with open(text_path, 'w', encoding='utf-8') as f:
-            f.write(text)
         print(f"✓ Text extracted: {len(text)} characters")
         print(f"✓ Saved to: {text_path}")
+        print(f"✓ Page index saved to: {pages_path.name}")
+        
+        # Locate the sections once, for the later phases
+        with utils.PaperTextStore(text_path, pages_path) as paper:
+            paper.save_sections(sections_path)
+            print(f"✓ Sections found: {', '.join(paper.sections) or 'none'} (saved to {sections_path.name})")
         return text
     else:
         print("✗ Failed to extract text from PDF")
         return ""
 
-def get_cited_papers(scopus_id: str) -> list:
-    """Get papers cited by the selected paper (references)."""
+def get_cited_papers(scopus_id: str, limit: Optional[int] = None) -> list:
+    """
+    Get papers cited by the selected paper (references).
+    
+    Args:
+        scopus_id: Scopus ID of the selected paper
+        limit: Maximum number of references (default: config.RELATED_PAPERS_LIMIT)
+    """
     if not scopus_id:
         return []
+    limit = limit or config.RELATED_PAPERS_LIMIT
     
     headers = {
         'X-ELS-APIKey': config.SCOPUS_API_KEY,
@@ -222,14 +495,14 @@ def get_cited_papers(scopus_id: str) -> list:
         # Get abstract which contains references
         url = f"https://api.elsevier.com/content/abstract/scopus_id/{scopus_id}"
         params = {'view': 'REF'}
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        response = utils.http_client.get(url, headers=headers, params=params)
         
         if response.status_code == 200:
             data = response.json()
             refs = data.get('abstracts-retrieval-response', {}).get('references', {}).get('reference', [])
             
             cited_papers = []
-            for ref in refs[:10]:  # Limit to first 10 references
+            for ref in refs[:limit]:
                 ref_info = ref.get('ref-info', {})
                 cited_papers.append({
                     'title': ref_info.get('ref-title', {}).get('ref-titletext', 'N/A'),
@@ -243,45 +516,98 @@ def get_cited_papers(scopus_id: str) -> list:
     
     return []
 
-def get_citing_papers(scopus_id: str) -> list:
-    """Get papers that cite the selected paper."""
+def get_citing_papers(scopus_id: str, limit: Optional[int] = None) -> list:
+    """
+    Get papers that cite the selected paper.
+    
+    Args:
+        scopus_id: Scopus ID of the selected paper
+        limit: Maximum number of citing papers (default: config.RELATED_PAPERS_LIMIT)
+    """
     if not scopus_id:
         return []
-    
-    headers = {
-        'X-ELS-APIKey': config.SCOPUS_API_KEY,
-        'Accept': 'application/json'
-    }
+    limit = limit or config.RELATED_PAPERS_LIMIT
     
     try:
-        # Search for papers citing this one
+        # Search for papers citing this one (paged, so the limit may exceed one page)
         query = f"REF({scopus_id})"
-        url = config.SCOPUS_SEARCH_URL
-        params = {
-            'query': query,
-            'count': 10  # Limit to 10 citing papers
-        }
+        entries = utils.scopus_search(query, config.SCOPUS_API_KEY, max_results=limit)
         
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        citing_papers = []
+        for entry in entries:
+            citing_papers.append({
+                'title': entry.get('dc:title', 'N/A'),
+                'doi': entry.get('prism:doi', 'N/A'),
+                'scopus_id': entry.get('dc:identifier', '').replace('SCOPUS_ID:', '')
+            })
         
-        if response.status_code == 200:
-            data = response.json()
-            entries = data.get('search-results', {}).get('entry', [])
-            
-            citing_papers = []
-            for entry in entries:
-                citing_papers.append({
-                    'title': entry.get('dc:title', 'N/A'),
-                    'doi': entry.get('prism:doi', 'N/A'),
-                    'scopus_id': entry.get('dc:identifier', '').replace('SCOPUS_ID:', '')
-                })
-            
-            return citing_papers
+        return citing_papers
     except Exception as e:
         print(f"✗ Error fetching citing papers: {e}")
     
     return []
 
+class RelatedPaperDownloader:
+    """
+    Downloads open access PDFs of many papers concurrently.
+    
+    Each download resolves the DOI on Unpaywall and then fetches the PDF.
+    asyncio only schedules the work: the HTTP calls (blocking, through
+    utils.http_client) and the PDF store lookups (which hash files) run in
+    worker threads. At most max_concurrency requests are in flight at
+    once, and at most per_host_concurrency against any single host.
+    """
+    
+    def __init__(self, max_concurrency: Optional[int] = None, per_host_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency or config.RELATED_MAX_CONCURRENCY
+        self.per_host_concurrency = per_host_concurrency or config.RELATED_PER_HOST_CONCURRENCY
+    
+    async def _limited(self, host: str, func, *args, **kwargs):
+        """Run a blocking call in a worker thread, within the concurrency limits."""
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_concurrency)
+        # Host slot first: a task queued behind a busy host must not hold a global slot
+        async with self._host_limits[host]:
+            async with self._limit:
+                return await asyncio.to_thread(func, *args, **kwargs)
+    
+    async def _download(self, doi: str, pdf_path: Path) -> bool:
+        keys = pdf_keys(doi)
+        stored = await asyncio.to_thread(utils.pdf_store.find, keys)  # Verifies the file's hash
+        if stored:
+            await asyncio.to_thread(utils.pdf_store.link, stored, pdf_path)
+            return True
+        
+        try:
+            pdf_url = await self._limited('api.unpaywall.org', find_unpaywall_pdf_url, doi)
+            if not pdf_url:
+                return False
+            return await self._limited(urlparse(pdf_url).hostname or '', fetch_pdf, pdf_url, pdf_path, keys=keys)
+        except Exception as e:
+            print(f"    ✗ {doi}: {e}")
+            return False
+    
+    async def _download_all(self, jobs: List[Tuple[str, Path]]) -> List[bool]:
+        self._limit = asyncio.Semaphore(self.max_concurrency)
+        self._host_limits = {}
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_concurrency))
+        return await asyncio.gather(*(self._download(doi, pdf_path) for doi, pdf_path in jobs))
+    
+    def download_all(self, jobs: List[Tuple[str, Path]]) -> List[bool]:
+        """
+        Download several PDFs.
+        
+        Args:
+            jobs: (DOI, target path) pairs
+            
+        Returns:
+            Whether each download succeeded, in job order
+        """
+        if not jobs:
+            return []
+        return asyncio.run(self._download_all(jobs))
+
 def download_related_papers(paper: Dict):
     """Download PDFs of cited and citing papers if available."""
     print("\n" + "="*60)
@@ -296,56 +622,43 @@ def download_related_papers(paper: Dict):
     cited_dir.mkdir(exist_ok=True)
     citing_dir.mkdir(exist_ok=True)
     
-    # Get cited papers (references)
-    print("\n[1/2] Fetching cited papers (references)...")
-    cited_papers = get_cited_papers(scopus_id)
-    print(f"Found {len(cited_papers)} cited papers")
-    
-    cited_count = 0
-    for i, cited in enumerate(cited_papers, 1):
-        print(f"\n  [{i}/{len(cited_papers)}] {cited['title'][:60]}...")
-        
-        # Try to download
-        pdf_path = None
-        if cited['doi'] != 'N/A':
-            pdf_path = download_from_unpaywall(cited['doi'])
-            if pdf_path:
-                # Move to cited_papers directory
-                new_path = cited_dir / f"cited_{i}_{cited['doi'].replace('/', '_')}.pdf"
-                pdf_path.rename(new_path)
-                cited_count += 1
-                print(f"    ✓ Downloaded")
-    
-    print(f"\n✓ Downloaded {cited_count}/{len(cited_papers)} cited papers")
-    
-    # Get citing papers
-    print("\n[2/2] Fetching citing papers...")
-    citing_papers = get_citing_papers(scopus_id)
-    print(f"Found {len(citing_papers)} citing papers")
-    
-    citing_count = 0
-    for i, citing in enumerate(citing_papers, 1):
-        print(f"\n  [{i}/{len(citing_papers)}] {citing['title'][:60]}...")
-        
-        # Try to download
-        pdf_path = None
-        if citing['doi'] != 'N/A':
-            pdf_path = download_from_unpaywall(citing['doi'])
-            if pdf_path:
-                # Move to citing_papers directory
-                new_path = citing_dir / f"citing_{i}_{citing['doi'].replace('/', '_')}.pdf"
-                pdf_path.rename(new_path)
-                citing_count += 1
-                print(f"    ✓ Downloaded")
-    
-    print(f"\n✓ Downloaded {citing_count}/{len(citing_papers)} citing papers")
+    # Get cited papers (references) and citing papers at the same time
+    print("\nFetching cited papers (references) and citing papers...")
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        cited_future = pool.submit(get_cited_papers, scopus_id)
+        citing_future = pool.submit(get_citing_papers, scopus_id)
+        cited_papers = cited_future.result()
+        citing_papers = citing_future.result()
+    print(f"Found {len(cited_papers)} cited papers and {len(citing_papers)} citing papers")
+    
+    # Download all of them concurrently
+    groups = (('cited', cited_papers, cited_dir), ('citing', citing_papers, citing_dir))
+    jobs = []
+    for kind, related, target_dir in groups:
+        for i, item in enumerate(related, 1):
+            if item['doi'] != 'N/A':
+                jobs.append((item['doi'], target_dir / f"{kind}_{i}_{item['doi'].replace('/', '_')}.pdf"))
+    
+    print(f"\nDownloading {len(jobs)} open access PDFs...")
+    downloaded = dict(zip((path for _, path in jobs), RelatedPaperDownloader().download_all(jobs)))
+    
+    counts = {}
+    for kind, related, target_dir in groups:
+        print(f"\n{kind.capitalize()} papers:")
+        counts[kind] = 0
+        for i, item in enumerate(related, 1):
+            pdf_path = target_dir / f"{kind}_{i}_{item['doi'].replace('/', '_')}.pdf"
+            ok = item['doi'] != 'N/A' and downloaded.get(pdf_path)
+            counts[kind] += bool(ok)
+            print(f"  [{i}/{len(related)}] {'✓' if ok else '✗'} {item['title'][:60]}...")
+        print(f"✓ Downloaded {counts[kind]}/{len(related)} {kind} papers")
     
     # Save metadata
     related_metadata = {
         'cited_papers': cited_papers,
         'citing_papers': citing_papers,
-        'cited_downloaded': cited_count,
-        'citing_downloaded': citing_count
+        'cited_downloaded': counts['cited'],
+        'citing_downloaded': counts['citing']
     }
     
     metadata_path = config.SELECTED_PAPER_DIR / "related_papers_metadata.json"
@@ -369,19 +682,19 @@ def main():
     print("PHASE 3: PAPER SELECTION & RETRIEVAL")
     print("="*60)
     
-    # Load graded papers
+    # Stream the graded papers (only the top 20 are kept in memory)
     try:
-        graded_papers = utils.load_json(config.OUTPUT_FILES['graded_papers'])
+        graded_papers = utils.iter_records(config.OUTPUT_FILES['graded_papers'])
     except FileNotFoundError:
-        print("\n❌ ERROR: graded_papers.json not found!")
+        print("\n❌ ERROR: graded_papers.jsonl not found!")
         print("Please run Phase 2 (02_grading_algorithm.py) first.")
         return False
     
     # Display top papers
-    display_top_papers(graded_papers, 20)
+    top_papers = display_top_papers(graded_papers, 20)
     
     # User selects paper
-    selected_paper = select_paper(graded_papers)
+    selected_paper = select_paper(top_papers)
     
     print("\n" + "="*60)
     print("SELECTED PAPER")
@@ -6,7 +6,7 @@ Interactive dialogue between Devil's Advocate and Development LLM with user cont
 import json
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 import config
 import utils
 
@@ -29,18 +29,32 @@ def load_evaluation_draft() -> str:
         print("Please run Phase 4 (04_answer_evaluation.py) first.")
         return ""
 
-def call_devils_advocate_llm(prompt: str, llm_config: Dict) -> str:
-    """Call Devil's Advocate LLM."""
+def call_devils_advocate_llm(prompt, llm_config: Dict, on_text: Optional[Callable[[str], None]] = None) -> str:
+    """Call Devil's Advocate LLM (on_text receives the response as it streams in)."""
     provider = llm_config['devils_advocate']['provider']
     model = llm_config['devils_advocate']['model_key']
-    return utils.call_llm(prompt, provider, model)
+    return utils.call_llm(prompt, provider, model, on_text=on_text)
 
-def call_development_llm(prompt: str, llm_config: Dict) -> str:
+def call_development_llm(prompt, llm_config: Dict) -> str:
     """Call Development LLM."""
     provider = llm_config['development']['provider']
     model = llm_config['development']['model_key']
     return utils.call_llm(prompt, provider, model)
 
+def draft_prompt(draft: str) -> utils.Prompt:
+    """
+    Start a prompt with the evaluation draft as its cached prefix.
+    
+    The critique, the refinement and the final assessment all send the same
+    draft; sent first and identically, it is read back from the provider's
+    prompt cache by every call after the first to the same model. Role and
+    task instructions follow the draft.
+    """
+    return utils.Prompt().add(
+        f"Evaluation draft of an academic paper analysis (class on Multilevel and Mixed Methods Approaches):\n\n{draft}",
+        cache=True
+    )
+
 def get_user_comments() -> str:
     """
     Get additional comments from user to add to Devil's Advocate critique.
@@ -99,11 +113,9 @@ def devils_advocate_critique(draft: str, llm_config: Dict, round_num: int) -> st
     """
     print(f"\n[Round {round_num}] Devil's Advocate reviewing...")
     
-    prompt = f"""You are a critical reviewer for an academic paper analysis. Your role is to challenge the answers and identify weaknesses.
-
-Review the following evaluation draft and provide critical feedback:
+    prompt = draft_prompt(draft).add("""You are a critical reviewer for an academic paper analysis. Your role is to challenge the answers and identify weaknesses.
 
-{draft}
+Review the evaluation draft above and provide critical feedback.
 
 For each answer, identify:
 1. Logical gaps or unsupported claims
@@ -113,9 +125,12 @@ For each answer, identify:
 5. Questions that are not adequately addressed
 
 Be constructive but thorough in your critique. Focus on improving the quality and accuracy of the analysis.
-"""
+""")
     
-    critique = call_devils_advocate_llm(prompt, llm_config)
+    # Show the critique as it streams in, so the user can read it before commenting
+    print("-" * 60)
+    critique = call_devils_advocate_llm(prompt, llm_config, on_text=lambda text: print(text, end="", flush=True))
+    print("\n" + "-" * 60)
     return critique
 
 def combine_critique_with_user_comments(critique: str, user_comments: str) -> str:
@@ -161,10 +176,7 @@ def development_llm_refinement(draft: str, critique: str, llm_config: Dict, roun
     """
     print(f"\n[Round {round_num}] Development LLM refining...")
     
-    prompt = f"""You are refining an academic paper analysis based on critical feedback.
-
-Original draft:
-{draft}
+    prompt = draft_prompt(draft).add(f"""You are refining the academic paper analysis above (the original draft) based on critical feedback.
 
 Critical feedback:
 {critique}
@@ -177,7 +189,7 @@ Please revise the answers to address all points raised in the feedback. For each
 5. Update confidence scores based on the quality of evidence
 
 Maintain the same format as the original draft.
-"""
+""")
     
     refined = call_development_llm(prompt, llm_config)
     return refined
@@ -269,16 +281,14 @@ def identify_shortcomings(final_draft: str, llm_config: Dict) -> Dict:
     print("="*60)
     print("\nIdentifying remaining shortcomings...")
     
-    prompt = f"""Review this final evaluation and identify any remaining shortcomings or gaps:
-
-{final_draft}
+    prompt = draft_prompt(final_draft).add("""Review the final evaluation above and identify any remaining shortcomings or gaps.
 
 Provide:
 1. List of remaining shortcomings (if any)
 2. Overall assessment of how well the paper meets the class requirements
 3. Recommendation: Is this paper suitable, or should we consider alternatives?
 4. If alternatives needed, what specific criteria should we prioritize?
-"""
+""")
     
     assessment = call_development_llm(prompt, llm_config)
     
@@ -3,16 +3,16 @@ Phase 4: Evaluation Question Answering
 Use Development LLM to answer evaluation checklist questions.
 """
 
+import contextvars
 import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 import config
 import utils
 
-# Note: This is a simplified implementation.
-# In a production environment, you would use the actual LLM APIs (Anthropic, OpenAI, Google, xAI)
-# For now, this creates the structure and placeholders for LLM integration.
-
 def load_llm_config() -> Dict:
     """Load LLM configuration from Phase 0."""
     try:
@@ -22,16 +22,14 @@ def load_llm_config() -> Dict:
         print("Please run Phase 0 (00_setup_llms.py) first.")
         return None
 
-def load_paper_text() -> str:
-    """Load extracted paper text."""
-    text_path = config.SELECTED_PAPER_DIR / "paper_text.txt"
+def load_paper_text() -> Optional[utils.PaperTextStore]:
+    """Open the extracted paper text (memory-mapped, see utils.PaperTextStore)."""
     try:
-        with open(text_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return utils.PaperTextStore.open(config.SELECTED_PAPER_DIR)
     except FileNotFoundError:
         print("❌ ERROR: paper_text.txt not found!")
         print("Please run Phase 3 (03_paper_retrieval.py) first.")
-        return ""
+        return None
 
 def extract_evaluation_questions() -> List[str]:
     """
@@ -55,7 +53,7 @@ def extract_evaluation_questions() -> List[str]:
     ]
     return questions
 
-def call_development_llm(prompt: str, llm_config: Dict) -> str:
+def call_development_llm(prompt, llm_config: Dict) -> str:
     """
     Call the Development LLM using the centralized utility.
     """
@@ -64,27 +62,53 @@ def call_development_llm(prompt: str, llm_config: Dict) -> str:
     
     return utils.call_llm(prompt, provider, model)
 
-def answer_question(question: str, paper_text: str, llm_config: Dict) -> Dict:
+def paper_body(paper_text: utils.PaperTextStore) -> str:
     """
-    Answer a single evaluation question using the Development LLM.
+    Paper text without the References section.
+    
+    The references are left out of everything sent with a question: their
+    titles match almost any question without answering it.
+    """
+    references = paper_text.sections.get('references')
+    if references:
+        return (paper_text.text(paper_text.data[:references['start']]) + "\n" +
+                paper_text.text(paper_text.data[references['end']:]))
+    return paper_text.text()
+
+def build_retriever(paper_text: utils.PaperTextStore, model: Optional[str] = None) -> utils.ChunkRetriever:
+    """Index the paper (without references) for evidence retrieval (once per run)."""
+    return utils.ChunkRetriever(paper_body(paper_text), model=model)
+
+def shared_paper_context(paper_text: utils.PaperTextStore, model: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Split the paper into the text shared by every question and the rest.
+    
+    The shared text goes in the cached prompt prefix and is cut at
+    config.PROMPT_PAPER_TOKEN_BUDGET tokens of the model (opt-in: by
+    default questions are sent their retrieved passages only).
     
-    Args:
-        question: The evaluation question
-        paper_text: Full text of the paper
-        llm_config: LLM configuration
-        
     Returns:
-        Dictionary with answer, confidence, and evidence
+        (shared text, remaining text, empty if the whole paper fits)
     """
-    # Create prompt for LLM
-    prompt = f"""You are analyzing an academic paper for a class on Multilevel and Mixed Methods Approaches.
+    body = paper_body(paper_text)
+    tokens = utils.estimate_tokens(body, model)
+    if tokens <= config.PROMPT_PAPER_TOKEN_BUDGET:
+        return body, ""
+    limit = len(body) * config.PROMPT_PAPER_TOKEN_BUDGET // tokens
+    cut = body.rfind("\n", 0, limit)
+    cut = cut if cut > limit // 2 else limit
+    return body[:cut], body[cut:]
 
-Paper text (excerpt):
-{paper_text[:5000]}...
+def paper_excerpt(question: str, paper_text: utils.PaperTextStore,
+                  retriever: Optional[utils.ChunkRetriever] = None) -> str:
+    """Paper text to send with a question: the most relevant passages, or the first 5,000 characters."""
+    if retriever is not None:
+        return retriever.context(question)
+    return paper_text.text(limit=5000) + "..."
 
-Question: {question}
+ANSWER_INSTRUCTIONS = """You are analyzing an academic paper for a class on Multilevel and Mixed Methods Approaches.
 
-Please provide:
+You will be asked one evaluation question about the paper. Please provide:
 1. A detailed answer to the question based on the paper
 2. Specific evidence/quotes from the paper
 3. A confidence score (0.0-1.0) indicating how well the paper addresses this question
@@ -92,33 +116,309 @@ Please provide:
 Format your response as:
 ANSWER: [your answer]
 EVIDENCE: [specific quotes or sections]
-CONFIDENCE: [0.0-1.0]
-"""
+CONFIDENCE: [0.0-1.0]"""
+
+def build_question_prompt(question: str, paper_text: utils.PaperTextStore,
+                          retriever: Optional[utils.ChunkRetriever] = None,
+                          context: Optional[str] = None) -> utils.Prompt:
+    """
+    Lay out the prompt of a question: shared content first, the question last.
+    
+    With a shared context, the instructions and the paper text form a
+    prefix that is identical for every question and is marked for prompt
+    caching; the retriever (if any) then covers only the part of the paper
+    that did not fit in it.
+    """
+    prompt = utils.Prompt().add(ANSWER_INSTRUCTIONS)
+    if context is not None:
+        prompt.add(f"Paper text:\n{context}", cache=True)
+        if retriever is not None:
+            prompt.add(f"Further passages relevant to the question:\n{retriever.context(question)}")
+    else:
+        label = 'passages most relevant to the question' if retriever is not None else 'excerpt'
+        prompt.add(f"Paper text ({label}):\n{paper_excerpt(question, paper_text, retriever)}")
+    return prompt.add(f"Question: {question}")
+
+# "ANSWER:", "EVIDENCE:" and "CONFIDENCE:" labels of a single-question response (see ANSWER_INSTRUCTIONS)
+ANSWER_LABEL = re.compile(r'^[ \t*#]*(ANSWER|EVIDENCE|CONFIDENCE)[ \t*]*:[ \t*]*', re.IGNORECASE | re.MULTILINE)
+
+def parse_answer_response(response: str, question: str) -> Dict:
+    """
+    Split a single-question response into answer, evidence and confidence.
     
-    # Call LLM (placeholder)
-    llm_response = call_development_llm(prompt, llm_config)
+    A response without the ANSWER label is kept whole as the answer, with
+    no evidence and confidence 0.0 (nothing could be derived from it).
     
-    # Parse response (in production, you'd parse the actual LLM output)
+    Returns:
+        {question, answer, evidence, confidence} dictionary
+    """
+    labels = list(ANSWER_LABEL.finditer(response))
+    fields = {}
+    for label, following in zip(labels, labels[1:] + [None]):
+        end = following.start() if following else len(response)
+        fields.setdefault(label.group(1).upper(), response[label.end():end].strip())
+    
+    if 'ANSWER' not in fields:
+        return {'question': question, 'answer': response, 'evidence': '', 'confidence': 0.0}
+    
+    number = re.search(r'\d*\.?\d+', fields.get('CONFIDENCE', ''))
+    confidence = min(1.0, max(0.0, float(number.group()))) if number else 0.0
     return {
         'question': question,
-        'answer': llm_response,
-        'evidence': '[Evidence would be extracted from LLM response]',
-        'confidence': 0.7  # Placeholder
+        'answer': fields['ANSWER'],
+        'evidence': fields.get('EVIDENCE', ''),
+        'confidence': confidence
     }
 
-def generate_evaluation_draft(questions: List[str], paper_text: str, llm_config: Dict) -> List[Dict]:
+def answer_question(question: str, paper_text: utils.PaperTextStore, llm_config: Dict,
+                    retriever: Optional[utils.ChunkRetriever] = None,
+                    context: Optional[str] = None) -> Dict:
+    """
+    Answer a single evaluation question using the Development LLM.
+    
+    Args:
+        question: The evaluation question
+        paper_text: The paper's text store
+        llm_config: LLM configuration
+        retriever: Evidence index of the paper (see build_retriever); without
+            it, the beginning of the paper is sent
+        context: Paper text shared by every question, sent as a cached
+            prompt prefix (see shared_paper_context)
+        
+    Returns:
+        Dictionary with answer, confidence, and evidence
+    """
+    prompt = build_question_prompt(question, paper_text, retriever, context)
+    return parse_answer_response(call_development_llm(prompt, llm_config), question)
+
+BATCH_INSTRUCTIONS = """You are analyzing an academic paper for a class on Multilevel and Mixed Methods Approaches.
+
+You will be asked several numbered evaluation questions about the paper. For each question, provide:
+1. A detailed answer to the question based on the paper
+2. Specific evidence/quotes from the paper
+3. A confidence score (0.0-1.0) indicating how well the paper addresses this question
+
+Respond with a JSON array only, one object per question, in question order:
+[{"id": <question number>, "answer": "...", "evidence": "...", "confidence": <0.0-1.0>}]"""
+
+def build_batch_prompt(questions: List[str], paper_text: utils.PaperTextStore,
+                       retriever: Optional[utils.ChunkRetriever] = None,
+                       context: Optional[str] = None) -> utils.Prompt:
+    """
+    Lay out the prompt of a batch of questions, sent with one copy of the paper.
+    
+    Same layout as build_question_prompt (shared, cached content first);
+    the passages retrieved for the batch get the evidence budget of all its
+    questions.
+    """
+    prompt = utils.Prompt().add(BATCH_INSTRUCTIONS)
+    query = " ".join(questions)
+    budget = config.RETRIEVAL_TOKEN_BUDGET * len(questions)
+    max_chunks = config.RETRIEVAL_MAX_CHUNKS * len(questions)
+    if context is not None:
+        prompt.add(f"Paper text:\n{context}", cache=True)
+        if retriever is not None:
+            prompt.add(f"Further passages relevant to the questions:\n"
+                       f"{retriever.context(query, budget, max_chunks)}")
+    elif retriever is not None:
+        prompt.add(f"Paper text (passages most relevant to the questions):\n"
+                   f"{retriever.context(query, budget, max_chunks)}")
+    else:
+        prompt.add(f"Paper text (excerpt):\n{paper_excerpt(query, paper_text)}")
+    numbered = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+    return prompt.add(f"Questions:\n{numbered}")
+
+def parse_batch_response(response: str, questions: List[str]) -> List[Dict]:
+    """
+    Split a batch response back into one answer per question.
+    
+    The JSON array may be wrapped in prose (even prose with brackets) or a
+    code fence. Questions the
+    response does not answer (or all of them, if it holds no JSON array) get
+    the raw response as their answer, with confidence 0.0.
+    
+    Returns:
+        One {question, answer, evidence, confidence} dictionary per question, in order
+    """
+    # The first "[" that starts a JSON array of objects (skips bracketed prose such as "[1]")
+    items = []
+    decoder = json.JSONDecoder()
+    start = response.find('[')
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(response, start)
+        except json.JSONDecodeError:
+            value = None
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            items = value
+            break
+        start = response.find('[', start + 1)
+    
+    by_id = {}
+    for position, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get('id', position))
+        except (TypeError, ValueError):
+            number = position
+        by_id.setdefault(number, item)
+    
+    answers = []
+    for i, question in enumerate(questions, 1):
+        item = by_id.get(i)
+        if item is None:
+            answers.append({'question': question, 'answer': response, 'evidence': '', 'confidence': 0.0})
+            continue
+        try:
+            confidence = min(1.0, max(0.0, float(item.get('confidence', 0.0))))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        answers.append({
+            'question': question,
+            'answer': str(item.get('answer', '')),
+            'evidence': str(item.get('evidence', '')),
+            'confidence': confidence
+        })
+    
+    missing = sum(1 for i in range(1, len(questions) + 1) if i not in by_id)
+    if missing:
+        print(f"⚠ Batch response did not answer {missing} of {len(questions)} questions; kept the raw response")
+    return answers
+
+def answer_batch(questions: List[str], paper_text: utils.PaperTextStore, llm_config: Dict,
+                 retriever: Optional[utils.ChunkRetriever] = None,
+                 context: Optional[str] = None) -> List[Dict]:
+    """
+    Answer several evaluation questions in one Development LLM request.
+    
+    Returns:
+        One answer dictionary per question, in question order
+    """
+    prompt = build_batch_prompt(questions, paper_text, retriever, context)
+    return parse_batch_response(call_development_llm(prompt, llm_config), questions)
+
+def retry_answers(answer: Callable[[], List[Dict]], questions: List[str],
+                  retries: Optional[int] = None) -> List[Dict]:
+    """
+    Run answer() for some questions, retrying it on its own if the LLM call fails.
+    
+    Args:
+        answer: Answers the questions (one LLM request)
+        questions: The questions it answers
+        retries: Retries after the first attempt (default: config.LLM_QUESTION_RETRIES)
+        
+    Returns:
+        The answers, or records of the error (confidence 0.0) if every attempt failed
+    """
+    retries = config.LLM_QUESTION_RETRIES if retries is None else retries
+    label = questions[0][:50] + ("..." if len(questions) == 1 else f"... (+{len(questions) - 1} questions)")
+    for attempt in range(retries + 1):
+        try:
+            return answer()
+        except Exception as e:
+            if attempt == retries:
+                print(f"✗ Failed after {attempt + 1} attempts: {label} ({e})")
+                return [{
+                    'question': question,
+                    'answer': f"[ERROR: {e}]",
+                    'evidence': '',
+                    'confidence': 0.0
+                } for question in questions]
+            print(f"⚠ Retrying ({e}): {label}")
+            time.sleep(min(30, 2 ** attempt))
+
+def answer_question_with_retry(question: str, paper_text: utils.PaperTextStore, llm_config: Dict,
+                               retriever: Optional[utils.ChunkRetriever] = None,
+                               context: Optional[str] = None,
+                               retries: Optional[int] = None) -> Dict:
+    """Answer a question, retrying it on its own if the LLM call fails (see retry_answers)."""
+    return retry_answers(
+        lambda: [answer_question(question, paper_text, llm_config, retriever, context)],
+        [question], retries
+    )[0]
+
+def answer_batch_with_retry(questions: List[str], paper_text: utils.PaperTextStore, llm_config: Dict,
+                            retriever: Optional[utils.ChunkRetriever] = None,
+                            context: Optional[str] = None,
+                            retries: Optional[int] = None) -> List[Dict]:
+    """Answer a batch of questions, retrying the batch on its own if the LLM call fails."""
+    return retry_answers(
+        lambda: answer_batch(questions, paper_text, llm_config, retriever, context),
+        questions, retries
+    )
+
+def generate_evaluation_draft(questions: List[str], paper_text: utils.PaperTextStore, llm_config: Dict) -> List[Dict]:
     """Generate initial evaluation answers for all questions."""
     print("\n" + "="*60)
     print("GENERATING EVALUATION ANSWERS")
     print("="*60)
     
-    answers = []
-    for i, question in enumerate(questions, 1):
-        print(f"\nAnswering question {i}/{len(questions)}...")
-        answer = answer_question(question, paper_text, llm_config)
-        answers.append(answer)
+    model = llm_config['development']['model_key']
+    retriever = None
+    context = None
+    if config.PROMPT_CACHE_ENABLED and config.PROMPT_PAPER_TOKEN_BUDGET > 0:
+        # The paper goes in a prompt prefix shared (and cached) by every question
+        context, rest = shared_paper_context(paper_text, model)
+        print(f"✓ Shared paper context: {utils.estimate_tokens(context, model):,} tokens (cached prompt prefix)")
+        if rest and config.RETRIEVAL_ENABLED:
+            retriever = utils.ChunkRetriever(rest, model=model)
+            print(f"✓ Indexed {len(retriever.chunks)} passages beyond the shared context")
+    elif config.RETRIEVAL_ENABLED:
+        retriever = build_retriever(paper_text, model)
+        print(f"✓ Indexed {len(retriever.chunks)} passages "
+              f"(up to {config.RETRIEVAL_TOKEN_BUDGET} tokens of evidence per question)")
+    
+    model_id = utils.resolve_model(model)[1]  # usage is tracked by model ID
+    usage_before = dict(utils.tracker.usage.get(model_id, {}))
+    
+    answers = [None] * len(questions)
+    start = time.time()
     
-    print(f"\n✓ Generated {len(answers)} answers")
+    # One request per question, or per batch of LLM_BATCH_SIZE questions
+    batch_size = max(1, config.LLM_BATCH_SIZE)
+    batches = [list(range(i, min(i + batch_size, len(questions)))) for i in range(0, len(questions), batch_size)]
+    if batch_size > 1:
+        print(f"✓ Batching {batch_size} questions per request ({len(batches)} requests)")
+    
+    def answer(batch: List[int]) -> List[Dict]:
+        # Usage is reported per question (per batch: "first-last")
+        label = f"{batch[0] + 1}" if len(batch) == 1 else f"{batch[0] + 1}-{batch[-1] + 1}"
+        with utils.tracker.scope(question=label):
+            if batch_size == 1:
+                return [answer_question_with_retry(questions[batch[0]], paper_text, llm_config, retriever, context)]
+            return answer_batch_with_retry([questions[i] for i in batch], paper_text, llm_config, retriever, context)
+    
+    def answered(batch: List[int], results: List[Dict]):
+        for i, result in zip(batch, results):
+            answers[i] = result
+        numbers = f" {batch[0] + 1}" if len(batch) == 1 else f"s {batch[0] + 1}-{batch[-1] + 1}"
+        print(f"  ✓ Question{numbers}/{len(questions)} answered ({time.time() - start:.1f}s)")
+    
+    # The first request writes the shared prefix to the provider's cache;
+    # sent concurrently, every request would pay for writing it
+    pending = list(batches)
+    if context is not None and pending:
+        print("\nSending the first request alone (warms the prompt cache)...")
+        batch = pending.pop(0)
+        answered(batch, answer(batch))
+    
+    # Send the requests concurrently; answers keep the question order
+    workers = max(1, min(config.LLM_MAX_CONCURRENCY, len(pending)))
+    print(f"\nSending {len(pending)} requests ({workers} at a time)...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Each task runs in a copy of this context, keeping the phase label
+        futures = {pool.submit(contextvars.copy_context().run, answer, batch): batch for batch in pending}
+        for future in as_completed(futures):
+            answered(futures[future], future.result())
+    
+    print(f"\n✓ Generated {len(answers)} answers in {time.time() - start:.1f}s")
+    usage = utils.tracker.usage.get(model_id, {})
+    input_tokens = usage.get('input', 0) - usage_before.get('input', 0)
+    cached_tokens = usage.get('cached_input', 0) - usage_before.get('cached_input', 0)
+    if input_tokens:
+        print(f"  Input: {input_tokens:,} tokens, {cached_tokens:,} read from the prompt cache "
+              f"({cached_tokens / input_tokens:.0%})")
     return answers
 
 def save_evaluation_draft(answers: List[Dict]):
@@ -155,19 +455,26 @@ def main():
     
     print(f"\nUsing Development LLM: {llm_config['development']['provider']} - {llm_config['development']['model_key']}")
     
-    # Load paper text
+    # Load paper text (closed on every return path)
     paper_text = load_paper_text()
-    if not paper_text:
+    if paper_text is None:
         return False
     
-    print(f"✓ Loaded paper text: {len(paper_text)} characters")
-    
-    # Extract evaluation questions
-    questions = extract_evaluation_questions()
-    print(f"✓ Loaded {len(questions)} evaluation questions")
-    
-    # Generate answers
-    answers = generate_evaluation_draft(questions, paper_text, llm_config)
+    with paper_text:
+        if paper_text.size == 0:
+            print("❌ ERROR: paper_text.txt is empty!")
+            print("Please re-run Phase 3 (03_paper_retrieval.py) on a PDF with extractable text.")
+            return False
+        
+        print(f"✓ Loaded paper text: {paper_text.size} bytes, {len(paper_text.pages)} pages")
+        print(f"  Sections: {', '.join(paper_text.sections) or 'none found'}")
+        
+        # Extract evaluation questions
+        questions = extract_evaluation_questions()
+        print(f"✓ Loaded {len(questions)} evaluation questions")
+        
+        # Generate answers
+        answers = generate_evaluation_draft(questions, paper_text, llm_config)
     
     # Save draft
     save_evaluation_draft(answers)
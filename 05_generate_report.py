@@ -54,7 +54,7 @@ This analysis was conducted using a comprehensive, automated workflow designed t
   - **Fundamental** (required): Multilevel analysis + Mixed methods
   - **Nice-to-have**: VBHC + NHS/Beveridgean context + Portugal
 - **Fallback Strategy**: Relaxed search if strict criteria yield <20 results
-- **Output**: `scopus_results.json`
+- **Output**: `scopus_results.jsonl`
 
 #### Phase 2: Grading Algorithm
 - **Purpose**: Score and rank papers based on multiple criteria
@@ -65,7 +65,7 @@ This analysis was conducted using a comprehensive, automated workflow designed t
   - Journal Quality (20 pts): CiteScore + SJR
   - Impact (5 pts): Citation count
 - **Customization**: Interactive weight adjustment with automatic normalization
-- **Output**: `graded_papers.json`, `top_20_papers.md`
+- **Output**: `graded_papers.jsonl`, `top_20_papers.md`
 
 #### Phase 3: Paper Selection & Retrieval
 - **Purpose**: Download and extract selected paper
@@ -226,11 +226,11 @@ The following files were generated during the analysis workflow, listed in chron
    - *Why*: Defines the selected LLM providers and models for Development and Devil's Advocate roles.
    - *When*: Created at the start of the workflow during configuration.
 
-2. **`01_scopus_results.json`** (Phase 1)
+2. **`01_scopus_results.jsonl`** (Phase 1)
    - *Why*: Contains raw metadata for all papers retrieved from Scopus based on search criteria.
    - *When*: Generated after executing the search strategy.
 
-3. **`02_graded_papers.json`** (Phase 2)
+3. **`02_graded_papers.jsonl`** (Phase 2)
    - *Why*: Stores grading scores and detailed breakdowns for all retrieved papers.
    - *When*: Created after applying the grading algorithm to the search results.
 
@@ -284,19 +284,38 @@ For questions about this analysis, please contact [your email].
     # Add Token Usage Appendix
     report += "\n\n# Appendix: Token Usage & Cost Analysis\n\n"
     report += "## Estimated Usage Breakdown\n\n"
-    report += "| Model | Calls | Input Tokens | Output Tokens | Total Tokens | Est. Cost |\n"
-    report += "|-------|-------|--------------|---------------|--------------|-----------|\n"
+    report += "| Model | Calls | Input Tokens | Cached Input | Output Tokens | Total Tokens | Est. Cost |\n"
+    report += "|-------|-------|--------------|--------------|---------------|--------------|-----------|\n"
     
     total_cost = 0.0
     
     for model, stats in utils.tracker.usage.items():
         cost = utils.tracker.calculate_cost(model)
         total_cost += cost
-        report += f"| {model} | {stats['calls']} | {stats['input']:,} | {stats['output']:,} | {stats['input'] + stats['output']:,} | ${cost:.4f} |\n"
+        report += f"| {model} | {stats['calls']} | {stats['input']:,} | {stats.get('cached_input', 0):,} | {stats['output']:,} | {stats['input'] + stats['output']:,} | ${cost:.4f} |\n"
     
-    report += f"| **TOTAL** | | | | | **${total_cost:.4f}** |\n"
+    report += f"| **TOTAL** | | | | | | **${total_cost:.4f}** |\n"
     
-    report += "\n*Note: Token counts are estimated (approx. 4 chars/token). Costs are based on standard pricing.*"
+    cache_hits = sum(stats.get('cache_hits', 0) for stats in utils.tracker.usage.values())
+    if cache_hits:
+        saved_tokens = sum(stats.get('saved_input', 0) + stats.get('saved_output', 0)
+                           for stats in utils.tracker.usage.values())
+        total_saved = sum(utils.tracker.calculate_saved(model) for model in utils.tracker.usage)
+        report += (f"\n**LLM response cache:** {cache_hits} calls answered from the cache, "
+                   f"saving {saved_tokens:,} tokens (${total_saved:.4f}).\n")
+    
+    by_phase = utils.tracker.breakdown('phase')
+    if len(by_phase) > 1 or 'unscoped' not in by_phase:
+        report += "\n## Usage by Phase\n\n"
+        report += "| Phase | Calls | Input Tokens | Output Tokens | Est. Cost |\n"
+        report += "|-------|-------|--------------|---------------|-----------|\n"
+        for phase, models in by_phase.items():
+            report += (f"| {phase} | {sum(m['calls'] for m in models.values())} "
+                       f"| {sum(m['input'] for m in models.values()):,} "
+                       f"| {sum(m['output'] for m in models.values()):,} "
+                       f"| ${sum(m['estimated_cost'] for m in models.values()):.4f} |\n")
+    
+    report += "\n*Note: Token counts are those reported by the provider APIs (estimated with the model's tokenizer when the local mock answers). Costs are based on standard pricing; cached input is billed at the provider's prompt-cache rate.*"
     
     # Save report
     output_path = config.OUTPUT_FILES['final_report']
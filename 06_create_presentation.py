@@ -17,16 +17,38 @@ def load_paper_metadata():
         return None
 
 def load_paper_text():
-    """Load paper text."""
-    text_path = config.SELECTED_PAPER_DIR / "paper_text.txt"
+    """Open the paper text (memory-mapped, see utils.PaperTextStore), or None if missing."""
     try:
-        with open(text_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return utils.PaperTextStore.open(config.SELECTED_PAPER_DIR)
     except FileNotFoundError:
+        return None
+
+def section_excerpt(paper_text, name: str, limit: int = 600) -> str:
+    """
+    Speaker-note excerpt of a paper section (see utils.PaperTextStore.section).
+    
+    Returns:
+        Markdown block quoting the start of the section, or "" if it was not found
+    """
+    if paper_text is None:
         return ""
+    # The section starts with its heading line
+    text = paper_text.text(paper_text.section(name), limit=limit + 200).partition("\n")[2]
+    excerpt = " ".join(text.split())
+    if not excerpt:
+        return ""
+    if len(excerpt) > limit:
+        excerpt = excerpt[:limit].rsplit(" ", 1)[0] + "..."
+    return f"\n**From the paper ({name})**:\n\n> {excerpt}\n"
 
 def generate_presentation(paper_metadata, paper_text) -> str:
-    """Generate 8-slide presentation in markdown format."""
+    """
+    Generate 8-slide presentation in markdown format.
+    
+    Slides on the research question, findings and discussion quote the
+    start of the paper's abstract, results and discussion sections (when
+    found) as material for filling in the placeholders.
+    """
     
     presentation = f"""# {paper_metadata.get('title', 'Paper Presentation')}
 
@@ -68,7 +90,7 @@ def generate_presentation(paper_metadata, paper_text) -> str:
 ### Significance
 
 *[Why this research matters]*
-
+{section_excerpt(paper_text, 'abstract')}
 **Note**: *This slide should be customized based on the actual paper content*
 
 ---
@@ -145,7 +167,7 @@ def generate_presentation(paper_metadata, paper_text) -> str:
 - **Quantitative**: *[Statistical findings]*
 - **Qualitative**: *[Thematic findings]*
 - **Integration**: *[How they complement each other]*
-
+{section_excerpt(paper_text, 'results')}
 ---
 
 ## Slide 6: Implications for VBHC
@@ -201,7 +223,7 @@ def generate_presentation(paper_metadata, paper_text) -> str:
 1. **Multilevel analysis** reveals *[key insight]*
 2. **Mixed methods** provide *[complementary understanding]*
 3. **VBHC implications**: *[practical application]*
-
+{section_excerpt(paper_text, 'discussion')}
 ### Critical Reflection
 
 **Strengths of this approach**:
@@ -252,12 +274,14 @@ def main():
     if not paper_metadata:
         return False
     
-    # Load paper text
-    paper_text = load_paper_text()
-    
-    # Generate presentation
+    # Generate presentation (quoting the paper's sections, if its text is available)
     print("\nGenerating presentation...")
-    presentation = generate_presentation(paper_metadata, paper_text)
+    paper_text = load_paper_text()
+    if paper_text is None:
+        presentation = generate_presentation(paper_metadata, None)
+    else:
+        with paper_text:
+            presentation = generate_presentation(paper_metadata, paper_text)
     
     # Save presentation
     output_path = config.OUTPUT_FILES['presentation']
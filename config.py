@@ -30,6 +30,35 @@ if not os.getenv("AMMMA_RUN_DIR"):
     # If we are in a run, main.py handles creation
     SELECTED_PAPER_DIR.mkdir(exist_ok=True)
 
+# Persistent caches shared across runs (kept outside the run_<timestamp> folders)
+CACHE_DIR = Path(os.getenv("AMMMA_CACHE_DIR", BASE_DIR / ".cache"))
+CACHE_FILES = {
+    "journal_metrics": CACHE_DIR / "journal_metrics.json",
+    "scopus_corpus": CACHE_DIR / "scopus_corpus",
+    "pdfs": CACHE_DIR / "pdfs",
+    "pdf_text": CACHE_DIR / "pdf_text",
+    "llm_responses": CACHE_DIR / "llm_responses.json",
+}
+
+# Journal metrics cache lifetimes (seconds). CiteScore/SJR are published yearly;
+# failed ("N/A") lookups are only remembered briefly so they get retried soon.
+JOURNAL_METRICS_TTL = 90 * 24 * 3600
+JOURNAL_METRICS_NA_TTL = 24 * 3600
+
+# Downloaded PDFs are stored once, by SHA-256, in CACHE_FILES["pdfs"] and linked
+# into each run; the DOI/Scopus ID -> PDF index entries expire after a year
+PDF_STORE_TTL = 365 * 24 * 3600
+
+# LLM responses are cached in CACHE_FILES["llm_responses"], keyed by provider,
+# model, prompt and sampling parameters, so repeated runs do not pay for
+# identical prompts. AMMMA_LLM_CACHE: "on" (read and write), "readonly" (replay
+# cached responses, store nothing - for reproducible reruns) or "off" (bypass).
+# The least recently used responses are evicted beyond
+# LLM_RESPONSE_CACHE_MAX_MB; AMMMA_LLM_CACHE_TTL_DAYS=0 keeps them until evicted.
+LLM_RESPONSE_CACHE_MODE = os.getenv("AMMMA_LLM_CACHE", "on")
+LLM_RESPONSE_CACHE_MAX_MB = 50
+LLM_RESPONSE_CACHE_TTL = float(os.getenv("AMMMA_LLM_CACHE_TTL_DAYS", "30")) * 24 * 3600 or None
+
 # API Keys
 SCOPUS_API_KEY = os.getenv("SCOPUS_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
@@ -41,6 +70,47 @@ XAI_API_KEY = os.getenv("XAI_API_KEY")
 SCOPUS_SEARCH_URL = "https://api.elsevier.com/content/search/scopus"
 SCOPUS_SERIAL_URL = "https://api.elsevier.com/content/serial/title"
 
+# Scopus paging: results per request (API limit) and how many pages may be
+# fetched concurrently once the first page has reported the total
+SCOPUS_PAGE_SIZE = 25
+# Requests that ask for a few fields only (e.g. the ID/citation listing of an
+# incremental sync) may return up to 200 results each
+SCOPUS_LISTING_PAGE_SIZE = 200
+SCOPUS_MAX_CONCURRENCY = int(os.getenv("AMMMA_SCOPUS_CONCURRENCY", "4"))
+
+# How Phase 1 picks between the strict and the relaxed query (AMMMA_SEARCH_MODE):
+#   sequential  - strict query's first page, then the relaxed query if it finds < 20
+#   speculative - first pages of both queries requested in parallel
+#   superset    - relaxed query only; strict subset derived locally from the results
+SEARCH_MODE = os.getenv("AMMMA_SEARCH_MODE", "sequential")
+# Superset mode reads the relaxed query until it holds 200 strict matches, but no
+# further than this many results; strict matches ranked lower are missed
+SUPERSET_SEARCH_DEPTH = int(os.getenv("AMMMA_SUPERSET_DEPTH", "1000"))
+
+# Incremental Phase 1: keep a local corpus per query (in CACHE_FILES["scopus_corpus"])
+# and, after the first full download, only fetch records loaded or updated in
+# Scopus since the last sync. Enable with AMMMA_INCREMENTAL_SYNC=1.
+INCREMENTAL_SYNC = os.getenv("AMMMA_INCREMENTAL_SYNC") == "1"
+# Citation counts change without a new LOAD-DATE, so every sync re-reads them with
+# an ID/count-only listing of the query's top records (as many as the corpus
+# holds, 200 per request, which also ranks the corpus: one or two requests for
+# the usual corpus); AMMMA_SYNC_REFRESH_CITATIONS=0 skips the listing
+SYNC_REFRESH_CITATIONS = os.getenv("AMMMA_SYNC_REFRESH_CITATIONS", "1") == "1"
+
+# Shared HTTP client (utils.http_client): keep-alive connections per host,
+# retries with exponential backoff + jitter on 429/5xx and connection errors,
+# and per-host rate limits (requests per second)
+HTTP_TIMEOUT = 30
+HTTP_MAX_RETRIES = int(os.getenv("AMMMA_HTTP_RETRIES", "4"))
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 30
+HTTP_MAX_RETRY_WAIT = 60  # longer server-requested waits (exhausted quota) are not waited out
+HTTP_POOL_SIZE = max(10, SCOPUS_MAX_CONCURRENCY)
+HTTP_RATE_LIMITS = {
+    "api.elsevier.com": 9,
+    "api.unpaywall.org": 10,
+}
+
 # Search Parameters
 SEARCH_KEYWORDS = {
     "fundamental": {
@@ -53,6 +123,10 @@ SEARCH_KEYWORDS = {
     }
 }
 
+# Keyword matching for grading: substring matching by default (e.g. "HLM" also
+# matches inside "HLMs"); set AMMMA_KEYWORD_WORD_BOUNDARY=1 for whole-word matching
+KEYWORD_WORD_BOUNDARY = os.getenv("AMMMA_KEYWORD_WORD_BOUNDARY") == "1"
+
 # Grading Weights (Total: 100 points)
 # User can customize these weights interactively
 GRADING_WEIGHTS = {
@@ -76,6 +150,17 @@ GRADING_WEIGHTS = {
     }
 }
 
+# Papers ranked beyond this limit are saved with their total score only (no
+# breakdown), which keeps grading of very large corpora cheap. Unset/0 = all.
+GRADING_DETAIL_LIMIT = int(os.getenv("AMMMA_GRADING_DETAIL_LIMIT", "0")) or None
+
+# Ranking output of Phase 2. With AMMMA_GRADING_FULL_RANKING=0 only the top
+# papers (GRADING_DETAIL_LIMIT, default 20) are selected and saved instead of
+# sorting the whole corpus; AMMMA_GRADING_STREAMING=1 grades papers one at a
+# time and keeps only a running top-k in memory.
+GRADING_FULL_RANKING = os.getenv("AMMMA_GRADING_FULL_RANKING", "1") == "1"
+GRADING_STREAMING = os.getenv("AMMMA_GRADING_STREAMING") == "1"
+
 # LLM Model Options
 LLM_MODELS = {
     "anthropic": {
@@ -132,20 +217,165 @@ LLM_PRICING = {
     "grok-4": {"input": 5.0, "output": 15.0},
 }
 
+# LLM providers (llm_providers.py). AMMMA_LLM_BACKEND: "auto" calls a
+# provider's API when its API key is set and the local mock adapter otherwise,
+# "live" always calls the APIs, "mock" never does.
+LLM_BACKEND = os.getenv("AMMMA_LLM_BACKEND", "auto")
+LLM_API_URLS = {
+    "anthropic": "https://api.anthropic.com/v1/messages",
+    "openai": "https://api.openai.com/v1/chat/completions",
+    "google": "https://generativelanguage.googleapis.com/v1beta/models",
+    "xai": "https://api.x.ai/v1/chat/completions",
+}
+# API model names, where they differ from the IDs in LLM_MODELS
+LLM_API_MODEL_NAMES = {
+    "claude-opus-4.1": "claude-opus-4-1",
+    "claude-sonnet-4.5": "claude-sonnet-4-5",
+    "claude-haiku-4.5": "claude-haiku-4-5",
+}
+LLM_MAX_OUTPUT_TOKENS = 4096
+LLM_TIMEOUT = 600  # seconds to wait for (more of) a response
+
+# Mock adapter latency (seconds), drawn per call from lognormal distributions
+# with these medians: time to first token, prefill per uncached input token,
+# and per output token for a median of output_tokens tokens. Scaled by
+# AMMMA_LLM_MOCK_LATENCY (0 = instant); AMMMA_LLM_MOCK_SEED makes it repeatable.
+LLM_MOCK_LATENCY = {
+    "first_token": 0.8,
+    "sigma": 0.5,
+    "prefill_per_token": 0.00005,
+    "output_tokens": 300,
+    "per_output_token": 0.01,
+}
+LLM_MOCK_LATENCY_SCALE = float(os.getenv("AMMMA_LLM_MOCK_LATENCY", "1"))
+LLM_MOCK_SEED = int(os.getenv("AMMMA_LLM_MOCK_SEED")) if os.getenv("AMMMA_LLM_MOCK_SEED") else None
+
+# Token counting (utils.estimate_tokens). Models with a local tokenizer are
+# counted exactly: OpenAI models with tiktoken (optional, pip install tiktoken),
+# using the encodings below. Other models - and OpenAI without tiktoken - are
+# estimated from characters per token, calibrated per provider on English
+# academic prose; unknown models use DEFAULT_CHARS_PER_TOKEN.
+TOKENIZER_ENCODINGS = {
+    "gpt-5.1": "o200k_base",
+    "gpt-5-mini": "o200k_base",
+    "gpt-5-nano": "o200k_base",
+    "gpt-4.1": "o200k_base",
+    "o1": "o200k_base",
+    "o1-mini": "o200k_base",
+}
+CHARS_PER_TOKEN = {
+    "anthropic": 3.5,
+    "openai": 4.2,
+    "google": 4.0,
+    "xai": 3.9,
+}
+DEFAULT_CHARS_PER_TOKEN = 4.0
+TOKEN_COUNT_CACHE_SIZE = 256  # distinct texts whose exact count is remembered
+
+# LLM request limits. Phase 4 answers up to LLM_MAX_CONCURRENCY questions at
+# once; every provider is held to LLM_RATE_LIMITS requests per minute (all
+# phases, bursts up to LLM_MAX_CONCURRENCY); a failed question is retried
+# LLM_QUESTION_RETRIES times on its own.
+LLM_MAX_CONCURRENCY = int(os.getenv("AMMMA_LLM_CONCURRENCY", "4"))
+LLM_RATE_LIMITS = {
+    "anthropic": 50,
+    "openai": 500,
+    "google": 150,
+    "xai": 60,
+}
+LLM_QUESTION_RETRIES = 2
+
+# Phase 4 questions per LLM request. Above 1, questions are packed into one
+# JSON-structured request with a single copy of the paper and the response is
+# split back into per-question answers; 1 sends every question on its own.
+LLM_BATCH_SIZE = int(os.getenv("AMMMA_LLM_BATCH_SIZE", "1"))
+
+# Prompt caching. Prompts are laid out as a stable prefix (instructions, paper
+# text, draft) followed by the per-call part, with cache breakpoints after the
+# stable blocks. Providers bill prefix tokens read from their cache at a
+# fraction of the input price ("read"), and Anthropic bills cache writes at a
+# premium ("write"). Prefixes shorter than LLM_CACHE_MIN_TOKENS are not cached;
+# cached prefixes expire after LLM_CACHE_TTL seconds without use.
+# AMMMA_PROMPT_CACHE=0 sends Phase 4 questions with their retrieved passages only.
+PROMPT_CACHE_ENABLED = os.getenv("AMMMA_PROMPT_CACHE", "1") == "1"
+LLM_CACHE_PRICING = {
+    "anthropic": {"read": 0.1, "write": 1.25},
+    "openai": {"read": 0.5, "write": 1.0},
+    "google": {"read": 0.25, "write": 1.0},
+    "xai": {"read": 0.25, "write": 1.0},
+}
+LLM_CACHE_MIN_TOKENS = 1024
+LLM_CACHE_TTL = 300
+
+# Paper text placed in the cached prefix of every Phase 4 question (tokens).
+# Off by default (0): each question is sent only its retrieved passages
+# (~RETRIEVAL_TOKEN_BUDGET tokens), which is far less input than even a cached
+# copy of the paper. Set e.g. AMMMA_PROMPT_PAPER_TOKENS=30000 to send the paper
+# itself as a shared prefix; longer papers are cut at this budget and each
+# question also gets passages retrieved from the rest. The first question is
+# then sent alone to write the cache, which delays the others.
+PROMPT_PAPER_TOKEN_BUDGET = int(os.getenv("AMMMA_PROMPT_PAPER_TOKENS", "0"))
+
+# Phase 4 evidence retrieval: each question is sent the paper passages most
+# relevant to it (BM25 over overlapping chunks), within a token budget.
+# AMMMA_RETRIEVAL=0 sends the first 5,000 characters instead.
+RETRIEVAL_ENABLED = os.getenv("AMMMA_RETRIEVAL", "1") == "1"
+RETRIEVAL_CHUNK_CHARS = 1200
+RETRIEVAL_CHUNK_OVERLAP = 200
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("AMMMA_RETRIEVAL_TOKEN_BUDGET", "1000"))
+RETRIEVAL_MAX_CHUNKS = 6
+
+# Streaming readers (Phase 2 following Phase 1's output) give up after this
+# many seconds without new records
+STREAM_IDLE_TIMEOUT = float(os.getenv("AMMMA_STREAM_IDLE_TIMEOUT", "300"))
+
+# Phase 3 PDF download. "sequential" tries the sources one after another in
+# DOWNLOAD_PRIORITY order; "race" starts them all at once and keeps the first
+# valid PDF (a higher-priority source that is still running gets
+# DOWNLOAD_RACE_GRACE more seconds to win the tie)
+DOWNLOAD_MODE = os.getenv("AMMMA_DOWNLOAD_MODE", "sequential")
+DOWNLOAD_PRIORITY = os.getenv("AMMMA_DOWNLOAD_PRIORITY", "scopus,doi,unpaywall").split(",")
+DOWNLOAD_RACE_GRACE = float(os.getenv("AMMMA_DOWNLOAD_RACE_GRACE", "0"))
+
+# PDFs are streamed to disk in chunks; an interrupted download is resumed
+# (HTTP Range) up to DOWNLOAD_RESUME_ATTEMPTS times
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_RESUME_ATTEMPTS = 3
+
+# PDF text extraction: pages are extracted in parallel, PDF_PAGES_PER_TASK
+# pages per worker process
+PDF_EXTRACT_WORKERS = int(os.getenv("AMMMA_PDF_EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+PDF_PAGES_PER_TASK = 8
+
+# Phase 3 related papers: how many references and citing papers to fetch
+# (each), and how many requests may be in flight at once, overall and per host
+RELATED_PAPERS_LIMIT = int(os.getenv("AMMMA_RELATED_PAPERS_LIMIT", "10"))
+RELATED_MAX_CONCURRENCY = int(os.getenv("AMMMA_RELATED_CONCURRENCY", "16"))
+RELATED_PER_HOST_CONCURRENCY = int(os.getenv("AMMMA_RELATED_PER_HOST_CONCURRENCY", "4"))
+
 # File paths
 PDF_FILES = {
     "class_content": DOCS_DIR / "20241212 SCEE I - AMMMMA.pdf",
-    "evaluation_guide": DOCS_DIR / "20241212 SCEE I - AMMMMA - Evaluation.pdf"
+    "evaluation_guide": DOCS_DIR / "MMMAME_EvaluationGuideAndChecklist_2025.pdf"
 }
 
 # Output Files (Chronologically Numbered)
 OUTPUT_FILES = {
     "llm_config": OUTPUT_DIR / "00_llm_config.json",
-    "scopus_results": OUTPUT_DIR / "01_scopus_results.json",
-    "graded_papers": OUTPUT_DIR / "02_graded_papers.json",
+    "scopus_results": OUTPUT_DIR / "01_scopus_results.jsonl",
+    "sync_diff": OUTPUT_DIR / "01_sync_diff.json",
+    "graded_papers": OUTPUT_DIR / "02_graded_papers.jsonl",
+    "graded_features": OUTPUT_DIR / "02_graded_features.json",
     "top_20_papers": OUTPUT_DIR / "02_top_20_papers.md",
     "evaluation_draft": OUTPUT_DIR / "04_evaluation_draft.md",
     "evaluation_final": OUTPUT_DIR / "05_evaluation_final.md",
     "final_report": OUTPUT_DIR / "05_final_report.md",
     "presentation": OUTPUT_DIR / "06_presentation.md",
+    "timings": OUTPUT_DIR / "timings.json",
+    "trace": OUTPUT_DIR / "trace.json",
 }
+
+# Tracing (utils.tracer): spans for each phase, HTTP request, LLM call and PDF
+# extraction, saved by main.py to OUTPUT_FILES["timings"] and, for
+# chrome://tracing or ui.perfetto.dev, OUTPUT_FILES["trace"]. AMMMA_TRACE=0 disables it.
+TRACE_ENABLED = os.getenv("AMMMA_TRACE", "1") == "1"
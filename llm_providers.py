@@ -0,0 +1,379 @@
+"""
+LLM provider adapters used by utils.call_llm.
+
+One adapter per provider in config.LLM_MODELS (anthropic, openai, google,
+xai), calling the provider's REST API through the shared, pooled
+utils.http_client. Every adapter offers a sync call (complete), an async call
+(acomplete) and token streaming (on_text callback), and reports the usage
+returned by the provider. MockAdapter answers locally with realistic latency
+so the concurrency features can be exercised and benchmarked offline.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+import requests
+import config
+import utils
+
+class LLMError(Exception):
+    """An LLM call failed (missing API key, HTTP error, unexpected response)."""
+
+def iter_sse_data(response) -> Iterator[Dict]:
+    """Parsed JSON 'data:' payloads of a server-sent events response (stops at [DONE])."""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            continue
+
+class ProviderAdapter:
+    """
+    Base adapter: builds the provider request, sends it (streamed or not)
+    and parses text and usage. Subclasses implement build_request,
+    parse_response and parse_event.
+
+    Responses are dictionaries:
+        {'text', 'input_tokens', 'output_tokens', 'cached_tokens', 'cache_write_tokens'}
+    where input_tokens counts every input token, cached ones included.
+    """
+    provider = None
+    api_key_env = None
+    cacheable = True  # responses may be stored in the LLM response cache
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv(self.api_key_env or '')
+
+    def build_request(self, prompt, model: str, params: Dict, stream: bool) -> Dict:
+        """Keyword arguments for utils.http_client.request (method, url, headers, json)."""
+        raise NotImplementedError
+
+    def parse_response(self, data: Dict) -> Dict:
+        """Response dictionary of a complete (non-streamed) API response."""
+        raise NotImplementedError
+
+    def parse_event(self, event: Dict, result: Dict) -> str:
+        """Update result's usage from a stream event; return the text it adds."""
+        raise NotImplementedError
+
+    @staticmethod
+    def model_name(model: str) -> str:
+        """API model name of a model ID (config.LLM_API_MODEL_NAMES, else the ID itself)."""
+        return config.LLM_API_MODEL_NAMES.get(model, model)
+
+    @staticmethod
+    def empty_result() -> Dict:
+        return {'text': '', 'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0, 'cache_write_tokens': 0}
+
+    def complete(self, prompt, model: str, params: Optional[Dict] = None,
+                 on_text: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Send a prompt and return the response with its usage.
+
+        Args:
+            prompt: str or utils.Prompt
+            model: Model ID from config.LLM_MODELS
+            params: Sampling parameters (max_tokens, temperature)
+            on_text: Called with each piece of text as it streams in; without
+                it, the response is requested in one piece
+
+        Raises:
+            LLMError: On a missing API key, an HTTP error or an unusable response
+        """
+        if not self.api_key:
+            raise LLMError(f"{self.api_key_env} is not set")
+        params = {'max_tokens': config.LLM_MAX_OUTPUT_TOKENS, **(params or {})}
+        stream = on_text is not None
+        request = self.build_request(prompt, model, params, stream)
+        try:
+            response = utils.http_client.request(
+                request.pop('method', 'POST'), request.pop('url'),
+                timeout=(config.HTTP_TIMEOUT, config.LLM_TIMEOUT), stream=stream, **request
+            )
+        except requests.RequestException as e:
+            raise LLMError(f"{self.provider} request failed: {e}")
+        with response:
+            if response.status_code != 200:
+                raise LLMError(f"{self.provider} HTTP {response.status_code}: {response.text[:300]}")
+            if not stream:
+                try:
+                    return self.parse_response(response.json())
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    raise LLMError(f"Unexpected {self.provider} response: {e}")
+
+            result = self.empty_result()
+            pieces = []
+            for event in iter_sse_data(response):
+                if 'error' in event:
+                    raise LLMError(f"{self.provider} stream error: {event['error']}")
+                text = self.parse_event(event, result)
+                if text:
+                    pieces.append(text)
+                    on_text(text)
+            result['text'] = ''.join(pieces)
+            return result
+
+    async def acomplete(self, prompt, model: str, params: Optional[Dict] = None,
+                        on_text: Optional[Callable[[str], None]] = None) -> Dict:
+        """Async complete (the call runs in a worker thread; connections stay pooled)."""
+        return await asyncio.to_thread(self.complete, prompt, model, params, on_text)
+
+class AnthropicAdapter(ProviderAdapter):
+    """Anthropic Messages API; cache breakpoints are sent as cache_control blocks."""
+    provider = "anthropic"
+    api_key_env = "ANTHROPIC_API_KEY"
+
+    def build_request(self, prompt, model, params, stream):
+        content = prompt.content_blocks() if isinstance(prompt, utils.Prompt) else str(prompt)
+        body = {
+            'model': self.model_name(model),
+            'max_tokens': params['max_tokens'],
+            'messages': [{'role': 'user', 'content': content}],
+        }
+        if 'temperature' in params:
+            body['temperature'] = params['temperature']
+        if stream:
+            body['stream'] = True
+        return {
+            'url': config.LLM_API_URLS['anthropic'],
+            'headers': {
+                'x-api-key': self.api_key,
+                'anthropic-version': '2023-06-01',
+                'content-type': 'application/json',
+            },
+            'json': body,
+        }
+
+    @staticmethod
+    def _usage(usage: Dict, result: Dict):
+        # input_tokens excludes the tokens read from / written to the cache
+        cached = usage.get('cache_read_input_tokens') or 0
+        written = usage.get('cache_creation_input_tokens') or 0
+        if 'input_tokens' in usage:
+            result['input_tokens'] = usage['input_tokens'] + cached + written
+            result['cached_tokens'] = cached
+            result['cache_write_tokens'] = written
+        if 'output_tokens' in usage:
+            result['output_tokens'] = usage['output_tokens']
+
+    def parse_response(self, data):
+        result = self.empty_result()
+        result['text'] = ''.join(block.get('text', '') for block in data['content'] if block.get('type') == 'text')
+        self._usage(data.get('usage', {}), result)
+        return result
+
+    def parse_event(self, event, result):
+        kind = event.get('type')
+        if kind == 'message_start':
+            self._usage(event['message'].get('usage', {}), result)
+        elif kind == 'message_delta':
+            self._usage(event.get('usage', {}), result)
+        elif kind == 'content_block_delta' and event['delta'].get('type') == 'text_delta':
+            return event['delta']['text']
+        return ''
+
+class OpenAIAdapter(ProviderAdapter):
+    """OpenAI Chat Completions API; prompt prefixes are cached automatically."""
+    provider = "openai"
+    api_key_env = "OPENAI_API_KEY"
+
+    def build_request(self, prompt, model, params, stream):
+        body = {
+            'model': self.model_name(model),
+            'messages': [{'role': 'user', 'content': str(prompt)}],
+            'max_completion_tokens': params['max_tokens'],
+        }
+        if 'temperature' in params:
+            body['temperature'] = params['temperature']
+        if stream:
+            body['stream'] = True
+            body['stream_options'] = {'include_usage': True}
+        return {
+            'url': config.LLM_API_URLS[self.provider],
+            'headers': {'Authorization': f"Bearer {self.api_key}", 'Content-Type': 'application/json'},
+            'json': body,
+        }
+
+    @staticmethod
+    def _usage(usage: Dict, result: Dict):
+        result['input_tokens'] = usage.get('prompt_tokens', 0)
+        result['output_tokens'] = usage.get('completion_tokens', 0)
+        result['cached_tokens'] = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+
+    def parse_response(self, data):
+        result = self.empty_result()
+        result['text'] = data['choices'][0]['message'].get('content') or ''
+        self._usage(data.get('usage') or {}, result)
+        return result
+
+    def parse_event(self, event, result):
+        if event.get('usage'):
+            self._usage(event['usage'], result)
+        choices = event.get('choices') or []
+        if choices:
+            return (choices[0].get('delta') or {}).get('content') or ''
+        return ''
+
+class XAIAdapter(OpenAIAdapter):
+    """xAI API (OpenAI-compatible chat completions)."""
+    provider = "xai"
+    api_key_env = "XAI_API_KEY"
+
+class GoogleAdapter(ProviderAdapter):
+    """Google Gemini API (generateContent); prompt prefixes are cached implicitly."""
+    provider = "google"
+    api_key_env = "GOOGLE_API_KEY"
+
+    def build_request(self, prompt, model, params, stream):
+        generation = {'maxOutputTokens': params['max_tokens']}
+        if 'temperature' in params:
+            generation['temperature'] = params['temperature']
+        method = 'streamGenerateContent?alt=sse' if stream else 'generateContent'
+        return {
+            'url': f"{config.LLM_API_URLS['google']}/{self.model_name(model)}:{method}",
+            'headers': {'x-goog-api-key': self.api_key, 'Content-Type': 'application/json'},
+            'json': {
+                'contents': [{'role': 'user', 'parts': [{'text': str(prompt)}]}],
+                'generationConfig': generation,
+            },
+        }
+
+    @staticmethod
+    def _usage(usage: Dict, result: Dict):
+        result['input_tokens'] = usage.get('promptTokenCount', 0)
+        result['output_tokens'] = usage.get('candidatesTokenCount', 0) + usage.get('thoughtsTokenCount', 0)
+        result['cached_tokens'] = usage.get('cachedContentTokenCount', 0)
+
+    @staticmethod
+    def _text(data: Dict) -> str:
+        candidates = data.get('candidates') or []
+        if not candidates:
+            return ''
+        parts = (candidates[0].get('content') or {}).get('parts') or []
+        return ''.join(part.get('text', '') for part in parts if not part.get('thought'))
+
+    def parse_response(self, data):
+        result = self.empty_result()
+        if not data.get('candidates'):
+            raise LLMError(f"No candidates in Gemini response: {json.dumps(data)[:300]}")
+        result['text'] = self._text(data)
+        self._usage(data.get('usageMetadata') or {}, result)
+        return result
+
+    def parse_event(self, event, result):
+        if event.get('usageMetadata'):
+            self._usage(event['usageMetadata'], result)
+        return self._text(event)
+
+class MockAdapter(ProviderAdapter):
+    """
+    Local stand-in for a provider: answers with a placeholder after a
+    realistic delay, without any network traffic.
+
+    Latency is drawn per call from lognormal distributions
+    (config.LLM_MOCK_LATENCY): time to first token, plus prefill time for
+    the input tokens not served from the prompt cache, plus generation time
+    for the output. AMMMA_LLM_MOCK_LATENCY scales all of it (0 = instant).
+    Usage is estimated locally, prompt caching through utils.prompt_cache_ledger.
+    Mock responses are never stored in the LLM response cache.
+    """
+    cacheable = False
+
+    def __init__(self, provider: str, seed: Optional[int] = None):
+        super().__init__(api_key='mock')
+        self.provider = provider
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _plan(self, prompt, model: str, params: Dict) -> Dict:
+        """Response text, usage and delays (first token, per output token) of a call."""
+        latency = config.LLM_MOCK_LATENCY
+        scale = config.LLM_MOCK_LATENCY_SCALE
+
+        result = self.empty_result()
+        result['text'] = (f"[PLACEHOLDER: Response from {self.provider} {model}]\n\n"
+                          "This is a simulated response to demonstrate the workflow.")
+        if isinstance(prompt, utils.Prompt):
+            result['input_tokens'] = sum(prompt.token_counts(model))
+            result['cached_tokens'], result['cache_write_tokens'] = utils.prompt_cache_ledger.usage(
+                prompt, self.provider, model
+            )
+        else:
+            result['input_tokens'] = utils.estimate_tokens(prompt, model)
+        result['output_tokens'] = utils.estimate_tokens(result['text'], model)
+
+        with self._lock:
+            first_token = self.random.lognormvariate(0, latency['sigma']) * latency['first_token']
+            simulated_output = min(params['max_tokens'],
+                                   self.random.lognormvariate(0, latency['sigma']) * latency['output_tokens'])
+        prefill = (result['input_tokens'] - result['cached_tokens']) * latency['prefill_per_token']
+        return {
+            'result': result,
+            'first_token': (first_token + prefill) * scale,
+            'generation': simulated_output * latency['per_output_token'] * scale,
+        }
+
+    @staticmethod
+    def _pieces(text: str) -> list:
+        words = text.split(' ')
+        return [word + (' ' if i < len(words) - 1 else '') for i, word in enumerate(words)]
+
+    def complete(self, prompt, model, params=None, on_text=None):
+        params = {'max_tokens': config.LLM_MAX_OUTPUT_TOKENS, **(params or {})}
+        plan = self._plan(prompt, model, params)
+        time.sleep(plan['first_token'])
+        pieces = self._pieces(plan['result']['text'])
+        for piece in pieces:
+            time.sleep(plan['generation'] / len(pieces))
+            if on_text:
+                on_text(piece)
+        return plan['result']
+
+    async def acomplete(self, prompt, model, params=None, on_text=None):
+        params = {'max_tokens': config.LLM_MAX_OUTPUT_TOKENS, **(params or {})}
+        plan = self._plan(prompt, model, params)
+        await asyncio.sleep(plan['first_token'])
+        pieces = self._pieces(plan['result']['text'])
+        for piece in pieces:
+            await asyncio.sleep(plan['generation'] / len(pieces))
+            if on_text:
+                on_text(piece)
+        return plan['result']
+
+ADAPTERS = {
+    'anthropic': AnthropicAdapter,
+    'openai': OpenAIAdapter,
+    'google': GoogleAdapter,
+    'xai': XAIAdapter,
+}
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+def get_adapter(provider: str) -> ProviderAdapter:
+    """
+    Adapter of a provider, created once.
+
+    config.LLM_BACKEND chooses between the provider's API and MockAdapter:
+    "auto" uses the API when the provider's key is set, "live" always, "mock" never.
+    """
+    with _adapters_lock:
+        if provider not in _adapters:
+            adapter_class = ADAPTERS.get(provider)
+            live = config.LLM_BACKEND == "live" or (
+                config.LLM_BACKEND == "auto" and adapter_class is not None
+                and bool(os.getenv(adapter_class.api_key_env))
+            )
+            if live and adapter_class is None:
+                raise LLMError(f"Unknown LLM provider: {provider}")
+            _adapters[provider] = adapter_class() if live else MockAdapter(provider, config.LLM_MOCK_SEED)
+        return _adapters[provider]
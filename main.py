@@ -79,7 +79,12 @@ def run_phase(phase_num: str, phase_name: str, module_name: str) -> bool:
         sys.modules[module_name] = module
         spec.loader.exec_module(module)
         
-        result = module.main()
+        # LLM usage inside the phase is reported per phase (see TokenTracker.scope)
+        import utils
+        with utils.tracer.span(f"Phase {phase_num}: {phase_name}", "phase", phase=phase_num) as span, \
+                utils.tracker.scope(phase=phase_num):
+            result = module.main()
+            span.set(ok=bool(result))
         
         if result:
             print(f"\n✓ Phase {phase_num} completed successfully")
@@ -122,62 +127,69 @@ def main():
     print("  Phase 5: Final Report Generation")
     print("  Phase 6: Presentation Creation")
     
-    # Phase 0: LLM Configuration
-    if not run_phase("0", "LLM Configuration", "00_setup_llms"):
-        print("\n❌ Workflow stopped at Phase 0")
-        return
+    try:
+        # Phase 0: LLM Configuration
+        if not run_phase("0", "LLM Configuration", "00_setup_llms"):
+            print("\n❌ Workflow stopped at Phase 0")
+            return
     
-    # Phase 1: Search Strategy
-    if not run_phase("1", "Search Strategy & Data Retrieval", "01_search_strategy"):
-        print("\n❌ Workflow stopped at Phase 1")
-        return
+        # Phase 1: Search Strategy
+        if not run_phase("1", "Search Strategy & Data Retrieval", "01_search_strategy"):
+            print("\n❌ Workflow stopped at Phase 1")
+            return
     
-    # Phase 2: Grading Algorithm
-    if not run_phase("2", "Grading Algorithm", "02_grading_algorithm"):
-        print("\n❌ Workflow stopped at Phase 2")
-        return
+        # Phase 2: Grading Algorithm
+        if not run_phase("2", "Grading Algorithm", "02_grading_algorithm"):
+            print("\n❌ Workflow stopped at Phase 2")
+            return
     
-    # Phase 3: Paper Retrieval
-    if not run_phase("3", "Paper Selection & Retrieval", "03_paper_retrieval"):
-        print("\n❌ Workflow stopped at Phase 3")
-        return
+        # Phase 3: Paper Retrieval
+        if not run_phase("3", "Paper Selection & Retrieval", "03_paper_retrieval"):
+            print("\n❌ Workflow stopped at Phase 3")
+            return
     
-    # Phase 4: Evaluation Answering
-    if not run_phase("4", "Evaluation Question Answering", "04_answer_evaluation"):
-        print("\n❌ Workflow stopped at Phase 4")
-        return
+        # Phase 4: Evaluation Answering
+        if not run_phase("4", "Evaluation Question Answering", "04_answer_evaluation"):
+            print("\n❌ Workflow stopped at Phase 4")
+            return
     
-    # Phase 4.5: Adversarial Review
-    if not run_phase("4.5", "Adversarial Review & Refinement", "04.5_adversarial_review"):
-        print("\n❌ Workflow stopped at Phase 4.5")
-        return
+        # Phase 4.5: Adversarial Review
+        if not run_phase("4.5", "Adversarial Review & Refinement", "04.5_adversarial_review"):
+            print("\n❌ Workflow stopped at Phase 4.5")
+            return
     
-    # Phase 5: Final Report
-    if not run_phase("5", "Final Report Generation", "05_generate_report"):
-        print("\n❌ Workflow stopped at Phase 5")
-        return
+        # Phase 5: Final Report
+        if not run_phase("5", "Final Report Generation", "05_generate_report"):
+            print("\n❌ Workflow stopped at Phase 5")
+            return
     
-    # Phase 6: Presentation
-    if not run_phase("6", "Presentation Creation", "06_create_presentation"):
-        print("\n❌ Workflow stopped at Phase 6")
-        return
+        # Phase 6: Presentation
+        if not run_phase("6", "Presentation Creation", "06_create_presentation"):
+            print("\n❌ Workflow stopped at Phase 6")
+            return
     
-    # Success!
-    print("\n" + "="*70)
-    print("  ✓ WORKFLOW COMPLETE!")
-    print("="*70)
-    print("\nAll phases completed successfully!")
-    print("\nGenerated files:")
-    print(f"  - {config.OUTPUT_FILES['llm_config']}")
-    print(f"  - {config.OUTPUT_FILES['scopus_results']}")
-    print(f"  - {config.OUTPUT_FILES['graded_papers']}")
-    print(f"  - {config.OUTPUT_FILES['top_20_papers']}")
-    print(f"  - {config.SELECTED_PAPER_DIR}/")
-    print(f"  - {config.OUTPUT_FILES['evaluation_draft']}")
-    print(f"  - {config.OUTPUT_FILES['evaluation_final']}")
-    print(f"  - {config.OUTPUT_FILES['final_report']}")
-    print(f"  - {config.OUTPUT_FILES['presentation']}")
-    print("\nYou can now review the final report and presentation!")
+        # Success!
+        print("\n" + "="*70)
+        print("  ✓ WORKFLOW COMPLETE!")
+        print("="*70)
+        print("\nAll phases completed successfully!")
+        print("\nGenerated files:")
+        print(f"  - {config.OUTPUT_FILES['llm_config']}")
+        print(f"  - {config.OUTPUT_FILES['scopus_results']}")
+        print(f"  - {config.OUTPUT_FILES['graded_papers']}")
+        print(f"  - {config.OUTPUT_FILES['top_20_papers']}")
+        print(f"  - {config.SELECTED_PAPER_DIR}/")
+        print(f"  - {config.OUTPUT_FILES['evaluation_draft']}")
+        print(f"  - {config.OUTPUT_FILES['evaluation_final']}")
+        print(f"  - {config.OUTPUT_FILES['final_report']}")
+        print(f"  - {config.OUTPUT_FILES['presentation']}")
+        print(f"  - {config.OUTPUT_FILES['timings']}")
+        print(f"  - {config.OUTPUT_FILES['trace']}")
+        print("\nYou can now review the final report and presentation!")
+    finally:
+        # Timings are written even when a phase fails or the run is interrupted
+        utils.tracer.save(config.OUTPUT_FILES['timings'], config.OUTPUT_FILES['trace'])
+        utils.tracer.print_summary()
 
 if __name__ == "__main__":
     main()
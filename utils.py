@@ -2,12 +2,31 @@
 Utility functions for the paper analysis workflow.
 """
 
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import functools
+import hashlib
+import heapq
+import itertools
+import random
+import shutil
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import math
+import mmap
 import re
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import config
 import os
 import time
@@ -46,13 +65,146 @@ def get_user_input(prompt_text: str, default: str = None) -> str:
     # Standard input
     return input(prompt_text)
 
-def extract_pdf_text(pdf_path: Path, output_path: Optional[Path] = None) -> str:
+def pdf_page_count(pdf_path: Path) -> int:
+    """Number of pages of a PDF (pdfinfo, or pypdf if poppler is not installed)."""
+    try:
+        result = subprocess.run(['pdfinfo', str(pdf_path)], check=True, capture_output=True)
+        match = re.search(r'^Pages:\s+(\d+)', result.stdout.decode('utf-8', errors='ignore'), re.M)
+        if match:
+            return int(match.group(1))
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        pass
+    
+    import pypdf
+    return len(pypdf.PdfReader(pdf_path).pages)
+
+def _extract_page_range(pdf_path: str, first: int, last: int, backend: str) -> List[str]:
+    """
+    Extract the text of pages first..last (1-based, inclusive), one string per page.
+    Runs in a worker process.
+    """
+    count = last - first + 1
+    if backend == 'pdftotext':
+        result = subprocess.run(
+            ['pdftotext', '-f', str(first), '-l', str(last), pdf_path, '-'],
+            check=True,
+            capture_output=True
+        )
+        # pdftotext ends every page with a form feed
+        pages = result.stdout.decode('utf-8', errors='ignore').split('\f')[:count]
+        return pages + [''] * (count - len(pages))
+    
+    import pypdf
+    reader = pypdf.PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() or '' for i in range(first - 1, last)]
+
+def extract_pdf_pages(pdf_path: Path, max_workers: Optional[int] = None) -> List[str]:
     """
-    Extract text from PDF using pdftotext.
+    Extract the text of every page of a PDF, in parallel over page ranges.
+    
+    Uses pdftotext when available and pypdf otherwise. Ranges of
+    config.PDF_PAGES_PER_TASK pages are extracted by a process pool.
+    
+    Args:
+        pdf_path: Path to PDF file
+        max_workers: Worker processes (default: config.PDF_EXTRACT_WORKERS)
+        
+    Returns:
+        Text of each page, in page order
+    """
+    backend = 'pdftotext' if shutil.which('pdftotext') else 'pypdf'
+    if backend == 'pypdf':
+        print("⚠️ pdftotext not found. Using pypdf fallback...")
+    
+    page_count = pdf_page_count(pdf_path)
+    step = config.PDF_PAGES_PER_TASK
+    ranges = [(first, min(first + step - 1, page_count)) for first in range(1, page_count + 1, step)]
+    max_workers = min(max_workers or config.PDF_EXTRACT_WORKERS, len(ranges))
+    
+    if max_workers <= 1:
+        chunks = [_extract_page_range(str(pdf_path), first, last, backend) for first, last in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            chunks = list(pool.map(
+                _extract_page_range,
+                [str(pdf_path)] * len(ranges),
+                [first for first, _ in ranges],
+                [last for _, last in ranges],
+                [backend] * len(ranges)
+            ))
+    
+    return [page for chunk in chunks for page in chunk]
+
+def build_page_index(pages: List[str]) -> Tuple[bytes, List[Dict]]:
+    """
+    Join page texts into one document (pdftotext layout: each page followed
+    by a form feed) and record where each page lies in it.
+    
+    Returns:
+        Tuple of (UTF-8 document, [{'page', 'start', 'end'}] byte offsets)
+    """
+    encoded = [(page + '\f').encode('utf-8') for page in pages]
+    index = []
+    start = 0
+    for number, page in enumerate(encoded, 1):
+        index.append({'page': number, 'start': start, 'end': start + len(page) - 1})
+        start += len(page)
+    return b''.join(encoded), index
+
+def extract_pdf_text_cached(pdf_path: Path) -> Tuple[bytes, Dict]:
+    """
+    Extract the text of a PDF, reusing an earlier extraction of the same file.
+    
+    Extractions are cached in config.CACHE_FILES['pdf_text'], keyed by the
+    PDF's SHA-256, as the UTF-8 text plus a page index.
+    
+    Returns:
+        Tuple of (UTF-8 text, page index {'sha256', 'pages': [{'page', 'start', 'end'}]})
+    """
+    with tracer.span(f"extract {Path(pdf_path).name}", "extract") as span:
+        sha256 = file_sha256(pdf_path)
+        cache_dir = config.CACHE_FILES['pdf_text']
+        text_path = cache_dir / f"{sha256}.txt"
+        index_path = cache_dir / f"{sha256}.pages.json"
+        
+        if text_path.exists() and index_path.exists():
+            data, page_index = text_path.read_bytes(), load_json(index_path)
+            span.set(cache='hit', pages=len(page_index['pages']), bytes=len(data))
+            return data, page_index
+        
+        data, pages = build_page_index(extract_pdf_pages(pdf_path))
+        page_index = {'sha256': sha256, 'pages': pages}
+        span.set(cache='miss', pages=len(pages), bytes=len(data))
+        
+        # Write the text first: the index marks the entry complete
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = text_path.with_name(text_path.name + '.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, text_path)
+        save_json(page_index, index_path)
+        
+        return data, page_index
+
+def read_page(text_path: Path, page_index: Dict, page: int) -> str:
+    """Read one page (1-based) of an extracted text file without reading the rest."""
+    entry = page_index['pages'][page - 1]
+    with open(text_path, 'rb') as f:
+        f.seek(entry['start'])
+        return f.read(entry['end'] - entry['start']).decode('utf-8')
+
+def extract_pdf_text(pdf_path: Path, output_path: Optional[Path] = None,
+                     index_path: Optional[Path] = None) -> str:
+    """
+    Extract text from PDF (pdftotext, or pypdf if not installed).
+    
+    Pages are extracted in parallel and the result is cached by the PDF's
+    content hash, so extracting the same PDF again is instant.
     
     Args:
         pdf_path: Path to PDF file
         output_path: Optional path to save extracted text
+        index_path: Optional path to save the page index (byte offsets of
+            each page in the saved text; see read_page)
         
     Returns:
         Extracted text as string
@@ -61,122 +213,867 @@ def extract_pdf_text(pdf_path: Path, output_path: Optional[Path] = None) -> str:
         output_path = pdf_path.with_suffix('.txt')
     
     try:
-        subprocess.run(
-            ['pdftotext', str(pdf_path), str(output_path)],
-            check=True,
-            capture_output=True
-        )
+        data, page_index = extract_pdf_text_cached(pdf_path)
+    except ImportError:
+        print("✗ pypdf not installed. Please install it: pip install pypdf")
+        return ""
+    except Exception as e:
+        print(f"✗ PDF text extraction failed: {e}")
+        return ""
+    
+    # Written as bytes so the page offsets stay valid on every platform
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    if index_path:
+        save_json(page_index, index_path)
+    
+    return data.decode('utf-8')
+
+# Section headings recognized in extracted paper text, in document order
+PAPER_SECTIONS = {
+    'abstract': ['abstract', 'summary'],
+    'introduction': ['introduction', 'background'],
+    'methods': ['methods', 'method', 'methodology', 'materials and methods', 'data and methods',
+                'research design', 'study design'],
+    'results': ['results', 'findings'],
+    'discussion': ['discussion', 'conclusion', 'conclusions', 'discussion and conclusions'],
+    'references': ['references', 'bibliography', 'literature cited', 'works cited'],
+}
+
+# A heading is a line of its own, optionally numbered ("2.", "2.1", "II.") and
+# followed by a colon
+_SECTION_HEADING = re.compile(
+    rb'^[\f \t]*(?:(?:\d+(?:\.\d+)*|[IVX]+)\.?[ \t]+)?('
+    + b'|'.join(re.escape(heading.encode()) for headings in PAPER_SECTIONS.values()
+                for heading in sorted(headings, key=len, reverse=True))
+    + rb')[ \t]*:?[ \t]*\r?$',
+    re.IGNORECASE | re.MULTILINE
+)
+_SECTION_OF_HEADING = {heading: name for name, headings in PAPER_SECTIONS.items() for heading in headings}
+
+def build_section_index(data) -> Dict[str, Dict[str, int]]:
+    """
+    Locate the standard sections of a paper in its extracted text.
+    
+    Sections are taken in document order (abstract, introduction, methods,
+    results, discussion, references): each is the first matching heading
+    after the previous section found, except References, which is the last
+    one (tables of contents also list it). A section runs until the next
+    section found.
+    
+    Args:
+        data: UTF-8 text (bytes, or any buffer such as an mmap)
+        
+    Returns:
+        Dictionary mapping section name to {'start', 'end'} byte offsets
+    """
+    found = {}
+    order = list(PAPER_SECTIONS)
+    position = 0
+    for match in _SECTION_HEADING.finditer(data):
+        name = _SECTION_OF_HEADING[match.group(1).decode('utf-8').lower()]
+        if name == 'references':
+            found[name] = match.start()
+        elif name not in found and match.start() >= position and \
+                all(order.index(other) < order.index(name) for other in found if other != 'references'):
+            found[name] = position = match.start()
+    
+    starts = sorted(found.items(), key=lambda item: item[1])
+    return {
+        name: {'start': start, 'end': starts[i + 1][1] if i + 1 < len(starts) else len(data)}
+        for i, (name, start) in enumerate(starts)
+    }
+
+class PaperTextStore:
+    """
+    Read-only, memory-mapped access to an extracted paper text.
+    
+    The text file is mapped rather than read, so large documents are not
+    copied into memory; pages (see read_page) and sections (see
+    build_section_index) are returned as zero-copy memoryview slices, and
+    only what is decoded with text() becomes a Python string. Views must not
+    be used after the store is closed.
+    
+    Usage:
+        with PaperTextStore.open(config.SELECTED_PAPER_DIR) as paper:
+            methods = paper.text(paper.section('methods'))
+    """
+    
+    TEXT_FILE = "paper_text.txt"
+    PAGES_FILE = "paper_pages.json"
+    SECTIONS_FILE = "paper_sections.json"
+    
+    def __init__(self, text_path: Path, pages_path: Optional[Path] = None,
+                 sections_path: Optional[Path] = None):
+        """
+        Args:
+            text_path: Extracted UTF-8 text
+            pages_path: Page index (see extract_pdf_text), if available
+            sections_path: Saved section index; built from the text if missing
+        """
+        self.text_path = Path(text_path)
+        self._file = open(self.text_path, 'rb')
+        self._mmap = None
+        if os.fstat(self._file.fileno()).st_size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._mmap if self._mmap is not None else b'')
         
-        with open(output_path, 'r', encoding='utf-8', errors='ignore') as f:
-            text = f.read()
+        self.pages = []
+        if pages_path and Path(pages_path).exists():
+            self.pages = load_json(pages_path)['pages']
         
-        return text
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        print(f"⚠️ pdftotext failed or not found ({e}). Trying pypdf fallback...")
+        if sections_path and Path(sections_path).exists():
+            self.sections = load_json(sections_path)
+        else:
+            self.sections = build_section_index(self._mmap if self._mmap is not None else b'')
+    
+    @classmethod
+    def open(cls, directory: Path) -> 'PaperTextStore':
+        """Open the paper text saved by Phase 3 in the given directory."""
+        directory = Path(directory)
+        return cls(directory / cls.TEXT_FILE, directory / cls.PAGES_FILE, directory / cls.SECTIONS_FILE)
+    
+    @property
+    def size(self) -> int:
+        """Size of the text in bytes."""
+        return len(self.data)
+    
+    def __len__(self) -> int:
+        """Size of the text in bytes."""
+        return self.size
+    
+    def section(self, name: str) -> memoryview:
+        """View of a section (empty if the section was not found)."""
+        bounds = self.sections.get(name)
+        if bounds is None:
+            return self.data[0:0]
+        return self.data[bounds['start']:bounds['end']]
+    
+    def page(self, number: int) -> memoryview:
+        """View of a page (1-based)."""
+        entry = self.pages[number - 1]
+        return self.data[entry['start']:entry['end']]
+    
+    def text(self, view: Optional[memoryview] = None, limit: Optional[int] = None) -> str:
+        """
+        Decode a view (default: the whole text) to a string.
+        
+        Args:
+            view: View returned by section() or page()
+            limit: Maximum number of characters; only the bytes needed are decoded
+        """
+        view = self.data if view is None else view
+        if limit is not None:
+            view = view[:limit * 4]  # At most 4 bytes per UTF-8 character
+            return str(view, 'utf-8', errors='ignore')[:limit]
+        return str(view, 'utf-8', errors='ignore')
+    
+    def save_sections(self, sections_path: Path):
+        """Save the section index (so later phases do not rebuild it)."""
+        save_json(self.sections, sections_path)
+    
+    def close(self):
+        """Unmap and close the text file."""
+        self.data.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # Views still in use; unmapped when they are released
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class Span:
+    """One timed operation of a trace; attributes (bytes, tokens, retries, cache, ...) are set with set()."""
+    __slots__ = ('id', 'parent', 'name', 'category', 'attrs', 'start', 'duration', 'thread', 'thread_name')
+    
+    def __init__(self, span_id: int, parent: Optional[int], name: str, category: str, attrs: Dict):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = None
+        self.thread = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+    
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+# Span the current code runs in (parent of the spans it opens)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+class Tracer:
+    """
+    Records spans (wall time plus attributes) of phases, HTTP requests, LLM
+    calls and PDF extractions across threads, and exports them as
+    timings.json (spans and per-phase/per-category summaries) and as a
+    Chrome trace (chrome://tracing, ui.perfetto.dev).
+    
+    Phases run one after the other, so every span is attributed to the
+    phase that was running when it started, whichever thread it ran in.
+    """
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.origin_time = time.time()
+        self.spans: List[Span] = []  # finished spans (list.append is thread-safe)
+        self._ids = itertools.count(1)
+    
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **attrs):
+        """Time the block as a span; yields the Span (set attributes with span.set)."""
+        parent = _current_span.get()
+        span = Span(next(self._ids), parent.id if parent else None, name, category, attrs)
+        if not self.enabled:
+            yield span
+            return
+        token = _current_span.set(span)
         try:
-            import pypdf
-            reader = pypdf.PdfReader(pdf_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            _current_span.reset(token)
+            self.spans.append(span)
+    
+    def _span_dict(self, span: Span) -> Dict:
+        return {
+            'id': span.id,
+            'parent': span.parent,
+            'name': span.name,
+            'category': span.category,
+            'start': round(span.start - self.origin, 6),
+            'seconds': round(span.duration, 6),
+            'thread': span.thread_name,
+            **span.attrs
+        }
+    
+    @staticmethod
+    def _category_stats(spans: List[Span]) -> Dict:
+        """Count, time (busy seconds, percentiles) and summed attributes of spans, by category."""
+        stats = {}
+        for category in sorted({span.category for span in spans}):
+            group = [span for span in spans if span.category == category]
+            durations = sorted(span.duration for span in group)
+            entry = {
+                'count': len(group),
+                'seconds': round(sum(durations), 3),
+                'p50': round(durations[len(durations) // 2], 3),
+                'p95': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+                'max': round(durations[-1], 3),
+            }
+            for attr in ('bytes', 'retries', 'input_tokens', 'output_tokens', 'cached_tokens', 'pages'):
+                total = sum(span.attrs.get(attr) or 0 for span in group)
+                if total:
+                    entry[attr] = total
+            hits = sum(1 for span in group if span.attrs.get('cache') == 'hit')
+            misses = sum(1 for span in group if span.attrs.get('cache') == 'miss')
+            if hits or misses:
+                entry['cache_hits'] = hits
+                entry['cache_misses'] = misses
+            errors = sum(1 for span in group if 'error' in span.attrs)
+            if errors:
+                entry['errors'] = errors
+            stats[category] = entry
+        return stats
+    
+    def phases(self) -> List[Dict]:
+        """Phase spans in run order, each with the stats of the spans that started during it."""
+        spans = list(self.spans)
+        phases = sorted((span for span in spans if span.category == 'phase'), key=lambda span: span.start)
+        result = []
+        for phase in phases:
+            end = phase.start + phase.duration
+            inside = [span for span in spans
+                      if span.category != 'phase' and phase.start <= span.start < end]
+            result.append({
+                'name': phase.name,
+                'seconds': round(phase.duration, 3),
+                **({'error': phase.attrs['error']} if 'error' in phase.attrs else {}),
+                'categories': self._category_stats(inside)
+            })
+        return result
+    
+    def save(self, timings_path: Path, trace_path: Optional[Path] = None):
+        """Write timings.json and (optionally) the Chrome trace."""
+        if not self.enabled:
+            return
+        spans = sorted(self.spans, key=lambda span: span.start)
+        save_json({
+            'started': datetime.fromtimestamp(self.origin_time).isoformat(),
+            'total_seconds': round(time.perf_counter() - self.origin, 3),
+            'phases': self.phases(),
+            'categories': self._category_stats([span for span in spans if span.category != 'phase']),
+            'spans': [self._span_dict(span) for span in spans]
+        }, timings_path)
+        
+        if trace_path:
+            pid = os.getpid()
+            threads = {}
+            events = []
+            for span in spans:
+                tid = threads.setdefault(span.thread, (len(threads) + 1, span.thread_name))[0]
+                events.append({
+                    'name': span.name,
+                    'cat': span.category,
+                    'ph': 'X',
+                    'ts': round((span.start - self.origin) * 1e6),
+                    'dur': round(span.duration * 1e6),
+                    'pid': pid,
+                    'tid': tid,
+                    'args': span.attrs
+                })
+            for tid, name in threads.values():
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+            save_json({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_path)
+    
+    def print_summary(self, top: int = 5):
+        """Print where the time went: phases (slowest first) with their busiest categories, and the slowest operations."""
+        phases = self.phases()
+        if not phases:
+            return
+        total = sum(phase['seconds'] for phase in phases) or 1.0
+        
+        print("\n" + "="*60)
+        print("TIMINGS")
+        print("="*60)
+        print(f"\nPhases (slowest first), {total:.1f}s in total:")
+        for phase in sorted(phases, key=lambda phase: -phase['seconds']):
+            busiest = sorted(phase['categories'].items(), key=lambda item: -item[1]['seconds'])[:3]
+            details = ", ".join(self._describe(category, stats) for category, stats in busiest)
+            print(f"  {phase['seconds']:7.1f}s {phase['seconds'] / total:4.0%}  {phase['name']}"
+                  + (f"  [{details}]" if details else ""))
+        
+        slowest = sorted((span for span in self.spans if span.category != 'phase'),
+                         key=lambda span: -span.duration)[:top]
+        if slowest:
+            print("\nSlowest operations:")
+            for span in slowest:
+                print(f"  {span.duration:7.1f}s  {span.category:8} {span.name}")
+        print("\n(Busy time of concurrent operations can add up to more than a phase's wall time.)")
+    
+    @staticmethod
+    def _describe(category: str, stats: Dict) -> str:
+        text = f"{category}: {stats['count']} x, {stats['seconds']:.1f}s busy"
+        if 'bytes' in stats:
+            size = stats['bytes']
+            text += f", {size / 1e6:.1f} MB" if size >= 1e6 else f", {size / 1e3:.0f} kB"
+        if 'input_tokens' in stats or 'output_tokens' in stats:
+            text += f", {stats.get('input_tokens', 0) + stats.get('output_tokens', 0):,} tokens"
+        if 'cache_hits' in stats:
+            text += f", {stats['cache_hits']}/{stats['cache_hits'] + stats['cache_misses']} cached"
+        if 'retries' in stats:
+            text += f", {stats['retries']} retries"
+        return text
+
+# Global tracer instance
+tracer = Tracer(enabled=config.TRACE_ENABLED)
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: on average `rate` acquisitions per second, with
+    bursts of up to `capacity`. Thread-safe; acquire() blocks until allowed.
+    """
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: float = 1.0):
+        """Take tokens from the bucket, waiting for them if necessary."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = max(self._paused_until - now, (tokens - self._tokens) / self.rate)
+            time.sleep(wait)
+    
+    def pause(self, seconds: float):
+        """Hold back all acquisitions for the given time (e.g. after a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class HttpClient:
+    """
+    Shared HTTP client for every network call of the pipeline.
+    
+    - One keep-alive requests.Session (connection pool) per host, so repeated
+      calls to the same API reuse their TLS connection
+    - Retries on 429/5xx and connection errors, with exponential backoff and
+      jitter; waits as long as Retry-After / X-RateLimit-Reset ask, unless that
+      is longer than config.HTTP_MAX_RETRY_WAIT (e.g. an exhausted weekly quota)
+    - Per-host token-bucket rate limits (config.HTTP_RATE_LIMITS); a throttled
+      response pauses every thread calling that host
+    
+    Thread-safe.
+    """
+    
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, max_retries: Optional[int] = None, rate_limits: Optional[Dict[str, float]] = None):
+        self.max_retries = config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.rate_limits = config.HTTP_RATE_LIMITS if rate_limits is None else rate_limits
+        self._sessions = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def _session(self, host: str) -> requests.Session:
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+            return self._sessions[host]
+    
+    def _bucket(self, host: str) -> Optional[TokenBucket]:
+        with self._lock:
+            if host not in self._buckets:
+                rate = self.rate_limits.get(host)
+                self._buckets[host] = TokenBucket(rate) if rate else None
+            return self._buckets[host]
+    
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Exponential backoff with jitter (half fixed, half random)."""
+        delay = min(config.HTTP_BACKOFF_MAX, config.HTTP_BACKOFF_BASE * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    @staticmethod
+    def _server_wait(response: requests.Response) -> Optional[float]:
+        """Seconds the server asks us to wait (Retry-After, X-RateLimit-Reset), if any."""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        
+        # Elsevier: quota exhausted until the reset time (epoch seconds)
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            try:
+                return max(0.0, float(response.headers['X-RateLimit-Reset']) - time.time())
+            except (KeyError, ValueError):
+                pass
+        return None
+    
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying throttled and failed attempts.
+        
+        Args:
+            method: HTTP method
+            url: Request URL
+            retries: Maximum retries (default: config.HTTP_MAX_RETRIES)
+            **kwargs: Passed on to requests (headers, params, stream, ...)
             
-            # Save to output path if requested
-            if output_path:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
+        Returns:
+            The last response (which may still be an error status)
             
-            return text
-        except ImportError:
-            print("✗ pypdf not installed. Please install it: pip install pypdf")
-            return ""
-        except Exception as e2:
-            print(f"✗ pypdf extraction failed: {e2}")
-            return ""
+        Raises:
+            requests.RequestException: If the last attempt failed to connect
+        """
+        retries = self.max_retries if retries is None else retries
+        kwargs.setdefault('timeout', config.HTTP_TIMEOUT)
+        parsed = urlparse(url)
+        host = parsed.hostname or ''
+        session = self._session(host)
+        bucket = self._bucket(host)
+        
+        # Traced without the query string (it may carry API keys)
+        with tracer.span(f"{method} {host}{parsed.path}", "http", method=method, host=host) as span:
+            response = self._send(session, bucket, method, url, retries, span, **kwargs)
+            span.set(status=response.status_code)
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit():
+                span.set(bytes=int(length))
+            elif not kwargs.get('stream'):
+                span.set(bytes=len(response.content))
+        return response
+    
+    def _send(self, session: requests.Session, bucket: Optional['TokenBucket'], method: str, url: str,
+              retries: int, span: Span, **kwargs) -> requests.Response:
+        """Send with retries (see request); the retry count is recorded on span."""
+        for attempt in range(retries + 1):
+            span.set(retries=attempt)
+            if bucket:
+                bucket.acquire()
+            
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            
+            if response.status_code not in self.RETRY_STATUSES or attempt == retries:
+                return response
+            
+            wait = self._server_wait(response)
+            if wait is None:
+                wait = self._backoff(attempt)
+            elif wait > config.HTTP_MAX_RETRY_WAIT:
+                return response
+            
+            if bucket and response.status_code == 429:
+                bucket.pause(wait)
+            response.close()
+            time.sleep(wait)
+        
+        return response
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request (see request)."""
+        return self.request('GET', url, **kwargs)
 
-def scopus_search(query: str, api_key: str, max_results: int = 200) -> List[Dict]:
+http_client = HttpClient()
+
+def _scopus_quota_remaining(response) -> Optional[int]:
+    """Read the remaining Elsevier API quota from the X-RateLimit-Remaining header."""
+    try:
+        return int(response.headers.get('X-RateLimit-Remaining'))
+    except (TypeError, ValueError):
+        return None
+
+def _fetch_scopus_page(query: str, headers: Dict, start: int, count: int,
+                       retries: Optional[int] = None, fields: Optional[str] = None) -> Tuple[Optional[Dict], Optional[requests.Response]]:
     """
-    Search Scopus API for papers.
+    Fetch a single page of Scopus search results.
     
     Args:
         query: Search query string
-        api_key: Scopus API key
-        max_results: Maximum number of results to retrieve
+        headers: Request headers (API key, Accept)
+        start: Offset of the first result on the page
+        count: Number of results on the page
+        retries: How many times to retry a throttled or failed request
+        fields: Comma-separated fields to return (default: the full standard view)
         
     Returns:
-        List of paper dictionaries
+        Tuple of (parsed JSON or None on failure, response or None)
     """
-    headers = {
+    params = {
+        'query': query,
+        'count': count,
+        'start': start
+    }
+    if fields:
+        params['field'] = fields
+    
+    try:
+        response = http_client.get(
+            config.SCOPUS_SEARCH_URL,
+            headers=headers,
+            params=params,
+            retries=retries
+        )
+    except Exception as e:
+        print(f"Error during Scopus search (start={start}): {e}")
+        return None, None
+    
+    if response.status_code != 200:
+        print(f"Scopus API error: {response.status_code}")
+        print(f"Response: {response.text}")
+        return None, response
+    
+    try:
+        return response.json(), response
+    except ValueError as e:
+        print(f"Error parsing Scopus response (start={start}): {e}")
+        return None, response
+
+def _scopus_headers(api_key: str) -> Dict:
+    """Request headers for the Scopus Search API."""
+    return {
         'X-ELS-APIKey': api_key,
         'Accept': 'application/json'
     }
+
+def scopus_first_page(query: str, api_key: str, max_results: int = 200,
+                      fields: Optional[str] = None) -> Optional[Dict]:
+    """
+    Fetch the first page of a Scopus search.
     
-    params = {
-        'query': query,
-        'count': min(max_results, 25),  # API limit per request
-        'start': 0
+    Args:
+        query: Search query string
+        api_key: Scopus API key
+        max_results: Maximum number of results that will be retrieved
+        fields: Comma-separated fields to return (default: the full standard view)
+        
+    Returns:
+        Dictionary with 'entries', 'total_results' and 'quota_remaining',
+        or None if the request failed
+    """
+    page_size = min(max_results, config.SCOPUS_PAGE_SIZE)  # API limit per request
+    
+    data, response = _fetch_scopus_page(query, _scopus_headers(api_key), 0, page_size, fields=fields)
+    if data is None:
+        return None
+    
+    search_results = data.get('search-results', {})
+    return {
+        'entries': search_results.get('entry', []),
+        'total_results': int(search_results.get('opensearch:totalResults', 0)),
+        'quota_remaining': _scopus_quota_remaining(response)
     }
+
+def iter_scopus_pages(query: str, api_key: str, max_results: int = 200,
+                      max_workers: Optional[int] = None,
+                      first_page: Optional[Dict] = None,
+                      fields: Optional[str] = None,
+                      page_size: Optional[int] = None) -> Iterator[List[Dict]]:
+    """
+    Yield pages of Scopus search results in order, as soon as each is available.
     
-    all_results = []
+    The first page is fetched on its own to learn the total result count and
+    the remaining API quota; the remaining pages are then fetched concurrently.
+    Iteration stops at the first failed page, so the results are always a
+    contiguous prefix of the ranked result set.
     
-    while len(all_results) < max_results:
-        try:
-            response = requests.get(
-                config.SCOPUS_SEARCH_URL,
-                headers=headers,
-                params=params,
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                print(f"Scopus API error: {response.status_code}")
-                print(f"Response: {response.text}")
+    Args:
+        query: Search query string
+        api_key: Scopus API key
+        max_results: Maximum number of results to retrieve
+        max_workers: Maximum concurrent page requests (default: config.SCOPUS_MAX_CONCURRENCY)
+        first_page: Result of scopus_first_page, if already fetched
+        fields: Comma-separated fields to return (default: the full standard view)
+        page_size: Results per request after the first page (default:
+            config.SCOPUS_PAGE_SIZE; up to config.SCOPUS_LISTING_PAGE_SIZE
+            with a few fields)
+        
+    Yields:
+        Lists of raw Scopus entries
+    """
+    if first_page is None:
+        first_page = scopus_first_page(query, api_key, max_results, fields)
+    if first_page is None or not first_page['entries']:
+        return
+    
+    yielded = len(first_page['entries'][:max_results])
+    yield first_page['entries'][:max_results]
+    
+    first_size = min(max_results, config.SCOPUS_PAGE_SIZE)  # Size scopus_first_page requested
+    page_size = min(max_results, page_size or config.SCOPUS_PAGE_SIZE)
+    offsets = list(range(first_size, min(max_results, first_page['total_results']), page_size))
+    if not offsets:
+        return
+    
+    # Never request more pages than the remaining quota allows
+    quota_remaining = first_page['quota_remaining']
+    if quota_remaining is not None and quota_remaining < len(offsets):
+        print(f"⚠ Scopus quota nearly exhausted ({quota_remaining} requests left); "
+              f"fetching {quota_remaining} of {len(offsets)} remaining pages")
+        offsets = offsets[:quota_remaining]
+    
+    headers = _scopus_headers(api_key)
+    workers = max(1, min(max_workers or config.SCOPUS_MAX_CONCURRENCY, len(offsets)))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # map() yields in submission order, each page as soon as it (and all before it) arrived
+        fetch = lambda start: _fetch_scopus_page(query, headers, start, page_size, fields=fields)[0]
+        for page in pool.map(fetch, offsets):
+            if page is None:
                 break
-            
-            data = response.json()
-            entries = data.get('search-results', {}).get('entry', [])
-            
+            entries = page.get('search-results', {}).get('entry', [])[:max_results - yielded]
             if not entries:
                 break
-            
-            all_results.extend(entries)
-            
-            # Check if there are more results
-            total_results = int(data.get('search-results', {}).get('opensearch:totalResults', 0))
-            if len(all_results) >= total_results:
-                break
-            
-            # Update start parameter for next page
-            params['start'] += params['count']
-            
-        except Exception as e:
-            print(f"Error during Scopus search: {e}")
-            break
+            yielded += len(entries)
+            yield entries
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def scopus_search(query: str, api_key: str, max_results: int = 200,
+                  max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Search Scopus API for papers.
+    
+    Pages after the first are fetched concurrently (see iter_scopus_pages)
+    and reassembled in their original order.
+    
+    Args:
+        query: Search query string
+        api_key: Scopus API key
+        max_results: Maximum number of results to retrieve
+        max_workers: Maximum concurrent page requests (default: config.SCOPUS_MAX_CONCURRENCY)
+        
+    Returns:
+        List of paper dictionaries
+    """
+    all_results = []
+    for page in iter_scopus_pages(query, api_key, max_results, max_workers):
+        all_results.extend(page)
+    return all_results
+
+class DiskCache:
+    """
+    Persistent key/value cache with per-entry expiry, stored as a single JSON file.
+    Thread-safe. Writes are batched in memory and written out by flush(),
+    which also runs automatically at interpreter exit.
+    """
+    
+    def __init__(self, filepath: Path):
+        self.filepath = Path(filepath)
+        self._entries = None  # {key: {'value': ..., 'expires': epoch_seconds}}
+        self._dirty = False
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+    
+    def _load(self):
+        """Load entries from disk on first use (caller holds the lock)."""
+        if self._entries is None:
+            try:
+                with open(self.filepath, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._entries = {}
     
-    return all_results[:max_results]
+    def get(self, key: str):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] < time.time():
+                del self._entries[key]
+                self._dirty = True
+                return None
+            return entry['value']
+    
+    def set(self, key: str, value, ttl: float):
+        """Store value under key for ttl seconds."""
+        with self._lock:
+            self._load()
+            self._entries[key] = {'value': value, 'expires': time.time() + ttl}
+            self._dirty = True
+    
+    def flush(self):
+        """Write pending changes to disk (atomically replaces the cache file)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.filepath.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.filepath.with_suffix(self.filepath.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.filepath)
+            self._dirty = False
 
-def get_journal_metrics(issn: str, api_key: str) -> Dict:
+class LRUDiskCache(DiskCache):
+    """
+    DiskCache bounded in size: once the stored values exceed max_bytes (as
+    JSON), the least recently used entries are evicted. A ttl of None keeps
+    an entry until it is evicted.
+    """
+    
+    def __init__(self, filepath: Path, max_bytes: int):
+        super().__init__(filepath)
+        self.max_bytes = max_bytes
+    
+    def get(self, key: str, touch: bool = True):
+        """Return the cached value for key, or None if missing or expired; touch=False leaves its recency (and the file) alone."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] is not None and entry['expires'] < time.time():
+                if touch:
+                    del self._entries[key]
+                    self._dirty = True
+                return None
+            if touch:
+                entry['used'] = time.time()
+                self._dirty = True
+            return entry['value']
+    
+    def set(self, key: str, value, ttl: Optional[float]):
+        """Store value under key for ttl seconds (None: until evicted), evicting least recently used entries."""
+        with self._lock:
+            self._load()
+            now = time.time()
+            self._entries[key] = {
+                'value': value,
+                'expires': now + ttl if ttl else None,
+                'used': now,
+                'size': len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+            }
+            total = sum(entry.get('size', 0) for entry in self._entries.values())
+            for old_key in sorted(self._entries, key=lambda k: self._entries[k].get('used', 0)):
+                if total <= self.max_bytes or old_key == key:
+                    break
+                total -= self._entries.pop(old_key).get('size', 0)
+            self._dirty = True
+
+# Journal metrics shared across runs, keyed by normalized ISSN/eISSN
+journal_metrics_cache = DiskCache(config.CACHE_FILES['journal_metrics'])
+
+def normalize_issn(issn: str) -> str:
+    """Normalize an ISSN for use as a cache key (e.g. '1234-567x' -> '1234567X')."""
+    return issn.replace('-', '').strip().upper()
+
+def get_journal_metrics(issn: str, api_key: str, use_cache: bool = True) -> Dict:
     """
     Get journal metrics from Scopus Serial Title API.
     
+    Results are cached on disk (see config.JOURNAL_METRICS_TTL); "N/A"
+    results are cached for config.JOURNAL_METRICS_NA_TTL only.
+    
     Args:
-        issn: Journal ISSN
+        issn: Journal ISSN or eISSN
         api_key: Scopus API key
+        use_cache: If False, always query the API (the result is still cached)
         
     Returns:
         Dictionary with CiteScore, SJR, SNIP
     """
+    key = normalize_issn(issn)
+    
+    if use_cache:
+        with tracer.span("journal metrics cache", "cache", issn=key) as span:
+            cached = journal_metrics_cache.get(key)
+            span.set(cache='hit' if cached is not None else 'miss')
+        if cached is not None:
+            return cached
+    
     headers = {
         'X-ELS-APIKey': api_key,
         'Accept': 'application/json'
     }
     
+    metrics = {'citescore': 'N/A', 'sjr': 'N/A', 'snip': 'N/A'}
+    aliases = set()
+    throttled = False
+    
     try:
-        response = requests.get(
+        response = http_client.get(
             f"{config.SCOPUS_SERIAL_URL}/issn/{issn}",
-            headers=headers,
-            timeout=30
+            headers=headers
         )
         
+        throttled = response.status_code == 429
         if response.status_code == 200:
             data = response.json()
             entry = data.get('serial-metadata-response', {}).get('entry', [{}])[0]
@@ -185,15 +1082,121 @@ def get_journal_metrics(issn: str, api_key: str) -> Dict:
             sjr = entry.get('SJRList', {}).get('SJR', [{}])[0].get('$', 'N/A')
             snip = entry.get('SNIPList', {}).get('SNIP', [{}])[0].get('$', 'N/A')
             
-            return {
+            metrics = {
                 'citescore': citescore,
                 'sjr': sjr,
                 'snip': snip
             }
+            
+            # The same journal is also reachable through its other ISSN
+            for alias_field in ('prism:issn', 'prism:eIssn'):
+                if entry.get(alias_field):
+                    aliases.add(normalize_issn(entry[alias_field]))
     except Exception as e:
         print(f"Error fetching journal metrics for ISSN {issn}: {e}")
     
-    return {'citescore': 'N/A', 'sjr': 'N/A', 'snip': 'N/A'}
+    if throttled:
+        # Rate limited: not an answer about the journal, so don't remember it
+        return metrics
+    
+    found = any(value != 'N/A' for value in metrics.values())
+    ttl = config.JOURNAL_METRICS_TTL if found else config.JOURNAL_METRICS_NA_TTL
+    for cache_key in {key} | aliases:
+        journal_metrics_cache.set(cache_key, metrics, ttl)
+    
+    return metrics
+
+def file_sha256(filepath: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PdfStore:
+    """
+    Content-addressed store of downloaded PDFs, shared across runs.
+    
+    Each PDF is kept once, named by its SHA-256 (<root>/<sha[:2]>/<sha>.pdf),
+    and linked into the run folders that use it. An index maps document keys
+    ("doi:<doi>", "scopus:<id>") to hashes, so a paper downloaded by an
+    earlier run needs no network traffic. Stored files are verified against
+    their hash before reuse. Partial downloads are kept in <root>/partial so
+    they can be resumed.
+    """
+    
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.index = DiskCache(self.root / 'index.json')
+        self._locks = {}
+        self._lock = threading.Lock()
+    
+    def object_path(self, sha256: str) -> Path:
+        """Path of the stored PDF with the given hash."""
+        return self.root / sha256[:2] / f"{sha256}.pdf"
+    
+    def partial_path(self, url: str) -> Path:
+        """Path of the partial download of a URL."""
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.root / 'partial' / f"{key}.part"
+    
+    def download_lock(self, url: str) -> threading.Lock:
+        """Lock serializing downloads of the same URL (they share a partial file)."""
+        with self._lock:
+            return self._locks.setdefault(url, threading.Lock())
+    
+    def find(self, keys: Iterable[str]) -> Optional[Path]:
+        """
+        Look up a stored PDF by any of its document keys.
+        
+        Returns:
+            Path of the stored PDF, or None if it is not stored (or corrupted)
+        """
+        for key in keys:
+            sha256 = self.index.get(key)
+            if sha256:
+                path = self.object_path(sha256)
+                if path.exists() and file_sha256(path) == sha256:
+                    return path
+        return None
+    
+    def add(self, filepath: Path, keys: Iterable[str]) -> Path:
+        """
+        Move a downloaded PDF into the store and index it under the given keys.
+        
+        Returns:
+            Path of the stored PDF
+        """
+        sha256 = file_sha256(filepath)
+        path = self.object_path(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            Path(filepath).unlink()
+        else:
+            os.replace(filepath, path)
+        
+        for key in keys:
+            self.index.set(key, sha256, config.PDF_STORE_TTL)
+        self.index.flush()
+        return path
+    
+    @staticmethod
+    def link(path: Path, dest: Path) -> Path:
+        """Make a stored PDF available at dest (hard link, else symlink, else copy)."""
+        dest = Path(dest)
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(path, dest)
+        except OSError:
+            try:
+                dest.symlink_to(Path(path).resolve())
+            except OSError:
+                shutil.copy2(path, dest)
+        return dest
+
+# Downloaded PDFs shared across runs
+pdf_store = PdfStore(config.CACHE_FILES['pdfs'])
 
 def clean_text(text: str) -> str:
     """
@@ -221,6 +1224,139 @@ def load_json(filepath: Path) -> Dict or List:
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+def jsonl_done_marker(filepath: Path) -> Path:
+    """Path of the marker file that signals a JSON Lines file is complete."""
+    filepath = Path(filepath)
+    return filepath.with_name(filepath.name + '.done')
+
+class JsonlWriter:
+    """
+    Appends records to a JSON Lines file, one JSON document per line.
+    
+    Records are flushed as they are written so readers (see follow_jsonl)
+    can consume them immediately. Closing the writer creates the completion
+    marker that tells followers no more records will arrive.
+    """
+    
+    def __init__(self, filepath: Path):
+        self.filepath = Path(filepath)
+        self.count = 0
+        jsonl_done_marker(self.filepath).unlink(missing_ok=True)
+        self._file = open(self.filepath, 'w', encoding='utf-8')
+    
+    def write(self, record: Dict):
+        """Write a single record."""
+        self.write_many([record])
+    
+    def write_many(self, records: Iterable[Dict]):
+        """Write several records and flush them to disk."""
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.count += 1
+        self._file.flush()
+    
+    def close(self):
+        """Close the file and mark it complete."""
+        if not self._file.closed:
+            self._file.close()
+            jsonl_done_marker(self.filepath).touch()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def save_jsonl(records: Iterable[Dict], filepath: Path) -> int:
+    """Save records to a JSON Lines file. Returns the number of records written."""
+    with JsonlWriter(filepath) as writer:
+        writer.write_many(records)
+    return writer.count
+
+def iter_records(filepath: Path) -> Iterator[Dict]:
+    """
+    Iterate over the records of a JSON Lines file without loading it whole.
+    
+    If the file does not exist but a legacy single-document .json file does,
+    it is converted to JSON Lines first.
+    
+    Raises:
+        FileNotFoundError: If neither file exists
+    """
+    filepath = Path(filepath)
+    if not filepath.exists():
+        legacy_path = filepath.with_suffix('.json')
+        if legacy_path == filepath or not legacy_path.exists():
+            raise FileNotFoundError(filepath)
+        print(f"Converting legacy {legacy_path.name} to {filepath.name}...")
+        save_jsonl(load_json(legacy_path), filepath)
+    
+    def records():
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    
+    return records()
+
+def load_records(filepath: Path) -> List[Dict]:
+    """Load all records of a JSON Lines file (see iter_records)."""
+    return list(iter_records(filepath))
+
+def follow_jsonl(filepath: Path, poll_interval: float = 0.5,
+                 idle_timeout: Optional[float] = None) -> Iterator[Dict]:
+    """
+    Iterate over a JSON Lines file while it is still being written.
+    
+    Yields records as they are appended and stops once the writer has marked
+    the file complete (see JsonlWriter), or after idle_timeout seconds
+    without new data.
+    
+    Args:
+        filepath: JSON Lines file (a legacy .json file is converted first)
+        poll_interval: Seconds to wait between checks for new data
+        idle_timeout: Give up after this many idle seconds (default: config.STREAM_IDLE_TIMEOUT)
+        
+    Raises:
+        FileNotFoundError: If the file does not exist
+    """
+    filepath = Path(filepath)
+    if not filepath.exists():
+        # Nothing is being written: fall back to reading (or converting) it whole
+        return iter_records(filepath)
+    
+    marker = jsonl_done_marker(filepath)
+    idle_timeout = idle_timeout or config.STREAM_IDLE_TIMEOUT
+    
+    def records():
+        last_data = time.monotonic()
+        pending = b''
+        with open(filepath, 'rb') as f:
+            while True:
+                done = marker.exists()
+                
+                # Read everything appended so far; a trailing partial line waits for the rest
+                for chunk in iter(f.readline, b''):
+                    pending += chunk
+                    if pending.endswith(b'\n'):
+                        if pending.strip():
+                            yield json.loads(pending)
+                        pending = b''
+                    last_data = time.monotonic()
+                
+                if done:
+                    if pending.strip():
+                        yield json.loads(pending)
+                    return
+                
+                if time.monotonic() - last_data > idle_timeout:
+                    print(f"⚠ No new records in {filepath.name} for {idle_timeout:.0f}s; stopping")
+                    return
+                
+                time.sleep(poll_interval)
+    
+    return records()
+
 def count_keyword_matches(text: str, keywords: List[str]) -> int:
     """
     Count how many keywords appear in text (case-insensitive).
@@ -235,114 +1371,853 @@ def count_keyword_matches(text: str, keywords: List[str]) -> int:
     text_lower = text.lower()
     return sum(1 for keyword in keywords if keyword.lower() in text_lower)
 
+def top_k(items: Iterable, k: int, key: Callable) -> List:
+    """
+    Return the k items with the highest key, best first.
+    
+    Equivalent to sorted(items, key=key, reverse=True)[:k] (ties keep their
+    original order) but runs in O(n log k) without sorting everything.
+    """
+    return heapq.nlargest(k, items, key=key)
+
+class RunningTopK:
+    """
+    Keeps the k highest-scoring items seen so far in bounded memory.
+    Ties keep the earlier item, matching a stable descending sort.
+    """
+    
+    def __init__(self, k: int):
+        self.k = k
+        self.count = 0  # items seen
+        self._heap = []  # min-heap of (score, -sequence, item): the root is the worst kept item
+    
+    def push(self, score: float, item):
+        """Offer an item with its score."""
+        entry = (score, -self.count, item)
+        self.count += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+    
+    def items(self) -> List:
+        """Return the kept items, best first."""
+        return [item for _, _, item in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+class KeywordMatcher:
+    """
+    Counts keyword matches for several keyword categories in a single pass.
+    
+    For each category the count equals count_keyword_matches(text, keywords):
+    the number of its keywords that occur in the text (case-insensitive).
+    All keywords are compiled into one prefix-factored (trie) regex that finds
+    the longest keyword starting at each matching position; every keyword
+    contained in a found keyword is then known to be present as well.
+    """
+    
+    def __init__(self, categories: Dict[str, List[str]], word_boundary: bool = False):
+        """
+        Args:
+            categories: Mapping of category name to keyword list
+            word_boundary: If True, keywords only match as whole words/phrases
+        """
+        self.categories = {name: [kw.lower() for kw in keywords] for name, keywords in categories.items()}
+        self.word_boundary = word_boundary
+        
+        keywords = sorted({kw for kws in self.categories.values() for kw in kws})
+        self._pattern = None
+        if keywords:
+            pattern = self._trie_pattern(keywords)
+            if word_boundary:
+                pattern = rf'(?<!\w){pattern}(?!\w)'
+            self._pattern = re.compile(pattern)
+        
+        # Keywords implied by each keyword (itself plus any keyword it contains)
+        self._implied = {
+            outer: {inner for inner in keywords if self._contains(outer, inner)}
+            for outer in keywords
+        }
+    
+    @staticmethod
+    def _trie_pattern(keywords: List[str]) -> str:
+        """Build a regex matching any keyword, factored by common prefixes (longest match wins)."""
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}  # a keyword ends here
+        
+        def build(node: Dict) -> str:
+            branches = [re.escape(char) + build(child) for char, child in node.items() if char]
+            if not branches:
+                return ''
+            if '' in node:
+                # Greedy optional continuation: the longer keyword is tried first
+                return f"(?:{'|'.join(branches)})?"
+            return branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        
+        return f"(?:{build(trie)})"
+    
+    def _contains(self, outer: str, inner: str) -> bool:
+        """Whether keyword inner matches inside keyword outer."""
+        if not self.word_boundary:
+            return inner in outer
+        return re.search(rf'(?<!\w){re.escape(inner)}(?!\w)', outer) is not None
+    
+    def count(self, text: str) -> Dict[str, int]:
+        """
+        Count keyword matches per category.
+        
+        Args:
+            text: Text to search
+            
+        Returns:
+            Dictionary mapping category name to number of matching keywords
+        """
+        found = set()
+        if self._pattern is not None:
+            text_lower = text.lower()
+            # Restart one character after each match start so overlapping
+            # keywords are found too
+            match = self._pattern.search(text_lower)
+            while match:
+                found.add(match.group())
+                match = self._pattern.search(text_lower, match.start() + 1)
+        
+        present = set()
+        for longest in found:
+            present |= self._implied[longest]
+        
+        return {
+            name: sum(1 for kw in keywords if kw in present)
+            for name, keywords in self.categories.items()
+        }
+
+# Words too common to tell passages apart
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have how if in into is it its
+not of on or so such than that the their there these they this those to was were what when
+where which while who why will with
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words for retrieval, without stopwords and with plural -s stripped."""
+    words = []
+    for word in re.findall(r'\w+', text.lower()):
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+def chunk_text(text: str, chunk_chars: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Split text into overlapping chunks, cutting at whitespace where possible.
+    
+    Args:
+        text: Text to split
+        chunk_chars: Target chunk length in characters
+        overlap: Characters shared by consecutive chunks
+        
+    Returns:
+        (start, end) character offsets of each chunk
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            # Cut at the last whitespace in the final fifth of the chunk
+            cut = text.rfind(' ', end - chunk_chars // 5, end)
+            cut = max(cut, text.rfind('\n', end - chunk_chars // 5, end))
+            if cut > start:
+                end = cut
+        chunks.append((start, end))
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        # Start the next chunk at a word boundary
+        space = text.find(' ', start, end)
+        if space != -1 and space - start < overlap // 2:
+            start = space + 1
+    return chunks
+
+class ChunkRetriever:
+    """
+    Offline relevance search over a document: the text is split into
+    overlapping chunks, indexed once with BM25, and each query gets the
+    best chunks that fit a token budget.
+    """
+    
+    def __init__(self, text: str, chunk_chars: Optional[int] = None, overlap: Optional[int] = None,
+                 k1: float = 1.5, b: float = 0.75, model: Optional[str] = None):
+        """
+        Args:
+            text: Document text
+            chunk_chars: Chunk length in characters (default: config.RETRIEVAL_CHUNK_CHARS)
+            overlap: Overlap between chunks (default: config.RETRIEVAL_CHUNK_OVERLAP)
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            model: Model whose tokenizer counts the token budget (see estimate_tokens)
+        """
+        self.text = text
+        self.chunks = chunk_text(
+            text,
+            chunk_chars or config.RETRIEVAL_CHUNK_CHARS,
+            config.RETRIEVAL_CHUNK_OVERLAP if overlap is None else overlap
+        )
+        self._chunk_tokens = [estimate_tokens(text[start:end], model) for start, end in self.chunks]
+        self.k1 = k1
+        self.b = b
+        
+        self._term_freqs = [Counter(tokenize(text[start:end])) for start, end in self.chunks]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0
+        
+        doc_freqs = Counter(term for tf in self._term_freqs for term in tf)
+        n = len(self.chunks)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+    
+    def scores(self, query: str) -> List[float]:
+        """BM25 score of every chunk for the query."""
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        scores = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length) if self._avg_length else self.k1
+            scores.append(sum(
+                self._idf[term] * tf[term] * (self.k1 + 1) / (tf[term] + norm)
+                for term in terms if term in tf
+            ))
+        return scores
+    
+    def search(self, query: str, k: Optional[int] = None) -> List[int]:
+        """Indices of the chunks matching the query, best first."""
+        scores = self.scores(query)
+        ranked = [i for i in sorted(range(len(scores)), key=lambda i: -scores[i]) if scores[i] > 0]
+        return ranked[:k] if k else ranked
+    
+    def context(self, query: str, token_budget: Optional[int] = None,
+                max_chunks: Optional[int] = None) -> str:
+        """
+        The most relevant passages for a query, within a token budget.
+        
+        Chunks are taken best first while they fit the budget (text shared
+        with chunks already taken is not counted twice), then put back in
+        document order with overlapping chunks merged. If nothing matches,
+        the beginning of the document is used.
+        
+        Args:
+            query: Question or search terms
+            token_budget: Maximum tokens of context (default: config.RETRIEVAL_TOKEN_BUDGET)
+            max_chunks: Maximum number of chunks (default: config.RETRIEVAL_MAX_CHUNKS)
+            
+        Returns:
+            Passages separated by "[...]"
+        """
+        token_budget = token_budget or config.RETRIEVAL_TOKEN_BUDGET
+        max_chunks = max_chunks or config.RETRIEVAL_MAX_CHUNKS
+        
+        ranked = self.search(query) or list(range(len(self.chunks)))
+        selected = []
+        used = 0
+        for i in ranked:
+            start, end = self.chunks[i]
+            # Count only the part not already covered by selected chunks
+            new_chars = end - start - sum(
+                max(0, min(end, other_end) - max(start, other_start))
+                for other_start, other_end in selected
+            )
+            cost = self._chunk_tokens[i] * max(0, new_chars) // max(1, end - start)
+            if used + cost > token_budget:
+                continue
+            selected.append((start, end))
+            used += cost
+            if len(selected) >= max_chunks:
+                break
+        
+        # Document order, overlapping chunks merged
+        spans = []
+        for start, end in sorted(selected):
+            if spans and start <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                spans.append([start, end])
+        return "\n[...]\n".join(self.text[start:end].strip() for start, end in spans)
+
+class _UsageShard:
+    """Usage recorded by one thread: only that thread writes it, readers merge all shards."""
+    def __init__(self):
+        self.stats = {}   # {(model, labels): usage dictionary}
+        self.totals = {}  # {model: input + output tokens}, for cost alerts
+
+# Labels (e.g. phase, question) attached to the usage recorded in the current
+# context; see TokenTracker.scope
+_usage_labels = contextvars.ContextVar('usage_labels', default=())
+
 class TokenTracker:
     """
     Tracks token usage and calculates costs for LLM calls.
     Singleton instance used across the application.
+    
+    Safe for calls from thread pools and asyncio tasks: each thread records
+    into its own shard without locking, and readers (usage, breakdown,
+    reports) merge the shards. Usage is labelled with the current scope
+    (e.g. phase and question, see scope) for per-phase and per-question
+    breakdowns.
     """
     _instance = None
     
+    USAGE_FIELDS = ('input', 'output', 'calls', 'cached_input', 'cache_write',
+                    'saved_input', 'saved_output', 'cache_hits')
+    
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(TokenTracker, cls).__new__(cls)
-            cls._instance.usage = {}  # {model_name: {'input': 0, 'output': 0, 'calls': 0}}
-            cls._instance.alerts = {} # {model_name: last_alert_threshold}
+            cls._instance._local = threading.local()
+            cls._instance._shards = []  # every thread's _UsageShard
+            cls._instance._shards_lock = threading.Lock()  # taken once per thread, to register its shard
+            cls._instance.alerts = {}  # {model_name: last_alert_threshold}
+            cls._instance._alerts_lock = threading.Lock()  # taken only when a threshold is crossed
         return cls._instance
     
-    def track(self, model: str, input_tokens: int, output_tokens: int):
-        """Record token usage for a model."""
-        if model not in self.usage:
-            self.usage[model] = {'input': 0, 'output': 0, 'calls': 0}
-            self.alerts[model] = 0
-            
-        self.usage[model]['input'] += input_tokens
-        self.usage[model]['output'] += output_tokens
-        self.usage[model]['calls'] += 1
+    def _shard(self) -> _UsageShard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _UsageShard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+    
+    def _stats(self, shard: _UsageShard, model: str, provider: Optional[str]) -> Dict:
+        key = (model, _usage_labels.get())
+        stats = shard.stats.get(key)
+        if stats is None:
+            stats = shard.stats[key] = dict.fromkeys(self.USAGE_FIELDS, 0)
+        if provider:
+            stats['provider'] = provider
+        return stats
+    
+    @contextlib.contextmanager
+    def scope(self, **labels):
+        """
+        Label the usage recorded inside the block (and in tasks/threads
+        started with its context), e.g. scope(phase="4") or scope(question=3).
+        """
+        current = dict(_usage_labels.get())
+        current.update({name: str(value) for name, value in labels.items()})
+        token = _usage_labels.set(tuple(sorted(current.items())))
+        try:
+            yield
+        finally:
+            _usage_labels.reset(token)
+    
+    def track(self, model: str, input_tokens: int, output_tokens: int,
+              cached_tokens: int = 0, cache_write_tokens: int = 0, provider: Optional[str] = None):
+        """
+        Record token usage for a model.
         
-        # Check for alerts (every 100k total tokens)
-        total_tokens = self.usage[model]['input'] + self.usage[model]['output']
-        threshold = total_tokens // 100000
+        Args:
+            input_tokens: All input tokens of the call
+            output_tokens: Output tokens of the call
+            cached_tokens: Input tokens read from the provider's prompt cache
+            cache_write_tokens: Input tokens written to the provider's prompt cache
+            provider: LLM provider (prices cached tokens, see config.LLM_CACHE_PRICING)
+        """
+        shard = self._shard()
+        stats = self._stats(shard, model, provider)
+        stats['input'] += input_tokens
+        stats['output'] += output_tokens
+        stats['cached_input'] += cached_tokens
+        stats['cache_write'] += cache_write_tokens
+        stats['calls'] += 1
+        shard.totals[model] = shard.totals.get(model, 0) + input_tokens + output_tokens
         
-        if threshold > self.alerts[model]:
+        # Check for alerts (every 100k total tokens); each threshold fires once
+        total_tokens = sum(other.totals.get(model, 0) for other in list(self._shards))
+        threshold = total_tokens // 100000
+        if threshold <= self.alerts.get(model, 0):
+            return
+        with self._alerts_lock:
+            if threshold <= self.alerts.get(model, 0):
+                return
             self.alerts[model] = threshold
             print(f"\n[COST ALERT] Usage for {model} exceeded {threshold * 100000} tokens.")
             cost = self.calculate_cost(model)
             print(f"Estimated cost so far: ${cost:.2f}")
     
-    def calculate_cost(self, model: str) -> float:
-        """Calculate estimated cost for a specific model."""
-        if model not in self.usage:
-            return 0.0
-            
+    def track_saved(self, model: str, input_tokens: int, output_tokens: int, provider: Optional[str] = None):
+        """Record a call answered from the LLM response cache (tokens saved, not spent)."""
+        stats = self._stats(self._shard(), model, provider)
+        stats['saved_input'] += input_tokens
+        stats['saved_output'] += output_tokens
+        stats['cache_hits'] += 1
+    
+    def _merged(self, group: Callable[[str, Dict], Optional[str]]) -> Dict:
+        """Merge all shards into {group: {model: usage}}; group(model, labels) picks the group."""
+        merged = {}
+        for shard in list(self._shards):
+            for (model, labels), stats in list(shard.stats.items()):
+                key = group(model, dict(labels))
+                total = merged.setdefault(key, {}).setdefault(model, dict.fromkeys(self.USAGE_FIELDS, 0))
+                for field in self.USAGE_FIELDS:
+                    total[field] += stats[field]
+                if 'provider' in stats:
+                    total['provider'] = stats['provider']
+        return merged
+    
+    @property
+    def usage(self) -> Dict:
+        """
+        Usage per model (a merged snapshot):
+        {model_name: {'input', 'output', 'calls', 'cached_input', 'cache_write',
+                      'saved_input', 'saved_output', 'cache_hits', 'provider'}}
+        
+        'input' counts every input token; 'cached_input' and 'cache_write'
+        are the parts read from and written to the provider's prompt cache.
+        'saved_input'/'saved_output' are the tokens of calls answered from
+        the LLM response cache ('cache_hits'), which cost nothing.
+        """
+        return self._merged(lambda model, labels: None).get(None, {})
+    
+    def breakdown(self, label: str) -> Dict:
+        """
+        Usage and cost grouped by a scope label ('phase', 'question'):
+        {label value: {model_name: usage with 'estimated_cost'}}.
+        Usage recorded outside any such scope is grouped under 'unscoped'.
+        """
+        merged = self._merged(lambda model, labels: labels.get(label, 'unscoped'))
+        for models in merged.values():
+            for model, stats in models.items():
+                stats['estimated_cost'] = self._cost(model, stats)
+        # Natural order: phases 0, 1, ..., 4, 4.5, 5; questions 1, 2, ..., 12
+        natural = lambda item: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', item[0])]
+        return dict(sorted(merged.items(), key=natural))
+    
+    @staticmethod
+    def _saved(model: str, stats: Dict) -> float:
         pricing = config.LLM_PRICING.get(model, {"input": 0, "output": 0})
+        return ((stats.get('saved_input', 0) / 1_000_000) * pricing['input'] +
+                (stats.get('saved_output', 0) / 1_000_000) * pricing['output'])
+    
+    @staticmethod
+    def _cost(model: str, stats: Dict) -> float:
+        pricing = config.LLM_PRICING.get(model, {"input": 0, "output": 0})
+        cache_pricing = config.LLM_CACHE_PRICING.get(stats.get('provider'), {"read": 1.0, "write": 1.0})
         
-        input_cost = (self.usage[model]['input'] / 1_000_000) * pricing['input']
-        output_cost = (self.usage[model]['output'] / 1_000_000) * pricing['output']
+        # Cached input is billed at a fraction of the input price, cache writes at a premium
+        cached = stats.get('cached_input', 0)
+        written = stats.get('cache_write', 0)
+        input_tokens = (stats['input'] - cached - written
+                        + cached * cache_pricing['read'] + written * cache_pricing['write'])
+        input_cost = (input_tokens / 1_000_000) * pricing['input']
+        output_cost = (stats['output'] / 1_000_000) * pricing['output']
         
         return input_cost + output_cost
     
+    def calculate_saved(self, model: str) -> float:
+        """Calculate the cost saved by LLM response cache hits for a model (at full input price)."""
+        usage = self.usage
+        return self._saved(model, usage[model]) if model in usage else 0.0
+    
+    def calculate_cost(self, model: str) -> float:
+        """Calculate estimated cost for a specific model."""
+        usage = self.usage
+        return self._cost(model, usage[model]) if model in usage else 0.0
+    
     def get_total_cost(self) -> float:
         """Calculate total cost across all models."""
-        return sum(self.calculate_cost(model) for model in self.usage)
+        return sum(self._cost(model, stats) for model, stats in self.usage.items())
         
     def get_summary(self) -> Dict:
         """Get summary of usage and costs."""
         summary = {}
         for model, stats in self.usage.items():
-            cost = self.calculate_cost(model)
             summary[model] = {
                 'calls': stats['calls'],
-                'input_tokens': stats['input_tokens'], # Fix: key is 'input' in usage dict
-                'output_tokens': stats['output_tokens'], # Fix: key is 'output' in usage dict
+                'input_tokens': stats['input'],
+                'cached_input_tokens': stats['cached_input'],
+                'output_tokens': stats['output'],
                 'total_tokens': stats['input'] + stats['output'],
-                'estimated_cost': cost
+                'cache_hits': stats['cache_hits'],
+                'estimated_cost': self._cost(model, stats),
+                'estimated_savings': self._saved(model, stats)
             }
         return summary
     
     def save_report(self, filepath: Path):
-        """Save usage report to JSON."""
+        """Save usage report to JSON (totals, and breakdowns by phase and by question)."""
+        usage = self.usage
         report = {
-            'usage': self.usage,
-            'costs': {model: self.calculate_cost(model) for model in self.usage},
-            'total_cost': self.get_total_cost()
+            'usage': usage,
+            'costs': {model: self._cost(model, stats) for model, stats in usage.items()},
+            'total_cost': sum(self._cost(model, stats) for model, stats in usage.items()),
+            'saved': {model: self._saved(model, stats) for model, stats in usage.items()},
+            'total_saved': sum(self._saved(model, stats) for model, stats in usage.items()),
+            'by_phase': self.breakdown('phase'),
+            'by_question': self.breakdown('question')
         }
         save_json(report, filepath)
 
 # Global tracker instance
 tracker = TokenTracker()
 
-def estimate_tokens(text: str) -> int:
+def resolve_model(model: str) -> Tuple[Optional[str], str]:
     """
-    Estimate token count (approx 4 chars per token).
-    In production, use tiktoken or provider-specific tokenizers.
+    Provider and model ID of a model key or ID from config.LLM_MODELS
+    (e.g. 'sonnet_4.5' or 'claude-sonnet-4.5' -> ('anthropic', 'claude-sonnet-4.5')).
+    Unknown models resolve to (None, model).
+    """
+    for provider, models in config.LLM_MODELS.items():
+        if model in models:
+            return provider, models[model]
+        if model in models.values():
+            return provider, model
+    return None, model
+
+class RatioTokenizer:
+    """Token count estimated from characters per token."""
+    def __init__(self, chars_per_token: float):
+        self.chars_per_token = chars_per_token
+    
+    def count(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token)
+
+class TiktokenTokenizer:
+    """Exact token count with a tiktoken encoding; counts of repeated texts are memoized."""
+    def __init__(self, encoding_name: str):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.count = functools.lru_cache(maxsize=config.TOKEN_COUNT_CACHE_SIZE)(self._count)
+    
+    def _count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+# Tokenizer factories by model ID, consulted before the built-in choice
+# (register_tokenizer); tokenizers are created on first use
+_tokenizer_factories: Dict[str, Callable[[], object]] = {}
+_tokenizers: Dict[Optional[str], object] = {}
+_tokenizers_lock = threading.Lock()
+
+def register_tokenizer(model: str, factory: Callable[[], object]):
+    """Use factory() (an object with count(text) -> int) to count tokens for a model key or ID."""
+    _, model_id = resolve_model(model)
+    with _tokenizers_lock:
+        _tokenizer_factories[model_id] = factory
+        _tokenizers.pop(model_id, None)
+
+def get_tokenizer(model: Optional[str] = None):
+    """
+    Tokenizer of a model (key or ID from config.LLM_MODELS), created once.
+    
+    A registered tokenizer comes first, then tiktoken for models listed in
+    config.TOKENIZER_ENCODINGS (when installed), then the provider's
+    calibrated characters-per-token ratio.
+    """
+    model_id = resolve_model(model)[1] if model else None
+    tokenizer = _tokenizers.get(model_id)
+    if tokenizer is not None:
+        return tokenizer
+    
+    with _tokenizers_lock:
+        if model_id not in _tokenizers:
+            provider = resolve_model(model_id)[0] if model_id else None
+            tokenizer = None
+            if model_id in _tokenizer_factories:
+                tokenizer = _tokenizer_factories[model_id]()
+            elif model_id in config.TOKENIZER_ENCODINGS:
+                try:
+                    tokenizer = TiktokenTokenizer(config.TOKENIZER_ENCODINGS[model_id])
+                except Exception:
+                    tokenizer = None  # tiktoken not installed (or encoding unavailable offline)
+            if tokenizer is None:
+                tokenizer = RatioTokenizer(config.CHARS_PER_TOKEN.get(provider, config.DEFAULT_CHARS_PER_TOKEN))
+            _tokenizers[model_id] = tokenizer
+        return _tokenizers[model_id]
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens of a text for a model (see get_tokenizer).
+    
+    Exact where the model has a local tokenizer, otherwise estimated from
+    the provider's calibrated characters per token. Without a model,
+    config.DEFAULT_CHARS_PER_TOKEN is used.
     """
     if not text:
         return 0
-    return len(text) // 4
+    return get_tokenizer(model).count(text)
+
+_llm_rate_limiters = {}
+_llm_rate_limiters_lock = threading.Lock()
+
+def llm_rate_limiter(provider: str) -> Optional[TokenBucket]:
+    """Shared request rate limiter of an LLM provider (config.LLM_RATE_LIMITS), if limited."""
+    with _llm_rate_limiters_lock:
+        if provider not in _llm_rate_limiters:
+            per_minute = config.LLM_RATE_LIMITS.get(provider)
+            _llm_rate_limiters[provider] = TokenBucket(
+                per_minute / 60, capacity=max(1, config.LLM_MAX_CONCURRENCY)
+            ) if per_minute else None
+        return _llm_rate_limiters[provider]
+
+class Prompt:
+    """
+    A prompt laid out as a stable prefix followed by the per-call part.
+    
+    Blocks are sent in the order they are added. A block added with
+    cache=True ends a cacheable prefix (a cache breakpoint): providers only
+    reuse a cached prefix that is identical up to the breakpoint, so the
+    content shared between calls (instructions, paper text, draft) goes
+    first and the question or feedback last.
+    
+    Anthropic caches at explicit breakpoints (see content_blocks, at most
+    MAX_BREAKPOINTS); OpenAI, Google and xAI cache repeated prefixes
+    automatically and are sent the plain text.
+    """
+    SEPARATOR = "\n\n"
+    MAX_BREAKPOINTS = 4
+    
+    def __init__(self):
+        self.blocks: List[Tuple[str, bool]] = []  # [(text, cache_breakpoint)]
+    
+    def add(self, text: str, cache: bool = False) -> 'Prompt':
+        """Append a block; cache=True marks a breakpoint after it. Returns the prompt."""
+        self.blocks.append((text.strip(), cache))
+        return self
+    
+    @property
+    def text(self) -> str:
+        return self.SEPARATOR.join(text for text, _ in self.blocks)
+    
+    def __str__(self) -> str:
+        return self.text
+    
+    def token_counts(self, model: Optional[str] = None) -> List[int]:
+        """
+        Tokens of each block, separator included (see estimate_tokens).
+        
+        Counted block by block, so the count of a shared block (the paper,
+        a draft) is memoized across prompts; the sum can differ from a
+        count of the whole text by a token per block boundary.
+        """
+        separator = estimate_tokens(self.SEPARATOR, model)
+        return [
+            estimate_tokens(text, model) + (separator if i < len(self.blocks) - 1 else 0)
+            for i, (text, _) in enumerate(self.blocks)
+        ]
+    
+    def prefixes(self) -> List[str]:
+        """Text of the prompt up to each cache breakpoint (the last MAX_BREAKPOINTS), shortest first."""
+        prefixes = []
+        for i, (_, cache) in enumerate(self.blocks):
+            if cache:
+                prefixes.append(self.SEPARATOR.join(text for text, _ in self.blocks[:i + 1]))
+        return prefixes[-self.MAX_BREAKPOINTS:]
+    
+    def content_blocks(self) -> List[Dict]:
+        """Anthropic message content: one text block per block, breakpoints marked with cache_control."""
+        breakpoints = [i for i, (_, cache) in enumerate(self.blocks) if cache][-self.MAX_BREAKPOINTS:]
+        content = []
+        for i, (text, _) in enumerate(self.blocks):
+            block = {'type': 'text', 'text': text + (self.SEPARATOR if i < len(self.blocks) - 1 else "")}
+            if i in breakpoints:
+                block['cache_control'] = {'type': 'ephemeral'}
+            content.append(block)
+        return content
+
+class PromptCacheLedger:
+    """
+    Estimates which part of a prompt a provider serves from its prompt cache.
+    
+    Mirrors the providers' behaviour: a prefix up to a cache breakpoint is
+    written on first use (if at least config.LLM_CACHE_MIN_TOKENS long) and
+    read back by later calls to the same model until it goes
+    config.LLM_CACHE_TTL seconds unused. Used by the mock adapter; the real
+    providers report cache usage themselves.
+    """
+    def __init__(self):
+        self._entries = {}  # {(provider, model, prefix sha256): expiry time}
+        self._lock = threading.Lock()
+    
+    def usage(self, prompt: 'Prompt', provider: str, model: str) -> Tuple[int, int]:
+        """
+        Record a call and estimate its cache usage.
+        
+        Returns:
+            (cached_tokens, cache_write_tokens)
+        """
+        now = time.time()
+        counts = prompt.token_counts(model)
+        breakpoints = [i for i, (_, cache) in enumerate(prompt.blocks) if cache][-prompt.MAX_BREAKPOINTS:]
+        prefixes = [
+            (hashlib.sha256(prefix.encode('utf-8')).hexdigest(), sum(counts[:i + 1]))
+            for prefix, i in zip(prompt.prefixes(), breakpoints)
+        ]
+        prefixes = [(digest, tokens) for digest, tokens in prefixes if tokens >= config.LLM_CACHE_MIN_TOKENS]
+        if not prefixes:
+            return 0, 0
+        
+        cached = 0
+        with self._lock:
+            for digest, tokens in prefixes:
+                if self._entries.get((provider, model, digest), 0) > now:
+                    cached = tokens
+            for digest, _ in prefixes:
+                self._entries[(provider, model, digest)] = now + config.LLM_CACHE_TTL
+        return cached, prefixes[-1][1] - cached
+
+prompt_cache_ledger = PromptCacheLedger()
+
+class LLMResponseCache:
+    """
+    Persistent cache of LLM responses, shared across runs.
+    
+    Keyed by the SHA-256 of (provider, model, prompt text, sampling
+    parameters); entries hold the response and its token counts so that
+    hits can be recorded as saved tokens. Mode (config.LLM_RESPONSE_CACHE_MODE):
+    "on" reads and writes, "readonly" replays cached responses without
+    storing new ones (or touching the file), "off" bypasses the cache.
+    """
+    def __init__(self, filepath: Path, mode: str = "on",
+                 max_bytes: int = 0, ttl: Optional[float] = None):
+        self.mode = mode
+        self.ttl = ttl
+        self.store = LRUDiskCache(filepath, max_bytes)
+    
+    @staticmethod
+    def key(provider: str, model: str, prompt, params: Optional[Dict] = None) -> str:
+        payload = json.dumps([provider, model, str(prompt), params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached {'response', 'input_tokens', 'output_tokens'} for key, or None."""
+        if self.mode == "off":
+            return None
+        return self.store.get(key, touch=self.mode != "readonly")
+    
+    def set(self, key: str, response: str, input_tokens: int, output_tokens: int):
+        if self.mode != "on":
+            return
+        self.store.set(key, {
+            'response': response,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens
+        }, self.ttl)
+
+llm_response_cache = LLMResponseCache(
+    config.CACHE_FILES['llm_responses'],
+    mode=config.LLM_RESPONSE_CACHE_MODE,
+    max_bytes=config.LLM_RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+    ttl=config.LLM_RESPONSE_CACHE_TTL
+)
 
-def call_llm(prompt: str, provider: str, model: str) -> str:
+def call_llm(prompt, provider: str, model: str, params: Optional[Dict] = None,
+             use_cache: bool = True, on_text: Optional[Callable[[str], None]] = None) -> str:
     """
     Centralized function to call LLMs with token tracking.
     
+    The call goes to the provider's adapter (llm_providers.get_adapter: the
+    provider's API, or the local mock). Identical calls are answered from
+    the LLM response cache (see LLMResponseCache); their tokens are
+    recorded as saved.
+    
     Args:
-        prompt: The prompt to send
+        prompt: The prompt to send (str, or a Prompt with cache breakpoints)
         provider: LLM provider (anthropic, openai, google, xai)
-        model: Model identifier
+        model: Model key or ID from config.LLM_MODELS
+        params: Sampling parameters (e.g. temperature, max_tokens)
+        use_cache: False bypasses the response cache for this call
+        on_text: Called with each piece of the response as it streams in
         
     Returns:
         LLM response text
+        
+    Raises:
+        llm_providers.LLMError: If the call failed
+    """
+    import llm_providers
+    
+    _, model_id = resolve_model(model)
+    adapter = llm_providers.get_adapter(provider)
+    
+    with _llm_span(provider, model_id, adapter, on_text) as span:
+        cache_key, cached = _llm_cache_lookup(adapter, provider, model_id, prompt, params, use_cache, span)
+        if cached is not None:
+            if on_text:
+                on_text(cached)
+            return cached
+        
+        # Respect the provider's request rate (calls may come from several threads)
+        limiter = llm_rate_limiter(provider)
+        if limiter:
+            waited = time.perf_counter()
+            limiter.acquire()
+            span.set(rate_limit_wait=round(time.perf_counter() - waited, 3))
+        
+        result = adapter.complete(prompt, model_id, params, on_text=on_text)
+        return _llm_record(provider, model_id, cache_key, result, span)
+
+async def acall_llm(prompt, provider: str, model: str, params: Optional[Dict] = None,
+                    use_cache: bool = True, on_text: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Async call_llm, through the adapter's acomplete.
+    
+    Shares call_llm's response cache, rate limits and usage tracking; only
+    the rate-limit wait runs in a worker thread.
     """
-    # Estimate input tokens
-    input_tokens = estimate_tokens(prompt)
+    import llm_providers
     
-    # Placeholder for actual API call
-    # In production, this would call the specific provider API
-    response = f"[PLACEHOLDER: Response from {provider} {model}]\n\nThis is a simulated response to demonstrate the workflow."
+    _, model_id = resolve_model(model)
+    adapter = llm_providers.get_adapter(provider)
     
-    # Estimate output tokens
-    output_tokens = estimate_tokens(response)
+    with _llm_span(provider, model_id, adapter, on_text) as span:
+        cache_key, cached = _llm_cache_lookup(adapter, provider, model_id, prompt, params, use_cache, span)
+        if cached is not None:
+            if on_text:
+                on_text(cached)
+            return cached
+        
+        limiter = llm_rate_limiter(provider)
+        if limiter:
+            waited = time.perf_counter()
+            await asyncio.to_thread(limiter.acquire)
+            span.set(rate_limit_wait=round(time.perf_counter() - waited, 3))
+        
+        result = await adapter.acomplete(prompt, model_id, params, on_text=on_text)
+        return _llm_record(provider, model_id, cache_key, result, span)
+
+def _llm_span(provider: str, model_id: str, adapter, on_text) -> contextlib.AbstractContextManager:
+    """Trace span of an LLM call."""
+    return tracer.span(f"LLM {provider} {model_id}", "llm", provider=provider, model=model_id,
+                       backend=type(adapter).__name__, stream=on_text is not None)
+
+def _llm_cache_lookup(adapter, provider: str, model_id: str, prompt, params: Optional[Dict],
+                      use_cache: bool, span: Span) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Look an LLM call up in the response cache.
+    
+    Returns:
+        (cache key, or None if the call is not cached; cached response or None)
+    """
+    cache_key = LLMResponseCache.key(provider, model_id, prompt, params) if use_cache and adapter.cacheable else None
+    cached = llm_response_cache.get(cache_key) if cache_key else None
+    if cached is None:
+        return cache_key, None
+    span.set(cache='hit', saved_tokens=cached['input_tokens'] + cached['output_tokens'])
+    tracker.track_saved(model_id, cached['input_tokens'], cached['output_tokens'], provider=provider)
+    return cache_key, cached['response']
+
+def _llm_record(provider: str, model_id: str, cache_key: Optional[str], result: Dict, span: Span) -> str:
+    """Track the usage of a completed LLM call and cache its response; returns the text."""
+    span.set(cache='miss' if cache_key else 'off', input_tokens=result['input_tokens'],
+             output_tokens=result['output_tokens'], cached_tokens=result['cached_tokens'])
     
-    # Track usage
-    tracker.track(model, input_tokens, output_tokens)
+    # Track the usage reported by the provider (estimated by the mock)
+    tracker.track(model_id, result['input_tokens'], result['output_tokens'],
+                  cached_tokens=result['cached_tokens'], cache_write_tokens=result['cache_write_tokens'],
+                  provider=provider)
     
-    return response
+    if cache_key:
+        llm_response_cache.set(cache_key, result['text'], result['input_tokens'], result['output_tokens'])
+    return result['text']